@@ -0,0 +1,112 @@
+"""
+Consistency check for the stored allied power of cities.
+
+Recomputes allied power from scratch in batches and compares it with the
+values maintained incrementally on writes.
+
+Usage (from the app directory):
+    python -m commands.allied_power check
+    python -m commands.allied_power rebuild
+"""
+import argparse
+import logging
+import sys
+
+from config.db_postg import SessionLocal, init_engine
+from config.log_config import setup_logging
+from repository.alliance_repository import AllianceRepository
+from repository.city_repository import CityRepository
+from services.allied_power_service import AlliedPowerService
+from services.city_stats_service import track_city_stats
+
+
+def lock_batch(db, cities):
+    """
+    Lock a batch of cities with their allies, in one query and UUID order
+    like city writes, and refresh them and their alliances from the locked
+    rows. Allies gained in between are locked by a follow-up query.
+
+    Returns:
+        list: The cities of the batch that still exist.
+    """
+    AllianceRepository.load_alliances(db, cities)
+    ally_uuids = {
+        alliance.allied_city_uuid for city in cities for alliance in city.alliances
+    }
+    locked = CityRepository.get_cities_by_uuids(
+        db, list({city.city_uuid for city in cities} | ally_uuids), for_update=True
+    )
+    cities = [city for city in cities if city in locked]
+    for city in cities:
+        db.expire(city, ["alliances"])
+    AllianceRepository.load_alliances(db, cities)
+    gained = {
+        alliance.allied_city_uuid for city in cities for alliance in city.alliances
+    } - ally_uuids - {city.city_uuid for city in cities}
+    AlliedPowerService.lock_allies(db, gained)
+    return cities
+
+
+def compare_allied_power(db, batch_size: int, rebuild: bool) -> int:
+    """
+    Walk all cities in UUID order and diff stored against live allied power.
+
+    With rebuild, each batch is locked with its allies before its live
+    allied power is computed, so no write can change it before mismatching
+    values are overwritten, one transaction per batch.
+
+    Returns:
+        int: The number of cities whose stored value differs.
+    """
+    mismatches = 0
+    after = None
+    while True:
+        cities = CityRepository.get_cities(db, 0, batch_size, after=after)
+        if not cities:
+            return mismatches
+        after = (cities[-1].city_uuid,)
+        if rebuild:
+            cities = lock_batch(db, cities)
+        live_powers = AlliedPowerService.calculate_allied_power_bulk(db, cities)
+        diff = {}
+        for city in cities:
+            live_power = live_powers[city.city_uuid]
+            if city.allied_power != live_power:
+                print(
+                    f"{city.city_uuid}\tstored={city.allied_power}\tlive={live_power}"
+                )
+                diff[city.city_uuid] = live_power
+        mismatches += len(diff)
+        if rebuild:
+            track_city_stats(db, list(diff))
+            CityRepository.set_allied_power(db, diff)
+            db.commit()
+        db.expunge_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check stored allied power.")
+    parser.add_argument("action", choices=["check", "rebuild"])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_logging()
+    init_engine()
+    db = SessionLocal()
+    try:
+        mismatches = compare_allied_power(
+            db, args.batch_size, rebuild=args.action == "rebuild"
+        )
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Allied power {args.action} failed: {e}")
+        raise
+    finally:
+        db.close()
+    print(f"{mismatches} mismatching cities", file=sys.stderr)
+    if args.action == "check" and mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Schema bootstrap for new and existing databases.
+
+Creates required extensions and missing tables, types and indexes, then
+brings databases created by earlier versions up to date with idempotent
+statements, and backfills the columns it had to add and the statistics
+rollups when they are empty. Safe to run on every deployment, and
+concurrently: runs are serialized by an advisory lock.
+
+Usage (from the app directory):
+    python -m commands.bootstrap upgrade
+"""
+import argparse
+import logging
+import sys
+from typing import List
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection
+
+from commands.allied_power import compare_allied_power
+from commands.geohash import backfill_geohashes
+from config.db_postg import SessionLocal, init_engine
+from config.log_config import setup_logging
+from models.city_model import Base, City
+from repository.stats_repository import StatsRepository
+from services.city_stats_service import CityStatsService
+
+# Key of the transaction-level advisory lock held while upgrading
+BOOTSTRAP_LOCK_ID = 726_384_001
+
+# Extensions the schema depends on, created before any table or index
+REQUIRED_EXTENSIONS = ["pg_trgm"]
+
+# Columns added after the first release, with the backfill each one needs
+ADDED_COLUMNS = {
+    "allied_power": "ALTER TABLE city ADD COLUMN IF NOT EXISTS allied_power BIGINT",
+    "geohash": (
+        'ALTER TABLE city ADD COLUMN IF NOT EXISTS geohash VARCHAR(12) COLLATE "C"'
+    ),
+}
+
+# Idempotent statements bringing tables created by earlier versions up to
+# date, in order. Tables created by this version already match.
+UPGRADE_STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS ix_city_geohash ON city (geohash)",
+    # Alliance pairs became unique, replacing the plain city_uuid index
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('ix_city_alliances_city_uuid_allied_city_uuid') IS NULL THEN
+            DELETE FROM city_alliances a USING city_alliances b
+                WHERE a.alliance_id > b.alliance_id
+                  AND a.city_uuid = b.city_uuid
+                  AND a.allied_city_uuid = b.allied_city_uuid;
+            CREATE UNIQUE INDEX ix_city_alliances_city_uuid_allied_city_uuid
+                ON city_alliances (city_uuid, allied_city_uuid);
+        END IF;
+    END $$
+    """,
+    "DROP INDEX IF EXISTS ix_city_alliances_city_uuid",
+    # Indexes behind the filters and sort orders of the city list
+    "CREATE INDEX IF NOT EXISTS ix_city_population_city_uuid "
+    "ON city (population, city_uuid)",
+    "CREATE INDEX IF NOT EXISTS ix_city_beauty_population_city_uuid "
+    "ON city (beauty, population, city_uuid)",
+    "CREATE INDEX IF NOT EXISTS ix_city_name_trgm "
+    "ON city USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_city_name_lower_city_uuid "
+    'ON city ((lower(name) COLLATE "C"), city_uuid)',
+    "CREATE INDEX IF NOT EXISTS ix_city_alliances_allied_city_uuid "
+    "ON city_alliances (allied_city_uuid)",
+    # Deleting a city relies on its alliances being removed by cascade
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM pg_constraint
+            WHERE conrelid = 'city_alliances'::regclass
+              AND contype = 'f'
+              AND confdeltype <> 'c'
+        ) THEN
+            ALTER TABLE city_alliances
+                DROP CONSTRAINT IF EXISTS city_alliances_city_uuid_fkey,
+                ADD CONSTRAINT city_alliances_city_uuid_fkey
+                    FOREIGN KEY (city_uuid)
+                    REFERENCES city(city_uuid) ON DELETE CASCADE,
+                DROP CONSTRAINT IF EXISTS city_alliances_allied_city_uuid_fkey,
+                ADD CONSTRAINT city_alliances_allied_city_uuid_fkey
+                    FOREIGN KEY (allied_city_uuid)
+                    REFERENCES city(city_uuid) ON DELETE CASCADE;
+        END IF;
+    END $$
+    """,
+]
+
+
+def upgrade_schema(connection: Connection) -> List[str]:
+    """
+    Create the schema, or upgrade the one in place, in the connection's
+    transaction.
+
+    Returns:
+        list: The columns that were added to an existing city table and
+        need a backfill.
+    """
+    connection.exec_driver_sql(
+        f"SELECT pg_advisory_xact_lock({BOOTSTRAP_LOCK_ID})"
+    )
+    for extension in REQUIRED_EXTENSIONS:
+        connection.exec_driver_sql(f"CREATE EXTENSION IF NOT EXISTS {extension}")
+    inspector = inspect(connection)
+    if not inspector.has_table(City.__tablename__):
+        Base.metadata.create_all(connection)
+        return []
+
+    existing = {column["name"] for column in inspector.get_columns("city")}
+    added = [column for column in ADDED_COLUMNS if column not in existing]
+    for column in added:
+        connection.exec_driver_sql(ADDED_COLUMNS[column])
+    Base.metadata.create_all(connection)
+    for statement in UPGRADE_STATEMENTS:
+        connection.exec_driver_sql(statement)
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create or upgrade the schema.")
+    parser.add_argument("action", choices=["upgrade"])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_logging()
+    engine = init_engine()
+    try:
+        with engine.begin() as connection:
+            added = upgrade_schema(connection)
+    except Exception as e:
+        logging.error(f"Schema {args.action} failed: {e}")
+        raise
+    print(f"schema up to date, {len(added)} columns added", file=sys.stderr)
+
+    db = SessionLocal()
+    try:
+        # Before the allied power rebuild, which adds its changes to them
+        if not StatsRepository.has_stats(db):
+            CityStatsService.refresh_stats(db)
+            print("stats rollups refreshed", file=sys.stderr)
+        if "geohash" in added:
+            updated = backfill_geohashes(db, args.batch_size)
+            print(f"{updated} geohashes backfilled", file=sys.stderr)
+        if "allied_power" in added:
+            compare_allied_power(db, args.batch_size, rebuild=True)
+            print("allied power rebuilt", file=sys.stderr)
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Backfill after schema {args.action} failed: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Backfill of the geohash column used by spatial queries.
+
+Usage (from the app directory):
+    python -m commands.geohash backfill
+"""
+import argparse
+import logging
+import sys
+
+from config.db_postg import SessionLocal, init_engine
+from config.log_config import setup_logging
+from repository.city_repository import CityRepository
+
+
+def backfill_geohashes(db, batch_size: int) -> int:
+    """
+    Compute the geohash of every city that has none, one transaction per
+    batch.
+
+    Returns:
+        int: The number of updated cities.
+    """
+    updated = 0
+    while True:
+        cities = CityRepository.get_cities_without_geohash(db, batch_size)
+        if not cities:
+            return updated
+        for city in cities:
+            CityRepository.set_geohash(city)
+        db.commit()
+        updated += len(cities)
+        db.expunge_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain city geohashes.")
+    parser.add_argument("action", choices=["backfill"])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_logging()
+    init_engine()
+    db = SessionLocal()
+    try:
+        updated = backfill_geohashes(db, args.batch_size)
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Geohash {args.action} failed: {e}")
+        raise
+    finally:
+        db.close()
+    print(f"{updated} cities updated", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Verification and refresh of the rollup counters behind GET /cities/stats.
+
+Recomputes the statistics from scratch over the city tables and compares
+them with, or writes them over, the counters maintained on writes. Refresh
+can also run on a schedule to repair drift.
+
+Usage (from the app directory):
+    python -m commands.stats verify
+    python -m commands.stats refresh
+"""
+import argparse
+import logging
+import sys
+
+from config.db_postg import SessionLocal, init_engine
+from config.log_config import setup_logging
+from services.city_stats_service import CityStatsService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify or refresh city stats.")
+    parser.add_argument("action", choices=["verify", "refresh"])
+    args = parser.parse_args()
+
+    setup_logging()
+    init_engine()
+    db = SessionLocal()
+    mismatches = []
+    try:
+        if args.action == "verify":
+            mismatches = CityStatsService.verify_stats(db)
+            for mismatch in mismatches:
+                print(mismatch)
+        else:
+            CityStatsService.refresh_stats(db)
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Stats {args.action} failed: {e}")
+        raise
+    finally:
+        db.close()
+    if args.action == "verify":
+        print(f"{len(mismatches)} mismatching counters", file=sys.stderr)
+        if mismatches:
+            sys.exit(1)
+    else:
+        print("stats refreshed", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
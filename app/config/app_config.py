@@ -0,0 +1,86 @@
+from os import environ
+
+from config.db_engine_config import env_flag
+
+# ALLIED_POWER_DISTANCE_MODE selects how distances between allied cities are
+# computed. "ellipsoidal" measures on the WGS-84 ellipsoid and matches
+# geopy's geodesic to well below a metre. "haversine" uses a spherical Earth,
+# which is faster but can be off by up to ~0.5%, so cities close to the
+# 1000/10000 km thresholds may fall into a different discount bucket.
+ALLIED_POWER_DISTANCE_MODE = environ.get("ALLIED_POWER_DISTANCE_MODE", "ellipsoidal")
+
+# COUNT_ESTIMATE_MIN_ROWS is the table size, according to Postgres
+# statistics, above which an estimated total is served from pg_class instead
+# of running COUNT(*). Smaller tables are cheap to count exactly.
+COUNT_ESTIMATE_MIN_ROWS = int(environ.get("COUNT_ESTIMATE_MIN_ROWS", 100000))
+
+# BULK_IMPORT_CHUNK_SIZE is the number of rows validated and written per
+# transaction by POST /cities/bulk.
+BULK_IMPORT_CHUNK_SIZE = int(environ.get("BULK_IMPORT_CHUNK_SIZE", 1000))
+
+# BULK_IMPORT_MAX_ERRORS caps the number of row errors listed in a bulk
+# import report; further failures are only counted.
+BULK_IMPORT_MAX_ERRORS = int(environ.get("BULK_IMPORT_MAX_ERRORS", 1000))
+
+# EXPORT_BATCH_SIZE is the number of rows fetched from the server-side cursor
+# and encoded at a time by GET /cities/export.
+EXPORT_BATCH_SIZE = int(environ.get("EXPORT_BATCH_SIZE", 1000))
+
+# KNN_INITIAL_RADIUS_KM is the first search radius of a k-nearest-neighbour
+# query. The radius grows fourfold until enough cities are found.
+KNN_INITIAL_RADIUS_KM = float(environ.get("KNN_INITIAL_RADIUS_KM", 100))
+
+# NEAR_MAX_RESULTS caps the cities returned by GET /cities/near and is the
+# largest k it accepts. A radius query matching more cities returns the
+# nearest NEAR_MAX_RESULTS of them.
+NEAR_MAX_RESULTS = int(environ.get("NEAR_MAX_RESULTS", 1000))
+
+# CITY_CACHE_* bound the in-process cache of GET /cities/{city_uuid}
+# responses. Writes invalidate entries in the worker that performed them;
+# other workers serve their copy until it is CITY_CACHE_TTL_SECONDS old.
+# Setting CITY_CACHE_MAX_ENTRIES to 0 disables the cache.
+CITY_CACHE_MAX_ENTRIES = int(environ.get("CITY_CACHE_MAX_ENTRIES", 10000))
+CITY_CACHE_MAX_BYTES = int(environ.get("CITY_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CITY_CACHE_TTL_SECONDS = float(environ.get("CITY_CACHE_TTL_SECONDS", 30))
+
+# ALLIANCE_GRAPH_TTL_SECONDS is the age after which the in-memory alliance
+# graph is reloaded from city_alliances in the background, picking up
+# alliances written by other workers. ALLIANCE_GRAPH_MAX_HOPS caps the
+# depth of multi-hop queries.
+ALLIANCE_GRAPH_TTL_SECONDS = float(environ.get("ALLIANCE_GRAPH_TTL_SECONDS", 300))
+ALLIANCE_GRAPH_MAX_HOPS = int(environ.get("ALLIANCE_GRAPH_MAX_HOPS", 6))
+
+# METRICS_ENABLED turns on the collection of per-request latency and SQL
+# statistics exposed on /metrics. Set it to "false" to skip the middleware.
+METRICS_ENABLED = env_flag("METRICS_ENABLED", True)
+
+# BATCH_GET_MAX_CITIES caps the number of UUIDs a POST /cities/batch-get
+# request may ask for, keeping its IN list and response bounded.
+BATCH_GET_MAX_CITIES = int(environ.get("BATCH_GET_MAX_CITIES", 1000))
+
+# DISTANCE_MATRIX_MAX_CITIES caps the number of cities of a POST
+# /cities/distance-matrix request. DISTANCE_MATRIX_BLOCK_CELLS is the number
+# of distances computed and encoded at a time, which bounds the memory a
+# matrix takes while it is streamed.
+DISTANCE_MATRIX_MAX_CITIES = int(environ.get("DISTANCE_MATRIX_MAX_CITIES", 5000))
+DISTANCE_MATRIX_BLOCK_CELLS = int(environ.get("DISTANCE_MATRIX_BLOCK_CELLS", 65536))
+
+# STATS_SHARDS is the number of rows each rollup counter behind GET
+# /cities/stats is split into. Every committing write updates one shard
+# picked at random, so concurrent writers rarely wait on each other's rows.
+STATS_SHARDS = int(environ.get("STATS_SHARDS", 8))
+
+# QUERY_DEBUG turns on SQL inspection for development and CI: responses carry
+# X-DB-Queries and X-DB-Time headers, statement shapes repeated at least
+# QUERY_DEBUG_REPEAT_THRESHOLD times in one request are logged as probable
+# N+1 queries, and statements slower than SLOW_QUERY_MS are logged with their
+# parameters and route.
+QUERY_DEBUG = env_flag("QUERY_DEBUG", False)
+QUERY_DEBUG_REPEAT_THRESHOLD = int(environ.get("QUERY_DEBUG_REPEAT_THRESHOLD", 5))
+SLOW_QUERY_MS = float(environ.get("SLOW_QUERY_MS", 100))
+
+# FAST_JSON_RESPONSES encodes city lists and single cities straight from the
+# ORM rows to JSON bytes, with orjson when it is installed, skipping the
+# display models and FastAPI's response model validation. The output is
+# byte-identical; stored rows are no longer checked against the schemas.
+FAST_JSON_RESPONSES = env_flag("FAST_JSON_RESPONSES", False)
@@ -1,12 +1,42 @@
+from os import environ
+
+
+def env_flag(name: str, default: bool) -> bool:
+    """ Read a boolean flag from the environment. """
+    return environ.get(name, str(default)).lower() in ("1", "true", "yes")
+
+
 # POOL_PRE_PING enables a "pre-ping" feature, sending a lightweight query to
 # the database before each connection use, ensuring connection viability.
 # This helps in preventing errors from idle database connections being dropped.
-POOL_PRE_PING = True
+# It costs a round trip per checkout; with POOL_RECYCLE and TCP keepalives
+# below, it can be disabled by setting POOL_PRE_PING to "false".
+POOL_PRE_PING = env_flag("POOL_PRE_PING", True)
 
 # POOL_RECYCLE sets the maximum lifetime of database connections in seconds.
 # Connections are recycled (closed and reopened) after this period.
-# Here, set to 3600 seconds (1 hour) to prevent auto-closing by the DB.
-POOL_RECYCLE = 3600
+# Defaults to 3600 seconds (1 hour) to prevent auto-closing by the DB.
+POOL_RECYCLE = int(environ.get("POOL_RECYCLE", 3600))
+
+# POOL_SIZE is the number of connections kept open per engine, and
+# MAX_OVERFLOW the number of extra connections opened under load and closed
+# when returned. Each worker process may hold up to POOL_SIZE + MAX_OVERFLOW
+# connections, which must fit in Postgres max_connections across workers.
+POOL_SIZE = int(environ.get("POOL_SIZE", 5))
+MAX_OVERFLOW = int(environ.get("MAX_OVERFLOW", 10))
+
+# POOL_TIMEOUT is the number of seconds a request waits for a free
+# connection before failing.
+POOL_TIMEOUT = float(environ.get("POOL_TIMEOUT", 30))
+
+# STATEMENT_TIMEOUT_MS sets the Postgres statement_timeout of every pooled
+# connection, in milliseconds. 0 leaves the server default in place.
+STATEMENT_TIMEOUT_MS = int(environ.get("STATEMENT_TIMEOUT_MS", 0))
+
+# POOL_WARMUP is the number of connections each worker opens at startup,
+# capped at POOL_SIZE, so its first requests do not wait for connecting.
+# 0 (the default) opens connections on demand.
+POOL_WARMUP = int(environ.get("POOL_WARMUP", 0))
 
 # KEEPALIVES settings configure TCP keepalive parameters, keeping the
 # connection active in environments with firewalls/load balancers that
@@ -25,3 +55,8 @@ KEEPALIVES_INTERVAL = 10
 # KEEPALIVES_COUNT is the max number of keepalive probes before the
 # connection is dropped. Set to 5.
 KEEPALIVES_COUNT = 5
+
+# DB_ASYNC switches the API to an asyncio engine over asyncpg. Requests then
+# share the event loop instead of holding a worker thread while waiting on
+# the database. Set the DB_ASYNC environment variable to "true" to enable it.
+DB_ASYNC = env_flag("DB_ASYNC", False)
@@ -1,11 +1,28 @@
 import logging
 from os import environ
+from typing import Optional, Union
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
+from starlette.concurrency import run_in_threadpool
 
+import config.app_config as app_config
 import config.db_engine_config as engine_config
+from monitoring.query_inspector import inspect_queries
+from monitoring.request_metrics import instrument_engine
+from monitoring.pool_monitor import (
+    TimedAsyncAdaptedQueuePool,
+    TimedQueuePool,
+    monitor_engine,
+)
 
 
 # Function to get environment variable or raise error
@@ -17,41 +34,148 @@ def get_env_variable(var_name):
         raise EnvironmentError(f"Environment variable {var_name} not found")
 
 
-# Construct DATABASE_URL from environment variables
-DATABASE_URL = (
-    f"postgresql+psycopg2://{get_env_variable('PGUSER')}:"
-    f"{get_env_variable('PGPASSWORD')}@{get_env_variable('PGHOST')}:"
-    f"{get_env_variable('PGPORT')}/{get_env_variable('PGDATABASE')}"
+def get_database_url(driver: str) -> str:
+    """
+    Construct the database URL for the given driver from environment variables.
+    """
+    return (
+        f"postgresql+{driver}://{get_env_variable('PGUSER')}:"
+        f"{get_env_variable('PGPASSWORD')}@{get_env_variable('PGHOST')}:"
+        f"{get_env_variable('PGPORT')}/{get_env_variable('PGDATABASE')}"
+    )
+
+
+# Pool settings shared by the sync and asyncio engines
+POOL_OPTIONS = {
+    "pool_pre_ping": engine_config.POOL_PRE_PING,
+    "pool_recycle": engine_config.POOL_RECYCLE,
+    "pool_size": engine_config.POOL_SIZE,
+    "max_overflow": engine_config.MAX_OVERFLOW,
+    "pool_timeout": engine_config.POOL_TIMEOUT,
+}
+
+# Per-connection server settings, applied when connections are opened
+SERVER_SETTINGS = (
+    {"statement_timeout": str(engine_config.STATEMENT_TIMEOUT_MS)}
+    if engine_config.STATEMENT_TIMEOUT_MS > 0
+    else {}
 )
 
-# SQLAlchemy engine creation with connection pooling and keepalive parameters
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=engine_config.POOL_PRE_PING,
-    pool_recycle=engine_config.POOL_RECYCLE,
-    connect_args={
-        "keepalives": engine_config.KEEPALIVES,
-        "keepalives_idle": engine_config.KEEPALIVES_IDLE,
-        "keepalives_interval": engine_config.KEEPALIVES_INTERVAL,
-        "keepalives_count": engine_config.KEEPALIVES_COUNT,
-    }
+# Engines, created by init_engine when the application starts rather than
+# at import time, so importing the app needs neither database settings nor
+# a reachable database. The asyncio engine is only created when the routers
+# are configured to use the async path.
+engine: Optional[Engine] = None
+async_engine: Optional[AsyncEngine] = None
+
+# Session factories, bound to the engines by init_engine. Objects keep their
+# state after commit, so responses built from them do not reload the rows
+# that were just written
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False)
+AsyncSessionLocal = async_sessionmaker(
+    autoflush=False, expire_on_commit=False, class_=AsyncSession
 )
 
-# Session factory for creating new SQLAlchemy session instances
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def instrument(target: Engine):
+    """ Attach pool telemetry, request metrics and query inspection. """
+    monitor_engine(target)
+    instrument_engine(target)
+    if app_config.QUERY_DEBUG:
+        inspect_queries(target, app_config.SLOW_QUERY_MS / 1000)
+
+
+def init_engine() -> Engine:
+    """
+    Create the engines and bind the session factories, once per process.
+
+    Returns:
+        The SQLAlchemy engine connected to the database.
+    """
+    global engine, async_engine
+    if engine is not None:
+        return engine
+
+    # SQLAlchemy engine with connection pooling and keepalive parameters
+    engine = create_engine(
+        get_database_url("psycopg2"),
+        poolclass=TimedQueuePool,
+        pool_logging_name="sync",
+        **POOL_OPTIONS,
+        connect_args={
+            "keepalives": engine_config.KEEPALIVES,
+            "keepalives_idle": engine_config.KEEPALIVES_IDLE,
+            "keepalives_interval": engine_config.KEEPALIVES_INTERVAL,
+            "keepalives_count": engine_config.KEEPALIVES_COUNT,
+            **(
+                {"options": " ".join(f"-c {k}={v}" for k, v in SERVER_SETTINGS.items())}
+                if SERVER_SETTINGS
+                else {}
+            ),
+        }
+    )
+    instrument(engine)
+    SessionLocal.configure(bind=engine)
+
+    if engine_config.DB_ASYNC:
+        async_engine = create_async_engine(
+            get_database_url("asyncpg"),
+            poolclass=TimedAsyncAdaptedQueuePool,
+            pool_logging_name="async",
+            **POOL_OPTIONS,
+            connect_args={"server_settings": SERVER_SETTINGS},
+        )
+        instrument(async_engine.sync_engine)
+        AsyncSessionLocal.configure(bind=async_engine)
+    return engine
+
+
+async def warm_up_pool(connections: int):
+    """
+    Open connections up front, so the first requests of a worker do not pay
+    for connecting. At most POOL_SIZE connections stay in the pool.
+    """
+    connections = min(connections, engine_config.POOL_SIZE)
+    if async_engine is not None:
+        opened = [await async_engine.connect() for _ in range(connections)]
+        for connection in opened:
+            await connection.close()
+    else:
+
+        def warm_up():
+            opened = [engine.connect() for _ in range(connections)]
+            for connection in opened:
+                connection.close()
+
+        await run_in_threadpool(warm_up)
+
+
+async def dispose_engine():
+    """ Close the pooled connections of the engines. """
+    global engine, async_engine
+    if async_engine is not None:
+        await async_engine.dispose()
+        async_engine = None
+    if engine is not None:
+        engine.dispose()
+        engine = None
+
 
 # Base class for declarative class definitions
 Base = declarative_base()
 
+# Either kind of session, as handed out to the routers
+DbSession = Union[Session, AsyncSession]
+
 
 def get_engine():
     """
-    Retrieve the SQLAlchemy engine.
+    Retrieve the SQLAlchemy engine, creating it on first use.
 
     Returns:
         The SQLAlchemy engine connected to the database.
     """
-    return engine
+    return init_engine()
 
 
 def get_db() -> Session:
@@ -69,3 +193,37 @@ def get_db() -> Session:
         raise
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncSession:
+    """
+    Async generator that provides an asyncio database session and ensures
+    its closure.
+
+    Yields:
+        A SQLAlchemy AsyncSession object.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            logging.error(f"Database connection error occurred: {e}")
+            raise
+
+
+# Session dependency used by the routers, selected by DB_ASYNC
+get_db_session = get_async_db if engine_config.DB_ASYNC else get_db
+
+
+async def run_db(db: DbSession, fn, *args, **kwargs):
+    """
+    Run synchronous repository and service code without blocking the event
+    loop.
+
+    With an AsyncSession the function runs on the asyncio driver through
+    AsyncSession.run_sync. With a regular Session it runs on a worker
+    thread. Either way it is called as fn(session, *args, **kwargs).
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
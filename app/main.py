@@ -1,10 +1,44 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
+import config.app_config as app_config
+import config.db_engine_config as engine_config
+import config.db_postg as db_postg
 from config.log_config import setup_logging
-from routers import city_router
+from monitoring.query_inspector import QueryInspectorMiddleware
+from monitoring.request_metrics import MetricsMiddleware
+from routers import city_router, monitoring_router
 
 setup_logging()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create the database engines when a worker starts, optionally opening
+    pooled connections up front, and close them when it stops. The schema
+    is managed separately by python -m commands.bootstrap upgrade.
+    """
+    db_postg.init_engine()
+    if engine_config.POOL_WARMUP > 0:
+        await db_postg.warm_up_pool(engine_config.POOL_WARMUP)
+    yield
+    await db_postg.dispose_engine()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(city_router.router, prefix="/cities", tags=["cities"])
+app.include_router(
+    monitoring_router.router, prefix="/monitoring", tags=["monitoring"]
+)
+app.include_router(monitoring_router.metrics_router, tags=["monitoring"])
+
+if app_config.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+if app_config.QUERY_DEBUG:
+    app.add_middleware(
+        QueryInspectorMiddleware,
+        repeat_threshold=app_config.QUERY_DEBUG_REPEAT_THRESHOLD,
+    )
@@ -1,4 +1,3 @@
-import logging
 import uuid
 import enum
 from datetime import datetime
@@ -12,13 +11,13 @@ from sqlalchemy import (
     ForeignKey,
     BigInteger,
     DateTime,
+    Index,
+    SmallInteger,
+    func,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.exc import SQLAlchemyError
-
-from config.db_postg import get_engine
 
 Base = declarative_base()
 
@@ -42,25 +41,54 @@ class City(Base):
         geo_location_longitude (Float): Longitude of the city's geolocation.
         beauty (BeautyEnum): Aesthetic appeal rating of the city.
         population (BigInteger): Population of the city.
+        allied_power (BigInteger): Stored allied power, maintained on writes.
+        geohash (String): Geohash of the geolocation, for spatial lookups.
         alliances (relationship): Relationships to allied cities.
         created_at (DateTime): Record creation timestamp.
         updated_at (DateTime): Record update timestamp.
     """
 
     __tablename__ = "city"
+    __table_args__ = (
+        # Serve population ranges and sorting, keyset-paged by UUID
+        Index("ix_city_population_city_uuid", "population", "city_uuid"),
+        # Serve beauty filters, alone or with population ranges and sorting
+        Index(
+            "ix_city_beauty_population_city_uuid", "beauty", "population", "city_uuid"
+        ),
+        # Serve case-insensitive substring filters; needs the pg_trgm extension
+        Index(
+            "ix_city_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+    )
     city_uuid = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String, nullable=False)
     geo_location_latitude = Column(Float, nullable=False)
     geo_location_longitude = Column(Float, nullable=False)
     beauty = Column(SQLAlchemyEnum(BeautyEnum, name="beauty_type"), nullable=False)
     population = Column(BigInteger, nullable=False)
+    allied_power = Column(BigInteger, nullable=True)
+    # "C" collation keeps B-tree order byte-wise, so prefix ranges use the index
+    geohash = Column(String(12, collation="C"), nullable=True, index=True)
     alliances = relationship(
-        "CityAlliances", foreign_keys="CityAlliances.city_uuid", back_populates="city"
+        "CityAlliances",
+        foreign_keys="CityAlliances.city_uuid",
+        back_populates="city",
+        passive_deletes=True,
     )
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+# Serves name prefix filters and sorting by name, keyset-paged by UUID. The
+# "C" collation keeps B-tree order byte-wise so prefix ranges use the index.
+CITY_NAME_SORT_KEY = func.lower(City.name).collate("C")
+Index("ix_city_name_lower_city_uuid", CITY_NAME_SORT_KEY, City.city_uuid)
+
+
 class CityAlliances(Base):
     """
     SQLAlchemy model representing alliances between cities.
@@ -75,20 +103,71 @@ class CityAlliances(Base):
     """
 
     __tablename__ = "city_alliances"
+    __table_args__ = (
+        # Serves lookups by city_uuid and keeps alliance pairs unique
+        Index(
+            "ix_city_alliances_city_uuid_allied_city_uuid",
+            "city_uuid",
+            "allied_city_uuid",
+            unique=True,
+        ),
+    )
     alliance_id = Column(Integer, primary_key=True)
     city_uuid = Column(
-        UUID(as_uuid=True), ForeignKey("city.city_uuid"), nullable=False, index=True
+        UUID(as_uuid=True),
+        ForeignKey("city.city_uuid", ondelete="CASCADE"),
+        nullable=False,
     )
     allied_city_uuid = Column(
-        UUID(as_uuid=True), ForeignKey("city.city_uuid"), nullable=False, index=True
+        UUID(as_uuid=True),
+        ForeignKey("city.city_uuid", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
     )
     city = relationship("City", foreign_keys=[city_uuid], back_populates="alliances")
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
-# Create tables in the database
-try:
-    Base.metadata.create_all(bind=get_engine())
-except SQLAlchemyError as e:
-    logging.error(f"SQLAlchemyError occurred: {e}")
-    raise
+
+class CityBeautyStats(Base):
+    """
+    SQLAlchemy model holding rollup counters of cities by beauty.
+
+    Counters are split across shards so that concurrent writers mostly
+    update different rows; the totals of a beauty are the sums over its
+    shards.
+
+    Attributes:
+        beauty (BeautyEnum): Beauty rating the counters belong to.
+        shard (SmallInteger): Shard of the counters.
+        city_count (BigInteger): Number of cities.
+        total_population (BigInteger): Sum of their populations.
+        total_allied_power (BigInteger): Sum of their stored allied power.
+        allied_power_count (BigInteger): Number of cities with stored allied
+            power.
+    """
+
+    __tablename__ = "city_beauty_stats"
+    beauty = Column(SQLAlchemyEnum(BeautyEnum, name="beauty_type"), primary_key=True)
+    shard = Column(SmallInteger, primary_key=True)
+    city_count = Column(BigInteger, nullable=False, default=0)
+    total_population = Column(BigInteger, nullable=False, default=0)
+    total_allied_power = Column(BigInteger, nullable=False, default=0)
+    allied_power_count = Column(BigInteger, nullable=False, default=0)
+
+
+class CityDegreeStats(Base):
+    """
+    SQLAlchemy model holding rollup counters of cities by alliance degree,
+    split across shards like CityBeautyStats.
+
+    Attributes:
+        degree (Integer): Number of alliances of the counted cities.
+        shard (SmallInteger): Shard of the counter.
+        city_count (BigInteger): Number of cities with that many alliances.
+    """
+
+    __tablename__ = "city_degree_stats"
+    degree = Column(Integer, primary_key=True)
+    shard = Column(SmallInteger, primary_key=True)
+    city_count = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,46 @@
+import bisect
+import threading
+from typing import Dict, Sequence
+
+# Default bucket upper bounds in seconds, from 1 ms to 10 s
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class Histogram:
+    """
+    Thread-safe histogram of observed values with fixed bucket bounds.
+
+    Buckets are reported cumulatively, as Prometheus expects: the count of
+    a bucket includes every observation less than or equal to its bound.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """ Record one observation. """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._max = max(self._max, value)
+
+    def snapshot(self) -> Dict:
+        """ Return cumulative bucket counts along with count, sum and max. """
+        with self._lock:
+            counts = list(self._counts)
+            total, maximum = self._sum, self._max
+        cumulative = {}
+        running = 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative[str(bound)] = running
+        running += counts[-1]
+        cumulative["+Inf"] = running
+        return {"buckets": cumulative, "count": running, "sum": total, "max": maximum}
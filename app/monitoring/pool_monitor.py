@@ -0,0 +1,118 @@
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from monitoring.histogram import Histogram
+
+# Monitors of the engines' pools, keyed by pool logging name
+pool_monitors: Dict[str, "PoolMonitor"] = {}
+
+
+class PoolMonitor:
+    """
+    Telemetry of one connection pool.
+
+    Counts connections opened, checkouts, invalidations and checkout
+    timeouts, tracks the peak number of checked-out and overflow
+    connections, and keeps a histogram of the time spent waiting for a
+    connection.
+    """
+
+    def __init__(self, name: str, engine: Engine):
+        self.name = name
+        self.engine = engine
+        self.wait_seconds = Histogram()
+        self._lock = threading.Lock()
+        self._counters = {
+            "connects": 0,
+            "checkouts": 0,
+            "invalidations": 0,
+            "soft_invalidations": 0,
+            "timeouts": 0,
+        }
+        self._peak_checked_out = 0
+        self._peak_overflow = 0
+
+    def increment(self, counter: str):
+        """ Add one to a counter. """
+        with self._lock:
+            self._counters[counter] += 1
+
+    def record_checkout(self, pool: QueuePool):
+        """ Count a checkout and update the peaks of the pool. """
+        with self._lock:
+            self._counters["checkouts"] += 1
+            self._peak_checked_out = max(self._peak_checked_out, pool.checkedout())
+            self._peak_overflow = max(self._peak_overflow, pool.overflow())
+
+    def stats(self) -> Dict:
+        """ Return the current state of the pool and its counters. """
+        with self._lock:
+            stats = {
+                **self._counters,
+                "peak_checked_out": self._peak_checked_out,
+                "peak_overflow": self._peak_overflow,
+            }
+        pool = self.engine.pool
+        stats.update(
+            pool_size=pool.size(),
+            timeout=pool.timeout(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+        stats["checkout_wait_seconds"] = self.wait_seconds.snapshot()
+        return stats
+
+
+class TimedQueuePool(QueuePool):
+    """ QueuePool that records how long each checkout waits for a connection. """
+
+    def _do_get(self):
+        monitor = pool_monitors.get(self.logging_name)
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if monitor is not None:
+                monitor.increment("timeouts")
+            raise
+        finally:
+            if monitor is not None:
+                monitor.wait_seconds.observe(time.perf_counter() - start)
+
+
+class TimedAsyncAdaptedQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """ Asyncio variant of TimedQueuePool. """
+
+
+def monitor_engine(engine: Engine) -> PoolMonitor:
+    """
+    Attach a monitor to the pool of an engine created with a timed pool
+    class and pool_logging_name. The listeners carry over to the pools
+    that replace this one when the engine is disposed.
+    """
+    name = engine.pool.logging_name
+    monitor = pool_monitors[name] = PoolMonitor(name, engine)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        monitor.increment("connects")
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        monitor.record_checkout(engine.pool)
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        monitor.increment("invalidations")
+
+    @event.listens_for(engine, "soft_invalidate")
+    def on_soft_invalidate(dbapi_connection, connection_record, exception):
+        monitor.increment("soft_invalidations")
+
+    return monitor
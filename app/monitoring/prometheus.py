@@ -0,0 +1,55 @@
+from typing import Dict, Iterable, List, Tuple
+
+# Labels of one series, as (name, value) pairs
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def escape_label_value(value: str) -> str:
+    """ Escape a label value for the Prometheus text format. """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Labels) -> str:
+    """ Format labels as {name="value",...}, or nothing without labels. """
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{escape_label_value(value)}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+class PrometheusWriter:
+    """
+    Writer of metrics in the Prometheus text exposition format, version
+    0.0.4.
+    """
+
+    def __init__(self):
+        self._lines: List[str] = []
+
+    def metric(self, name: str, metric_type: str, help_text: str):
+        """ Start a metric family with its HELP and TYPE lines. """
+        self._lines.append(f"# HELP {name} {help_text}")
+        self._lines.append(f"# TYPE {name} {metric_type}")
+
+    def sample(self, name: str, value: float, labels: Labels = ()):
+        """ Write one sample. """
+        self._lines.append(f"{name}{format_labels(labels)} {value}")
+
+    def histogram(self, name: str, snapshot: Dict, labels: Labels = ()):
+        """ Write the bucket, sum and count samples of a histogram snapshot. """
+        for bound, count in snapshot["buckets"].items():
+            self.sample(f"{name}_bucket", count, labels + (("le", bound),))
+        self.sample(f"{name}_sum", snapshot["sum"], labels)
+        self.sample(f"{name}_count", snapshot["count"], labels)
+
+    def histograms(
+        self, name: str, help_text: str, series: Iterable[Tuple[Labels, Dict]]
+    ):
+        """ Write a histogram family from (labels, snapshot) pairs. """
+        self.metric(name, "histogram", help_text)
+        for labels, snapshot in series:
+            self.histogram(name, snapshot, labels)
+
+    def render(self) -> str:
+        """ Return the exposition text. """
+        return "\n".join(self._lines) + "\n"
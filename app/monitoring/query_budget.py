@@ -0,0 +1,88 @@
+"""
+Helpers for asserting SQL query budgets in tests.
+
+Both helpers need query inspection, and fail without it: run the app with
+QUERY_DEBUG=true, or call monitoring.query_inspector.inspect_queries on the
+engine under test.
+
+    def test_list_cities_query_budget(client):
+        response = client.get("/cities/", params={"page_size": 100})
+        assert_query_budget(response, max_queries=3)
+
+    def test_read_city_has_no_n_plus_one(db, city_uuid):
+        with query_budget(max_queries=2, max_repeats=1):
+            CityService.read_city(db, city_uuid)
+"""
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from sqlalchemy.engine import Engine
+
+from monitoring.query_inspector import QueryLog, current_query_log, inspected_engines
+
+
+def _describe(query_log: QueryLog) -> str:
+    """ List the statement shapes of a query log, most common first. """
+    return "\n".join(
+        f"  {count} x {shape}" for shape, count in query_log.shapes.most_common()
+    )
+
+
+@contextmanager
+def query_budget(
+    max_queries: int,
+    max_repeats: Optional[int] = None,
+    engine: Optional[Engine] = None,
+) -> Iterator[QueryLog]:
+    """
+    Fail when the code inside the block runs more than max_queries SQL
+    statements, or any statement shape more than max_repeats times.
+
+    Fails up front when query inspection is not on, for the given engine
+    or for any engine, since the block would then count no statements.
+
+    Yields:
+        The QueryLog of the block, for further assertions.
+    """
+    __tracebackhide__ = True
+    inspected = (
+        engine in inspected_engines if engine is not None else bool(inspected_engines)
+    )
+    if not inspected:
+        raise AssertionError(
+            "Query inspection is not on for the engine; is QUERY_DEBUG enabled?"
+        )
+    query_log = QueryLog()
+    token = current_query_log.set(query_log)
+    try:
+        yield query_log
+    finally:
+        current_query_log.reset(token)
+    if query_log.statements > max_queries:
+        raise AssertionError(
+            f"{query_log.statements} SQL statements run, budget is "
+            f"{max_queries}:\n{_describe(query_log)}"
+        )
+    if max_repeats is not None and query_log.repeated(max_repeats + 1):
+        raise AssertionError(
+            f"Statement shapes repeated more than {max_repeats} times:\n"
+            f"{_describe(query_log)}"
+        )
+
+
+def assert_query_budget(response, max_queries: int):
+    """
+    Fail when the request behind a test client response ran more than
+    max_queries SQL statements, according to its X-DB-Queries header.
+    """
+    __tracebackhide__ = True
+    statements = response.headers.get("X-DB-Queries")
+    if statements is None:
+        raise AssertionError(
+            "Response has no X-DB-Queries header; is QUERY_DEBUG enabled?"
+        )
+    if int(statements) > max_queries:
+        raise AssertionError(
+            f"{response.request.method} {response.request.url} ran {statements} "
+            f"SQL statements, budget is {max_queries}"
+        )
@@ -0,0 +1,161 @@
+import logging
+import re
+import time
+import weakref
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from monitoring.request_metrics import UNMATCHED_ROUTE
+
+# Logger of slow and repeated statements. It is set to WARNING when an
+# engine is inspected, so its reports pass the application's ERROR level.
+logger = logging.getLogger("query_inspector")
+
+# Characters of the parameters included in a slow query report
+MAX_LOGGED_PARAMETERS_LENGTH = 1000
+
+# Literals and bind placeholders of every paramstyle, replaced by "?"
+_LITERAL_PATTERN = re.compile(
+    r"'(?:[^']|'')*'"  # string literals
+    r"|%\(\w+\)s|%s|\$\d+|(?<![:\w]):\w+|\?"  # bind placeholders
+    r"|\b\d+(?:\.\d+)?\b"  # numbers
+)
+# Lists of placeholders, such as an expanded IN or a multi-row VALUES
+_PLACEHOLDER_LIST_PATTERN = re.compile(r"\?(?:\s*,\s*\?)+")
+_ROW_LIST_PATTERN = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    Reduce a SQL statement to its shape.
+
+    Literals and placeholders become "?", and lists of them collapse into
+    one, so statements that differ only in their values or in the length
+    of an IN list share a shape.
+    """
+    shape = _LITERAL_PATTERN.sub("?", statement)
+    shape = _PLACEHOLDER_LIST_PATTERN.sub("?", shape)
+    shape = _ROW_LIST_PATTERN.sub("(?)", shape)
+    return _WHITESPACE_PATTERN.sub(" ", shape).strip()
+
+
+class QueryLog:
+    """ SQL statements run by one request or one budgeted block. """
+
+    def __init__(self, scope: Optional[Dict] = None):
+        self.scope = scope
+        self.statements = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, seconds: float):
+        """ Add one statement. """
+        self.statements += 1
+        self.seconds += seconds
+        self.shapes[normalize_statement(statement)] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """ Return the shapes run at least threshold times, most common first. """
+        return [
+            (shape, count)
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+    def route(self) -> str:
+        """ Describe the request being handled, as METHOD /route/template. """
+        if self.scope is None:
+            return UNMATCHED_ROUTE
+        route = self.scope.get("route")
+        return f"{self.scope['method']} {getattr(route, 'path', UNMATCHED_ROUTE)}"
+
+
+# Engines whose statements inspect_queries records
+inspected_engines: "weakref.WeakSet[Engine]" = weakref.WeakSet()
+
+# Statements of the request being handled, while query inspection is on
+current_query_log: ContextVar[Optional[QueryLog]] = ContextVar(
+    "current_query_log", default=None
+)
+
+
+class QueryInspectorMiddleware:
+    """
+    Pure ASGI middleware reporting the SQL statements of every HTTP request.
+
+    Adds X-DB-Queries (statements run) and X-DB-Time (milliseconds spent in
+    them) response headers, and logs statement shapes repeated at least
+    repeat_threshold times in one request as probable N+1 queries. Streamed
+    responses only count the statements run before their first chunk.
+    """
+
+    def __init__(self, app, repeat_threshold: int):
+        self.app = app
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        query_log = QueryLog(scope)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("X-DB-Queries", str(query_log.statements))
+                headers.append("X-DB-Time", f"{query_log.seconds * 1000:.3f}")
+            await send(message)
+
+        token = current_query_log.set(query_log)
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            current_query_log.reset(token)
+            for shape, count in query_log.repeated(self.repeat_threshold):
+                logger.warning(
+                    f"Probable N+1 query in {query_log.route()}: "
+                    f"{count} statements of shape {shape}"
+                )
+
+
+def inspect_queries(engine: Engine, slow_query_seconds: float):
+    """
+    Record every SQL statement an engine runs in the current query log,
+    and log statements slower than slow_query_seconds with their
+    parameters and route.
+    """
+    logger.setLevel(logging.WARNING)
+    inspected_engines.add(engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("inspected_query_start_times", []).append(
+            time.perf_counter()
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        seconds = time.perf_counter() - conn.info["inspected_query_start_times"].pop()
+        query_log = current_query_log.get()
+        if query_log is not None:
+            query_log.record(statement, seconds)
+        if seconds >= slow_query_seconds:
+            route = query_log.route() if query_log is not None else UNMATCHED_ROUTE
+            logger.warning(
+                f"Slow query in {route} took {seconds * 1000:.1f} ms: "
+                f"{statement} with parameters "
+                f"{repr(parameters)[:MAX_LOGGED_PARAMETERS_LENGTH]}"
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("inspected_query_start_times"):
+            conn.info["inspected_query_start_times"].pop()
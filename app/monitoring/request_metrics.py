@@ -0,0 +1,188 @@
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from monitoring.histogram import Histogram
+
+# Route label of requests that matched no route, so that unknown paths do
+# not create a series each
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Bucket bounds of the number of SQL statements run by a request
+STATEMENT_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+
+class RequestDbStats:
+    """ SQL statement count and time accumulated by one request. """
+
+    __slots__ = ("statements", "seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+
+# Database statistics of the request being handled. Worker threads and the
+# asyncio session's greenlets run in a copy of the request's context, so
+# they add to the same object.
+current_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar(
+    "current_db_stats", default=None
+)
+
+
+class RequestMetrics:
+    """
+    Registry of per-request metrics.
+
+    Keeps latency histograms per method, route and status code, histograms
+    of the SQL statements and database time of requests per method and
+    route, the number of requests in flight, and totals of all SQL
+    statements.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency: Dict[Tuple[str, str, str], Histogram] = {}
+        self._db_statements: Dict[Tuple[str, str], Histogram] = {}
+        self._db_seconds: Dict[Tuple[str, str], Histogram] = {}
+        self.in_flight = 0
+        self.statements_total = 0
+        self.statement_seconds_total = 0.0
+
+    def request_started(self):
+        """ Count a request in flight. """
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(
+        self,
+        method: str,
+        route: str,
+        status: int,
+        seconds: float,
+        db_stats: RequestDbStats,
+    ):
+        """ Record a finished request and the SQL it ran. """
+        with self._lock:
+            self.in_flight -= 1
+            latency = self._latency.get((method, route, str(status)))
+            if latency is None:
+                latency = self._latency[method, route, str(status)] = Histogram()
+            db_statements = self._db_statements.get((method, route))
+            if db_statements is None:
+                db_statements = self._db_statements[method, route] = Histogram(
+                    STATEMENT_COUNT_BUCKETS
+                )
+                self._db_seconds[method, route] = Histogram()
+            db_seconds = self._db_seconds[method, route]
+        latency.observe(seconds)
+        db_statements.observe(db_stats.statements)
+        db_seconds.observe(db_stats.seconds)
+
+    def statement_executed(self, seconds: float):
+        """ Add one SQL statement to the totals and to the current request. """
+        with self._lock:
+            self.statements_total += 1
+            self.statement_seconds_total += seconds
+        db_stats = current_db_stats.get()
+        if db_stats is not None:
+            db_stats.statements += 1
+            db_stats.seconds += seconds
+
+    def snapshot(self) -> Dict:
+        """ Return every series, keyed by its labels. """
+        with self._lock:
+            latency = dict(self._latency)
+            db_statements = dict(self._db_statements)
+            db_seconds = dict(self._db_seconds)
+            state = {
+                "in_flight": self.in_flight,
+                "statements_total": self.statements_total,
+                "statement_seconds_total": self.statement_seconds_total,
+            }
+        return {
+            **state,
+            "latency": {
+                labels: histogram.snapshot() for labels, histogram in latency.items()
+            },
+            "db_statements": {
+                labels: histogram.snapshot()
+                for labels, histogram in db_statements.items()
+            },
+            "db_seconds": {
+                labels: histogram.snapshot() for labels, histogram in db_seconds.items()
+            },
+        }
+
+
+# Request metrics of this worker process
+request_metrics = RequestMetrics()
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording the latency, status and SQL statistics
+    of every HTTP request.
+
+    Requests are labelled with the path template of the route they matched,
+    such as /cities/{city_uuid}, so the number of series stays bounded.
+    """
+
+    def __init__(self, app, metrics: RequestMetrics = request_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        db_stats = RequestDbStats()
+        token = current_db_stats.set(db_stats)
+        self.metrics.request_started()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_db_stats.reset(token)
+            route = scope.get("route")
+            self.metrics.request_finished(
+                scope["method"],
+                getattr(route, "path", UNMATCHED_ROUTE),
+                status,
+                elapsed,
+                db_stats,
+            )
+
+
+def instrument_engine(engine: Engine, metrics: RequestMetrics = request_metrics):
+    """ Time every SQL statement an engine runs. """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        start = conn.info["query_start_times"].pop()
+        metrics.statement_executed(time.perf_counter() - start)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_times"):
+            start = conn.info["query_start_times"].pop()
+            metrics.statement_executed(time.perf_counter() - start)
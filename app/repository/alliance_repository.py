@@ -1,15 +1,20 @@
-from typing import List
+import logging
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
 
+from sqlalchemy import and_, delete, inspect, or_, select
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.exc import SQLAlchemyError
 
-from models.city_model import CityAlliances
+from models.city_model import City, CityAlliances
 
 
 class AllianceRepository:
     """
     Static methods for managing CityAlliances in the database.
 
-    Offers functionality to add and delete alliances in bulk,
+    Offers functionality to add, delete and retrieve alliances in bulk,
     to be used with a SQLAlchemy Session instance.
     """
 
@@ -19,10 +24,97 @@ class AllianceRepository:
         db.bulk_save_objects(alliances)
 
     @staticmethod
-    def delete_city_alliances_bulk(db: Session, city_uuid_pairs: List[tuple]):
-        """Bulk delete alliance records from the database."""
-        for city_uuid1, city_uuid2 in city_uuid_pairs:
-            db.query(CityAlliances).filter(
-                CityAlliances.city_uuid == city_uuid1,
-                CityAlliances.allied_city_uuid == city_uuid2,
-            ).delete(synchronize_session="fetch")
+    def delete_city_alliances_bulk(
+        db: Session, city_uuid: str, allied_city_uuids: Optional[List[str]] = None
+    ):
+        """
+        Bulk delete the alliances of a city in both directions with a single
+        statement.
+
+        Without allied_city_uuids, every alliance of the city is deleted.
+        """
+        forward = CityAlliances.city_uuid == city_uuid
+        backward = CityAlliances.allied_city_uuid == city_uuid
+        if allied_city_uuids is not None:
+            forward = and_(
+                forward, CityAlliances.allied_city_uuid.in_(allied_city_uuids)
+            )
+            backward = and_(backward, CityAlliances.city_uuid.in_(allied_city_uuids))
+        db.execute(delete(CityAlliances).where(or_(forward, backward)))
+
+    @staticmethod
+    def get_alliances_by_city_uuids(
+        db: Session, city_uuids: List[str]
+    ) -> List[CityAlliances]:
+        """Retrieve the alliances of several cities in a single query."""
+        try:
+            return (
+                db.query(CityAlliances)
+                .filter(CityAlliances.city_uuid.in_(city_uuids))
+                .all()
+            )
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    def get_allied_uuids_by_city_uuids(
+        db: Session, city_uuids: List[str]
+    ) -> Dict[str, List[str]]:
+        """
+        Retrieve the allied city UUIDs of several cities in a single query
+        selecting only the two UUID columns.
+
+        Returns:
+            dict: Allied city UUIDs keyed by city UUID, for cities with allies.
+        """
+        try:
+            allied_uuids = defaultdict(list)
+            for city_uuid, allied_city_uuid in db.query(
+                CityAlliances.city_uuid, CityAlliances.allied_city_uuid
+            ).filter(CityAlliances.city_uuid.in_(city_uuids)):
+                allied_uuids[city_uuid].append(allied_city_uuid)
+            return allied_uuids
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    def load_alliances(db: Session, cities: List[City]):
+        """
+        Load the alliances of several cities in a single query.
+
+        Only cities whose alliances relationship is not loaded yet are
+        queried; the results are attached to each city's relationship so
+        later access does not issue a lazy load per city.
+        """
+        unloaded = {
+            city.city_uuid: city
+            for city in cities
+            if "alliances" in inspect(city).unloaded
+        }
+        if not unloaded:
+            return
+        alliances_by_city = defaultdict(list)
+        for alliance in AllianceRepository.get_alliances_by_city_uuids(
+            db, list(unloaded)
+        ):
+            alliances_by_city[alliance.city_uuid].append(alliance)
+        for city_uuid, city in unloaded.items():
+            set_committed_value(city, "alliances", alliances_by_city[city_uuid])
+
+    @staticmethod
+    def iter_alliance_pairs(db: Session, batch_size: int) -> Iterator[Tuple]:
+        """
+        Stream every (city_uuid, allied_city_uuid) pair, fetched from a
+        server-side cursor in batches.
+        """
+        try:
+            statement = select(
+                CityAlliances.city_uuid, CityAlliances.allied_city_uuid
+            ).execution_options(yield_per=batch_size)
+            for row in db.execute(statement):
+                yield row.city_uuid, row.allied_city_uuid
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
@@ -1,10 +1,37 @@
 import logging
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
-from sqlalchemy.orm import Session
+from sqlalchemy import (
+    BigInteger,
+    and_,
+    bindparam,
+    case,
+    delete,
+    insert,
+    literal,
+    or_,
+    select,
+    text,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import array_agg
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.exc import SQLAlchemyError
 
-from models.city_model import City
+from models.city_model import CITY_NAME_SORT_KEY, City, CityAlliances
+from repository.explain import Explain, read_plan
+from schemas.filter_schema import CityFilterParams
+from services.geohash_service import GeohashService
+
+# Cities updated per statement when incrementing allied power
+ALLIED_POWER_BATCH_SIZE = 1000
+
+# Sort keys of the city list besides the UUID, each the leading column of an
+# index that ends with city_uuid
+CITY_SORT_KEYS = {"name": CITY_NAME_SORT_KEY, "population": City.population}
 
 
 class CityRepository:
@@ -17,25 +44,86 @@ class CityRepository:
 
     @staticmethod
     def add_city(db: Session, city_data: Dict) -> City:
-        """ Add a new city record to the database. """
+        """
+        Add a new city record to the database.
+
+        The city starts with an empty alliances collection, so reading it
+        does not issue a lazy load once the city has been flushed.
+        """
         new_city = City(**city_data)
+        CityRepository.set_geohash(new_city)
+        set_committed_value(new_city, "alliances", [])
         db.add(new_city)
         return new_city
 
     @staticmethod
-    def get_city_by_uuid(db: Session, city_uuid: str) -> City:
-        """ Retrieve a city by its UUID. """
+    def set_geohash(city: City):
+        """ Derive a city's geohash from its geolocation. """
+        city.geohash = GeohashService.encode(
+            city.geo_location_latitude, city.geo_location_longitude
+        )
+
+    @staticmethod
+    def add_cities_bulk(db: Session, cities_data: List[Dict]):
+        """ Insert many city records with multi-row INSERT statements. """
+        if cities_data:
+            db.execute(
+                insert(City),
+                [
+                    {
+                        **city_data,
+                        "geohash": GeohashService.encode(
+                            city_data["geo_location_latitude"],
+                            city_data["geo_location_longitude"],
+                        ),
+                    }
+                    for city_data in cities_data
+                ],
+            )
+
+    @staticmethod
+    def get_city_by_uuid(
+        db: Session, city_uuid: str, with_alliances: bool = False
+    ) -> City:
+        """
+        Retrieve a city by its UUID.
+
+        With with_alliances, its alliances are joined into the same query.
+        """
         try:
-            return db.query(City).filter(City.city_uuid == city_uuid).first()
+            query = db.query(City).filter(City.city_uuid == city_uuid)
+            if with_alliances:
+                return query.options(joinedload(City.alliances)).one_or_none()
+            return query.first()
         except SQLAlchemyError as e:
             logging.error(f"SQLAlchemyError occurred: {e}")
             raise
 
     @staticmethod
-    def get_cities_by_uuids(db: Session, city_uuids: List[str]) -> List[City]:
-        """ Retrieve cities by a list of UUIDs. """
+    def get_cities_by_uuids(
+        db: Session,
+        city_uuids: List[str],
+        for_update: bool = False,
+        with_alliances: bool = False,
+    ) -> List[City]:
+        """
+        Retrieve cities by a list of UUIDs.
+
+        With for_update, the rows are locked in UUID order so concurrent
+        writers touching overlapping cities queue up instead of racing, and
+        cities already in the session are refreshed from the locked rows.
+        With with_alliances, their alliances are loaded with one additional
+        SELECT ... IN query.
+        """
         try:
-            return db.query(City).filter(City.city_uuid.in_(city_uuids)).all()
+            query = db.query(City).filter(City.city_uuid.in_(city_uuids))
+            if with_alliances:
+                query = query.options(selectinload(City.alliances))
+            if for_update:
+                query = (
+                    query.order_by(City.city_uuid).with_for_update().populate_existing()
+                )
+            return query.all()
         except SQLAlchemyError as e:
             logging.error(f"SQLAlchemyError occurred: {e}")
             raise
@@ -45,27 +133,405 @@ class CityRepository:
         """ Update a city record with new data. """
         for attr, value in update_data.items():
             setattr(city, attr, value)
+        if update_data.keys() & {"geo_location_latitude", "geo_location_longitude"}:
+            CityRepository.set_geohash(city)
         return city
 
     @staticmethod
-    def delete_city(db: Session, city: City):
-        """ Delete a city record from the database. """
-        db.delete(city)
+    def delete_city(db: Session, city: City) -> bool:
+        """
+        Delete a city record from the database.
+
+        Issued as a single DELETE statement; its alliances in both
+        directions are removed by the ON DELETE CASCADE foreign keys.
+
+        Returns:
+            bool: Whether a row was deleted.
+        """
+        result = db.execute(delete(City).where(City.city_uuid == city.city_uuid))
+        return result.rowcount > 0
+
+    @staticmethod
+    def increment_allied_power(db: Session, deltas: Dict):
+        """
+        Atomically add deltas, keyed by city UUID, to stored allied power.
+
+        Each batch of cities is updated by a single statement mapping UUIDs
+        to deltas with a CASE expression.
+        """
+        city_table = City.__table__
+        items = list(deltas.items())
+        for start in range(0, len(items), ALLIED_POWER_BATCH_SIZE):
+            batch = dict(items[start:start + ALLIED_POWER_BATCH_SIZE])
+            db.execute(
+                city_table.update()
+                .where(city_table.c.city_uuid.in_(list(batch)))
+                .values(
+                    allied_power=city_table.c.allied_power
+                    + case(
+                        {
+                            uuid: literal(delta, BigInteger)
+                            for uuid, delta in batch.items()
+                        },
+                        value=city_table.c.city_uuid,
+                    )
+                )
+            )
+
+    @staticmethod
+    def set_allied_power(db: Session, powers: Dict):
+        """ Overwrite stored allied power, keyed by city UUID. """
+        if not powers:
+            return
+        city_table = City.__table__
+        statement = (
+            city_table.update()
+            .where(city_table.c.city_uuid == bindparam("b_city_uuid"))
+            .values(allied_power=bindparam("b_power"))
+        )
+        db.execute(
+            statement,
+            [{"b_city_uuid": uuid, "b_power": power} for uuid, power in powers.items()],
+        )
+
+    @staticmethod
+    def get_cities(
+        db: Session,
+        skip: int,
+        limit: int,
+        city_filter: Optional[CityFilterParams] = None,
+        sort_field: str = "city_uuid",
+        descending: bool = False,
+        after: Optional[Tuple] = None,
+    ) -> List[City]:
+        """
+        Retrieve a filtered, sorted list of cities with pagination.
+
+        Cities are ordered by sort_field, then by UUID. With after, the
+        sort key of the last city of the previous page, the page starts
+        right after it (keyset pagination) and skip is normally 0.
+        Alliances of the whole page are loaded with one additional
+        SELECT ... IN query.
+        """
+        try:
+            query = CityRepository._list_query(
+                db.query(City).options(selectinload(City.alliances)),
+                city_filter,
+                sort_field,
+                descending,
+                after,
+            )
+            return query.offset(skip).limit(limit).all()
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    def get_city_columns(
+        db: Session,
+        columns: List[str],
+        skip: int,
+        limit: int,
+        city_filter: Optional[CityFilterParams] = None,
+        sort_field: str = "city_uuid",
+        descending: bool = False,
+        after: Optional[Tuple] = None,
+    ) -> List[Row]:
+        """
+        Retrieve a page of cities like get_cities, selecting only the given
+        columns, always with city_uuid, as plain rows instead of entities.
+        """
+        try:
+            query = CityRepository._list_query(
+                db.query(*CityRepository._columns(columns)),
+                city_filter,
+                sort_field,
+                descending,
+                after,
+            )
+            return query.offset(skip).limit(limit).all()
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    def _list_query(
+        query,
+        city_filter: Optional[CityFilterParams],
+        sort_field: str,
+        descending: bool,
+        after: Optional[Tuple],
+    ):
+        """ Apply the filters, the keyset position and the sort to a query. """
+        if city_filter is not None:
+            query = query.filter(*CityRepository.filter_clauses(city_filter))
+        sort_key = [City.city_uuid]
+        if sort_field != "city_uuid":
+            sort_key.insert(0, CITY_SORT_KEYS[sort_field])
+        if after is not None:
+            # Row comparison, typed by the sort key columns, uses their index
+            position, after = tuple_(*sort_key), tuple(after)
+            query = query.filter(position < after if descending else position > after)
+        return query.order_by(
+            *(column.desc() if descending else column for column in sort_key)
+        )
+
+    @staticmethod
+    def filter_clauses(city_filter: CityFilterParams) -> List:
+        """
+        Translate list filters into WHERE clauses, each served by an index:
+        beauty and population by B-trees, a name prefix by a range on the
+        lowercased name, a name substring by the trigram index, and the
+        bounding box by geohash cell ranges.
+        """
+        clauses = []
+        if city_filter.beauty is not None:
+            clauses.append(City.beauty == city_filter.beauty.value)
+        if city_filter.min_population is not None:
+            clauses.append(City.population >= city_filter.min_population)
+        if city_filter.max_population is not None:
+            clauses.append(City.population <= city_filter.max_population)
+        if city_filter.name_prefix is not None:
+            prefix = city_filter.name_prefix.lower()
+            clauses.append(CITY_NAME_SORT_KEY >= prefix)
+            # "~" sorts after letters and spaces, the only name characters
+            clauses.append(CITY_NAME_SORT_KEY < prefix + "~")
+        if city_filter.name_contains is not None:
+            clauses.append(City.name.ilike(f"%{city_filter.name_contains}%"))
+        if city_filter.min_lat is not None:
+            prefixes = GeohashService.covering_box_prefixes(
+                city_filter.min_lat,
+                city_filter.max_lat,
+                city_filter.min_lon,
+                city_filter.max_lon,
+            )
+            if prefixes is None:
+                # Too large for four cells: every one-character cell it touches
+                prefixes = GeohashService.box_cell_prefixes(
+                    city_filter.min_lat,
+                    city_filter.max_lat,
+                    city_filter.min_lon,
+                    city_filter.max_lon,
+                )
+            clauses.append(CityRepository._geohash_cells_clause(prefixes))
+            clauses.append(
+                City.geo_location_latitude.between(
+                    city_filter.min_lat, city_filter.max_lat
+                )
+            )
+            if city_filter.min_lon <= city_filter.max_lon:
+                clauses.append(
+                    City.geo_location_longitude.between(
+                        city_filter.min_lon, city_filter.max_lon
+                    )
+                )
+            else:
+                clauses.append(
+                    or_(
+                        City.geo_location_longitude >= city_filter.min_lon,
+                        City.geo_location_longitude <= city_filter.max_lon,
+                    )
+                )
+        return clauses
+
+    @staticmethod
+    def get_city_columns_by_uuid(
+        db: Session, city_uuid, columns: List[str]
+    ) -> Optional[Row]:
+        """
+        Retrieve the given columns of a city, always with city_uuid, as a
+        plain row instead of an entity.
+        """
+        try:
+            return (
+                db.query(*CityRepository._columns(columns))
+                .filter(City.city_uuid == city_uuid)
+                .one_or_none()
+            )
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    def _columns(columns: List[str]) -> List:
+        """ The City columns of the given names, led by city_uuid. """
+        return [City.city_uuid] + [
+            getattr(City, column) for column in columns if column != "city_uuid"
+        ]
+
+    @staticmethod
+    def count_cities(
+        db: Session, city_filter: Optional[CityFilterParams] = None
+    ) -> int:
+        """ Count the number of cities in the database matching the filters. """
+        try:
+            query = db.query(City)
+            if city_filter is not None:
+                query = query.filter(*CityRepository.filter_clauses(city_filter))
+            return query.count()
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    def estimate_city_count(db: Session) -> int:
+        """
+        Estimate the number of cities from the planner's table statistics.
+
+        Returns -1 or 0 when the table has not been analyzed yet.
+        """
+        try:
+            return db.execute(
+                text(
+                    "SELECT reltuples::bigint FROM pg_class "
+                    "WHERE oid = CAST(:table_name AS regclass)"
+                ),
+                {"table_name": City.__tablename__},
+            ).scalar()
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
 
     @staticmethod
-    def get_cities(db: Session, skip: int, limit: int) -> List[City]:
-        """ Retrieve a list of cities with pagination. """
+    def estimate_filtered_city_count(
+        db: Session, city_filter: CityFilterParams
+    ) -> int:
+        """
+        Estimate the number of cities matching the filters from the
+        planner's row estimate for them.
+        """
+        try:
+            statement = select(City.city_uuid).where(
+                *CityRepository.filter_clauses(city_filter)
+            )
+            return int(read_plan(db.execute(Explain(statement)))["Plan Rows"])
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    def stream_city_locations_in_geohash_cells(
+        db: Session, prefixes: Optional[List[str]], batch_size: int
+    ):
+        """
+        Stream the UUID and geolocation of the cities inside the given
+        geohash cells from a server-side cursor, using one index range scan
+        per prefix. Without prefixes, every city is streamed.
+
+        Yields:
+            Lists of at most batch_size rows.
+        """
+        statement = select(
+            City.city_uuid, City.geo_location_latitude, City.geo_location_longitude
+        )
+        if prefixes is not None:
+            statement = statement.where(CityRepository._geohash_cells_clause(prefixes))
+        try:
+            result = db.execute(statement.execution_options(yield_per=batch_size))
+            yield from result.partitions()
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    def _geohash_cells_clause(prefixes: List[str]):
+        """ Match cities inside the given geohash cells, one range per prefix. """
+        return or_(
+            *(
+                and_(City.geohash >= prefix, City.geohash < prefix + "~")
+                for prefix in prefixes
+            )
+        )
+
+    @staticmethod
+    def get_cities_without_geohash(db: Session, limit: int) -> List[City]:
+        """ Retrieve cities whose geohash has not been computed yet. """
+        try:
+            return db.query(City).filter(City.geohash.is_(None)).limit(limit).all()
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    def get_export_statement(with_alliances: bool):
+        """
+        Build the column-only SELECT used to export all cities in UUID order.
+
+        With alliances, each row carries an array of allied city UUIDs from
+        a correlated subquery, which keeps the scan streamable.
+        """
+        columns = [
+            City.city_uuid,
+            City.name,
+            City.geo_location_latitude,
+            City.geo_location_longitude,
+            City.beauty,
+            City.population,
+        ]
+        if with_alliances:
+            columns.append(
+                select(array_agg(CityAlliances.allied_city_uuid))
+                .where(CityAlliances.city_uuid == City.city_uuid)
+                .scalar_subquery()
+                .label("alliances")
+            )
+        return select(*columns).order_by(City.city_uuid)
+
+    @staticmethod
+    def stream_cities(db: Session, with_alliances: bool, batch_size: int):
+        """
+        Stream export rows from a server-side cursor, one batch at a time.
+
+        Yields:
+            Lists of at most batch_size rows.
+        """
+        try:
+            result = db.execute(
+                CityRepository.get_export_statement(with_alliances).execution_options(
+                    yield_per=batch_size
+                )
+            )
+            yield from result.partitions()
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    async def stream_cities_async(
+        db: AsyncSession, with_alliances: bool, batch_size: int
+    ):
+        """
+        Stream export rows from a server-side cursor on an asyncio session.
+
+        Yields:
+            Lists of at most batch_size rows.
+        """
         try:
-            return db.query(City).offset(skip).limit(limit).all()
+            result = await db.stream(
+                CityRepository.get_export_statement(with_alliances).execution_options(
+                    yield_per=batch_size
+                )
+            )
+            async for partition in result.partitions():
+                yield partition
         except SQLAlchemyError as e:
             logging.error(f"SQLAlchemyError occurred: {e}")
             raise
 
     @staticmethod
-    def count_cities(db: Session) -> int:
-        """ Count the number of cities in the database. """
+    def get_city_locations(db: Session, city_uuids: List) -> List[Row]:
+        """
+        Retrieve the geolocation of several cities, selecting only the UUID
+        and coordinate columns.
+        """
         try:
-            return db.query(City).count()
+            return db.execute(
+                select(
+                    City.city_uuid,
+                    City.geo_location_latitude,
+                    City.geo_location_longitude,
+                ).where(City.city_uuid.in_(city_uuids))
+            ).all()
         except SQLAlchemyError as e:
             logging.error(f"SQLAlchemyError occurred: {e}")
             raise
@@ -0,0 +1,33 @@
+import json
+from typing import Dict
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+
+class Explain(Executable, ClauseElement):
+    """
+    EXPLAIN (FORMAT JSON) of a statement, executed like any statement so
+    that its parameters are bound by the driver as usual.
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def read_plan(result) -> Dict:
+    """
+    Top plan node of an EXPLAIN (FORMAT JSON) result. psycopg2 decodes the
+    JSON, asyncpg returns it as text.
+    """
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
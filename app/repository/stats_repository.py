@@ -0,0 +1,242 @@
+import logging
+from typing import Dict, List
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.city_model import City, CityAlliances, CityBeautyStats, CityDegreeStats
+
+# Counter columns of the beauty rollup, in the order deltas list them
+BEAUTY_COUNTERS = (
+    "city_count",
+    "total_population",
+    "total_allied_power",
+    "allied_power_count",
+)
+
+
+class StatsRepository:
+    """
+    Static methods for the rollup counters behind the city statistics.
+
+    Reads the rollups, adds deltas to them, and computes the same
+    aggregates from scratch over the city tables to refresh or verify them.
+    """
+
+    @staticmethod
+    def get_city_states(db: Session, city_uuids: List) -> Dict[object, Row]:
+        """
+        Retrieve the beauty, population, stored allied power and alliance
+        degree of several cities in a single query.
+
+        Returns:
+            dict: Rows keyed by city UUID, for cities that exist.
+        """
+        if not city_uuids:
+            return {}
+        degree = (
+            select(func.count())
+            .where(CityAlliances.city_uuid == City.city_uuid)
+            .correlate(City)
+            .scalar_subquery()
+        )
+        try:
+            rows = db.execute(
+                select(
+                    City.city_uuid,
+                    City.beauty,
+                    City.population,
+                    City.allied_power,
+                    degree.label("degree"),
+                ).where(City.city_uuid.in_(city_uuids))
+            )
+            return {row.city_uuid: row for row in rows}
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    def add_stats_deltas(
+        db: Session, shard: int, beauty_deltas: Dict, degree_deltas: Dict
+    ):
+        """
+        Add deltas to the rollup counters of one shard, creating missing
+        counter rows.
+
+        Rows are upserted in key order, so concurrent writers on the same
+        shard lock them in the same order.
+
+        Args:
+            beauty_deltas: Tuples of BEAUTY_COUNTERS deltas keyed by beauty.
+            degree_deltas: City count deltas keyed by alliance degree.
+        """
+        try:
+            if beauty_deltas:
+                statement = pg_insert(CityBeautyStats).values(
+                    [
+                        {
+                            "beauty": beauty,
+                            "shard": shard,
+                            **dict(zip(BEAUTY_COUNTERS, beauty_deltas[beauty])),
+                        }
+                        for beauty in sorted(beauty_deltas, key=lambda b: b.value)
+                    ]
+                )
+                db.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=["beauty", "shard"],
+                        set_={
+                            counter: getattr(CityBeautyStats, counter)
+                            + getattr(statement.excluded, counter)
+                            for counter in BEAUTY_COUNTERS
+                        },
+                    )
+                )
+            if degree_deltas:
+                statement = pg_insert(CityDegreeStats).values(
+                    [
+                        {"degree": degree, "shard": shard, "city_count": count}
+                        for degree, count in sorted(degree_deltas.items())
+                    ]
+                )
+                db.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=["degree", "shard"],
+                        set_={
+                            "city_count": CityDegreeStats.city_count
+                            + statement.excluded.city_count
+                        },
+                    )
+                )
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    def get_beauty_stats(db: Session) -> List[Row]:
+        """ Sum the beauty rollups over their shards, skipping empty beauties. """
+        try:
+            return db.execute(
+                select(
+                    CityBeautyStats.beauty,
+                    *(
+                        func.sum(getattr(CityBeautyStats, counter)).label(counter)
+                        for counter in BEAUTY_COUNTERS
+                    ),
+                )
+                .group_by(CityBeautyStats.beauty)
+                .having(func.sum(CityBeautyStats.city_count) > 0)
+            ).all()
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    def get_degree_stats(db: Session) -> List[Row]:
+        """ Sum the degree rollups over their shards, skipping empty degrees. """
+        try:
+            return db.execute(
+                select(
+                    CityDegreeStats.degree,
+                    func.sum(CityDegreeStats.city_count).label("city_count"),
+                )
+                .group_by(CityDegreeStats.degree)
+                .having(func.sum(CityDegreeStats.city_count) > 0)
+                .order_by(CityDegreeStats.degree)
+            ).all()
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    def has_stats(db: Session) -> bool:
+        """ Tell whether any rollup counter row exists. """
+        try:
+            statement = select(CityBeautyStats.shard).limit(1)
+            return db.execute(statement).first() is not None
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    def aggregate_beauty_stats(db: Session) -> List[Row]:
+        """ Compute the beauty rollups from scratch over the city table. """
+        try:
+            return db.execute(
+                select(
+                    City.beauty,
+                    func.count().label("city_count"),
+                    func.sum(City.population).label("total_population"),
+                    func.coalesce(func.sum(City.allied_power), 0).label(
+                        "total_allied_power"
+                    ),
+                    func.count(City.allied_power).label("allied_power_count"),
+                ).group_by(City.beauty)
+            ).all()
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    def aggregate_degree_stats(db: Session) -> List[Row]:
+        """
+        Compute the degree rollups from scratch, counting cities without
+        alliances as degree 0.
+        """
+        degrees = (
+            select(CityAlliances.city_uuid, func.count().label("degree"))
+            .group_by(CityAlliances.city_uuid)
+            .subquery()
+        )
+        degree = func.coalesce(degrees.c.degree, 0)
+        try:
+            return db.execute(
+                select(degree.label("degree"), func.count().label("city_count"))
+                .select_from(City)
+                .outerjoin(degrees, degrees.c.city_uuid == City.city_uuid)
+                .group_by(degree)
+                .order_by(degree)
+            ).all()
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
+
+    @staticmethod
+    def lock_stats(db: Session):
+        """
+        Lock the rollup tables against writes until the transaction ends.
+
+        Writers already holding counter rows are waited for, so aggregates
+        computed afterwards include their changes; later writers wait.
+        """
+        db.execute(
+            text(
+                f"LOCK TABLE {CityBeautyStats.__tablename__}, "
+                f"{CityDegreeStats.__tablename__} IN EXCLUSIVE MODE"
+            )
+        )
+
+    @staticmethod
+    def replace_stats(
+        db: Session, beauty_stats: List[Row], degree_stats: List[Row]
+    ):
+        """ Replace every rollup counter with the given aggregates, in shard 0. """
+        try:
+            db.execute(delete(CityBeautyStats))
+            db.execute(delete(CityDegreeStats))
+            if beauty_stats:
+                db.execute(
+                    insert(CityBeautyStats),
+                    [{"shard": 0, **row._asdict()} for row in beauty_stats],
+                )
+            if degree_stats:
+                db.execute(
+                    insert(CityDegreeStats),
+                    [{"shard": 0, **row._asdict()} for row in degree_stats],
+                )
+        except SQLAlchemyError as e:
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise
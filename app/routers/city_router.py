@@ -1,52 +1,412 @@
 import logging
+from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
-from schemas.city_schema import CityCreate, CityDisplay, CityDisplayPower, CityPatch
+from schemas.alliance_schema import (
+    AllianceBlocDisplay,
+    AllianceNeighbourDisplay,
+    AllianceNeighbourhoodDisplay,
+    MultiHopAlliedPowerDisplay,
+)
+from schemas.bulk_schema import BulkImportReport
+from schemas.city_schema import (
+    CITY_FIELDS,
+    CityBatchDisplay,
+    CityBatchGetRequest,
+    CityCreate,
+    CityDisplay,
+    CityDistanceMatrixRequest,
+    CityDisplayPower,
+    CityNearbyDisplay,
+    CityPatch,
+)
+from schemas.filter_schema import CityFilterParams
 from schemas.pagination_schema import PaginationParams, PaginatedResponseModel
+from schemas.stats_schema import CityStatsDisplay
+from services.alliance_graph_service import AllianceGraphService
+from services.bulk_import_service import BulkImportService
+from services.city_cache_service import city_cache, etag_matches, make_etag
 from services.city_service import CityService
+from services.city_stats_service import CityStatsService
+from services.distance_matrix_service import DistanceMatrixService
+from services.distance_service import DistanceService
+from services.export_service import MEDIA_TYPES, ExportService
+from services.json_encoding_service import JsonEncodingService
+from services.spatial_service import MAX_DISTANCE_KM, SpatialService
 
-from config.db_postg import get_db
+import config.app_config as app_config
+from config.db_postg import DbSession, get_db_session, run_db
 
 router = APIRouter()
 
+SUPPORTED_INCLUDES = {"allied_power"}
+
+
+def parse_includes(include: Optional[str]) -> set:
+    """
+    Parse a comma-separated include parameter.
+
+    Raises ValueError for unsupported values.
+    """
+    if not include:
+        return set()
+    includes = {value.strip() for value in include.split(",") if value.strip()}
+    unsupported = includes - SUPPORTED_INCLUDES
+    if unsupported:
+        raise ValueError(
+            f"Unsupported include values: {', '.join(sorted(unsupported))}"
+        )
+    return includes
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Parse a comma-separated fields parameter, None when it is empty.
+
+    Raises ValueError for unknown fields.
+    """
+    if not fields:
+        return None
+    requested = [value.strip() for value in fields.split(",") if value.strip()]
+    unknown = set(requested) - set(CITY_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [field for field in CITY_FIELDS if field in requested] or None
+
+
+# The helpers below run synchronously inside run_db, either on a worker
+# thread or inside the async session's greenlet. Responses are built there
+# so that lazy loads during serialization never run on the event loop.
+
+
+def _create_city(db: Session, city: CityCreate) -> CityDisplay:
+    """ Create a city and build its display model. """
+    return CityDisplay.model_validate(
+        CityService.create_city(
+            db, city.model_dump(exclude={"alliances"}), city.alliances
+        )
+    )
+
+
+def _read_cities(
+    db: Session,
+    pagination: PaginationParams,
+    include_allied_power: bool,
+    fields: Optional[List[str]] = None,
+    city_filter: Optional[CityFilterParams] = None,
+):
+    """
+    Read a page of cities and build the paginated response, or encode it
+    directly with FAST_JSON_RESPONSES. With fields, the page holds records
+    of only those fields.
+    """
+    city_page = CityService.read_cities(
+        db,
+        pagination,
+        include_allied_power=include_allied_power,
+        fields=fields,
+        city_filter=city_filter,
+    )
+    if fields is not None:
+        page = pagination.page if pagination.cursor is None else None
+        if app_config.FAST_JSON_RESPONSES:
+            return Response(
+                JsonEncodingService.encode_city_record_page(
+                    city_page, page, pagination.page_size
+                ),
+                media_type="application/json",
+            )
+        return PaginatedResponseModel(
+            total=city_page.total,
+            page=page,
+            page_size=pagination.page_size,
+            total_pages=city_page.total_pages,
+            cities=city_page.cities,
+            total_is_estimate=city_page.total_is_estimate,
+            next_cursor=city_page.next_cursor,
+        )
+    if app_config.FAST_JSON_RESPONSES:
+        return Response(
+            JsonEncodingService.encode_city_page(
+                city_page,
+                pagination.page if pagination.cursor is None else None,
+                pagination.page_size,
+                include_allied_power,
+            ),
+            media_type="application/json",
+        )
+    return build_city_page_model(city_page, pagination, include_allied_power)
+
+
+def build_city_page_model(
+    city_page, pagination: PaginationParams, include_allied_power: bool
+) -> PaginatedResponseModel:
+    """ Build the paginated response model of a page of cities. """
+    display_model = CityDisplayPower if include_allied_power else CityDisplay
+    return PaginatedResponseModel(
+        total=city_page.total,
+        page=pagination.page if pagination.cursor is None else None,
+        page_size=pagination.page_size,
+        total_pages=city_page.total_pages,
+        cities=[display_model.model_validate(city) for city in city_page.cities],
+        total_is_estimate=city_page.total_is_estimate,
+        next_cursor=city_page.next_cursor,
+    )
+
+
+def _read_cities_by_uuids(
+    db: Session, city_uuids: List[UUID], include_allied_power: bool
+) -> CityBatchDisplay:
+    """ Read many cities by UUID and build the batch response. """
+    cities, missing = CityService.read_cities_by_uuids(
+        db, city_uuids, include_allied_power=include_allied_power
+    )
+    display_model = CityDisplayPower if include_allied_power else CityDisplay
+    return CityBatchDisplay(
+        cities=[display_model.model_validate(city) for city in cities],
+        missing=missing,
+    )
+
+
+def _find_near_cities(
+    db: Session,
+    lat: float,
+    lon: float,
+    radius_km: Optional[float],
+    k: Optional[int],
+) -> List[CityNearbyDisplay]:
+    """ Run a radius or nearest-neighbour query and build its display models. """
+    if k is None:
+        matches = SpatialService.find_within_radius(
+            db, lat, lon, radius_km, app_config.NEAR_MAX_RESULTS
+        )
+    else:
+        matches = SpatialService.find_nearest(db, lat, lon, k, radius_km)
+    return [
+        CityNearbyDisplay(
+            **CityDisplay.model_validate(city).model_dump(),
+            distance_km=round(distance, 3),
+        )
+        for city, distance in matches
+    ]
+
+
+def _read_city_body(db: Session, city_uuid: UUID) -> bytes:
+    """ Read a city and encode its display model with allied power. """
+    city = CityService.read_city(db, city_uuid)
+    if app_config.FAST_JSON_RESPONSES:
+        return JsonEncodingService.encode_city(city)
+    display = CityDisplayPower.model_validate(city)
+    return JSONResponse(display.model_dump(mode="json")).body
+
+
+def _read_city_record_body(db: Session, city_uuid: UUID, fields: List[str]) -> bytes:
+    """ Read the given fields of a city and encode them. """
+    record = CityService.read_city_record(db, city_uuid, fields)
+    if app_config.FAST_JSON_RESPONSES:
+        return JsonEncodingService.encode_city_record(record)
+    return JSONResponse(jsonable_encoder(record)).body
+
+
+def _read_bloc(db: Session, city_uuid: UUID, limit: int) -> AllianceBlocDisplay:
+    """ Find the alliance bloc of a city and build its display model. """
+    bloc_size, members = AllianceGraphService.get_bloc(db, city_uuid, limit)
+    return AllianceBlocDisplay(
+        city_uuid=city_uuid,
+        bloc_size=bloc_size,
+        members=members,
+        members_truncated=bloc_size > len(members),
+    )
+
+
+def _read_neighbours(
+    db: Session, city_uuid: UUID, hops: int
+) -> AllianceNeighbourhoodDisplay:
+    """ Find the cities within hops of a city and build their display model. """
+    return AllianceNeighbourhoodDisplay(
+        city_uuid=city_uuid,
+        hops=hops,
+        neighbours=[
+            AllianceNeighbourDisplay(city_uuid=uuid, hops=hop)
+            for uuid, hop in AllianceGraphService.get_neighbours(db, city_uuid, hops)
+        ],
+    )
+
+
+def _read_multi_hop_power(
+    db: Session, city_uuid: UUID, hops: int
+) -> MultiHopAlliedPowerDisplay:
+    """ Calculate the allied power of a city over hops and build its model. """
+    allied_power, allies_counted = AllianceGraphService.calculate_allied_power(
+        db, city_uuid, hops
+    )
+    return MultiHopAlliedPowerDisplay(
+        city_uuid=city_uuid,
+        hops=hops,
+        allied_power=allied_power,
+        allies_counted=allies_counted,
+    )
+
+
+def _read_stats(db: Session) -> CityStatsDisplay:
+    """ Read the city statistics and build their display model. """
+    return CityStatsDisplay.model_validate(
+        CityStatsService.read_stats(db)._asdict()
+    )
+
+
+def _update_city(db: Session, city_uuid: UUID, city_update: CityPatch) -> CityDisplay:
+    """ Update a city and build its display model. """
+    return CityDisplay.model_validate(
+        CityService.update_city(db, city_uuid, city_update)
+    )
+
 
 @router.post("/", response_model=CityDisplay)
-async def create_city(city: CityCreate, db: Session = Depends(get_db)):
+async def create_city(city: CityCreate, db: DbSession = Depends(get_db_session)):
     """
     Create a new city.
     Adds a city to the database with the provided details
     Returns the newly created city with uuid.
     """
     try:
-        return CityService.create_city(
-            db, city.dict(exclude={"alliances"}), city.alliances
+        return await run_db(db, _create_city, city)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.error(f"Error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.post("/bulk", response_model=BulkImportReport)
+async def bulk_import_cities(request: Request, db: DbSession = Depends(get_db_session)):
+    """
+    Import cities in bulk.
+    Accepts a streamed NDJSON (application/x-ndjson) or CSV (text/csv) body
+    with one city per line, validated and written in chunks. Alliances may
+    reference existing cities or cities earlier in the same import.
+    Returns a report with the errors of every rejected row.
+    """
+    try:
+        import_format = BulkImportService.get_format(
+            request.headers.get("content-type")
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    try:
+        report = BulkImportReport()
+        async for chunk in BulkImportService.iter_row_chunks(
+            request.stream(), import_format, app_config.BULK_IMPORT_CHUNK_SIZE
+        ):
+            inserted, errors = await run_db(db, BulkImportService.import_chunk, chunk)
+            report.received += len(chunk)
+            report.inserted += inserted
+            report.failed += len(errors)
+            room = app_config.BULK_IMPORT_MAX_ERRORS - len(report.errors)
+            report.errors.extend(errors[:room])
+            report.errors_truncated |= len(errors) > room
+        return report
+    except Exception as e:
+        logging.error(f"Error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.post("/batch-get", response_model=CityBatchDisplay)
+async def batch_get_cities(
+    batch: CityBatchGetRequest,
+    include: Optional[str] = Query(
+        None, description="Comma-separated extras, supports: allied_power"
+    ),
+    db: DbSession = Depends(get_db_session),
+):
+    """
+    Retrieve many cities by UUID.
+    Returns the cities found, in the order requested, with one query,
+    and lists the UUIDs that matched no city under missing.
+    With include=allied_power, each city also carries its allied power.
+    """
+    try:
+        includes = parse_includes(include)
+        return await run_db(
+            db, _read_cities_by_uuids, batch.city_uuids, "allied_power" in includes
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.error(f"Error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.post("/distance-matrix")
+async def distance_matrix(
+    matrix: CityDistanceMatrixRequest,
+    db: DbSession = Depends(get_db_session),
+):
+    """
+    Retrieve the pairwise distances between cities, in kilometers.
+    Returns the full matrix row by row, or with format=condensed the
+    upper triangle flattened like scipy's pdist. Only the coordinates
+    are read; distances are computed in bounded blocks and streamed.
+    """
+    try:
+        mode = DistanceService.get_mode(matrix.mode)
+        lats, lons = await run_db(
+            db, DistanceMatrixService.load_locations, matrix.city_uuids
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logging.error(f"Error occurred: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
+    return StreamingResponse(
+        DistanceMatrixService.iter_matrix(
+            matrix.city_uuids, lats, lons, matrix.format.value, mode
+        ),
+        media_type="application/json",
+    )
 
 
 @router.get("/", response_model=PaginatedResponseModel)
 async def read_cities(
-    pagination: PaginationParams = Depends(), db: Session = Depends(get_db)
+    pagination: PaginationParams = Depends(),
+    city_filter: CityFilterParams = Depends(),
+    include: Optional[str] = Query(
+        None, description="Comma-separated extras, supports: allied_power"
+    ),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated city fields to return, default all"
+    ),
+    db: DbSession = Depends(get_db_session),
 ):
     """
     Retrieve cities with pagination.
     Returns a list of cities, the total count, page size,
     total number of pages, with automatic pagination handling.
+    Follow next_cursor with the cursor parameter for keyset pagination.
+    With include=allied_power, each city also carries its allied power.
+    With fields, each city carries only those fields, and only their
+    columns are read.
+    Filters narrow the list, and sort orders it by name or population,
+    each backed by an index; a cursor only works with its own sort.
     """
     try:
-        cities, total_count, total_pages = CityService.read_cities(db, pagination)
-        return PaginatedResponseModel(
-            total=total_count,
-            page=pagination.page,
-            page_size=pagination.page_size,
-            total_pages=total_pages,
-            cities=[CityDisplay.from_orm(city) for city in cities],
+        includes = parse_includes(include)
+        selected = parse_fields(fields)
+        if selected is not None and "allied_power" in includes:
+            # allied_power is the last field, so display order is kept
+            selected = [field for field in selected if field != "allied_power"]
+            selected.append("allied_power")
+        return await run_db(
+            db,
+            _read_cities,
+            pagination,
+            "allied_power" in includes,
+            selected,
+            city_filter,
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -55,14 +415,173 @@ async def read_cities(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.get("/export")
+async def export_cities(
+    export_format: str = Query(
+        "ndjson", alias="format", description="Export format: ndjson or csv"
+    ),
+    alliances: bool = Query(False, description="Inline allied city UUIDs"),
+):
+    """
+    Export all cities.
+    Streams every city as NDJSON or CSV from a server-side cursor,
+    optionally with the UUIDs of its allies, in the layout accepted
+    by the bulk import.
+    """
+    try:
+        chunks = ExportService.iter_export(export_format, alliances)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[export_format])
+
+
+@router.get("/near", response_model=List[CityNearbyDisplay])
+async def read_near_cities(
+    lat: float = Query(..., ge=-90.0, le=90.0, description="Latitude"),
+    lon: float = Query(..., ge=-180.0, le=180.0, description="Longitude"),
+    radius_km: Optional[float] = Query(
+        None, gt=0, le=MAX_DISTANCE_KM, description="Search radius in kilometers"
+    ),
+    k: Optional[int] = Query(
+        None,
+        gt=0,
+        le=app_config.NEAR_MAX_RESULTS,
+        description="Number of nearest cities",
+    ),
+    db: DbSession = Depends(get_db_session),
+):
+    """
+    Retrieve cities near a point.
+    With radius_km, returns the cities within that distance, at most
+    NEAR_MAX_RESULTS of them. With k, returns the k nearest cities, limited
+    to radius_km if both are given. Results are ordered by distance and
+    carry it in kilometers.
+    """
+    if radius_km is None and k is None:
+        raise HTTPException(status_code=400, detail="Provide radius_km or k")
+    try:
+        return await run_db(db, _find_near_cities, lat, lon, radius_km, k)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.error(f"Error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/stats", response_model=CityStatsDisplay)
+async def read_city_stats(db: DbSession = Depends(get_db_session)):
+    """
+    Retrieve aggregate city statistics.
+    Returns city counts and population by beauty, the distribution of
+    alliance degrees and the average allied power, read from rollups kept
+    up to date by every write, so the cost does not grow with the table.
+    """
+    try:
+        return await run_db(db, _read_stats)
+    except Exception as e:
+        logging.error(f"Error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
 @router.get("/{city_uuid}", response_model=CityDisplayPower)
-async def read_city(city_uuid: UUID, db: Session = Depends(get_db)):
+async def read_city(
+    city_uuid: UUID,
+    fields: Optional[str] = Query(
+        None, description="Comma-separated city fields to return, default all"
+    ),
+    if_none_match: Optional[str] = Header(None),
+    db: DbSession = Depends(get_db_session),
+):
     """
     Retrieve a single city.
     Returns details of a specific city by its UUID along with its allied power
+    Responses carry an ETag; a matching If-None-Match returns 304.
+    With fields, only those fields are read and returned, bypassing the cache.
+    """
+    try:
+        selected = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        if selected is not None:
+            body = await run_db(db, _read_city_record_body, city_uuid, selected)
+            headers = {"ETag": make_etag(body)}
+            if etag_matches(if_none_match, headers["ETag"]):
+                return Response(status_code=304, headers=headers)
+            return Response(body, media_type="application/json", headers=headers)
+        entry = city_cache.get(city_uuid)
+        if entry is None:
+            generation = city_cache.generation()
+            body = await run_db(db, _read_city_body, city_uuid)
+            entry = city_cache.set(city_uuid, body, generation)
+        headers = {"ETag": entry.etag}
+        if etag_matches(if_none_match, entry.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(entry.body, media_type="application/json", headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logging.error(f"Error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/{city_uuid}/bloc", response_model=AllianceBlocDisplay)
+async def read_city_bloc(
+    city_uuid: UUID,
+    limit: int = Query(1000, gt=0, le=100000, description="Maximum members listed"),
+    db: DbSession = Depends(get_db_session),
+):
+    """
+    Retrieve the alliance bloc of a city.
+    Returns the size of the group of cities connected to the city by
+    chains of alliances, the city included, and up to limit members.
+    """
+    try:
+        return await run_db(db, _read_bloc, city_uuid, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logging.error(f"Error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/{city_uuid}/neighbours", response_model=AllianceNeighbourhoodDisplay)
+async def read_city_neighbours(
+    city_uuid: UUID,
+    hops: int = Query(
+        1, gt=0, le=app_config.ALLIANCE_GRAPH_MAX_HOPS, description="Alliance hops"
+    ),
+    db: DbSession = Depends(get_db_session),
+):
+    """
+    Retrieve the alliance neighbourhood of a city.
+    Returns every city within hops alliances of the city, with the
+    number of hops needed to reach it.
+    """
+    try:
+        return await run_db(db, _read_neighbours, city_uuid, hops)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logging.error(f"Error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/{city_uuid}/allied-power", response_model=MultiHopAlliedPowerDisplay)
+async def read_city_multi_hop_power(
+    city_uuid: UUID,
+    hops: int = Query(
+        1, gt=0, le=app_config.ALLIANCE_GRAPH_MAX_HOPS, description="Alliance hops"
+    ),
+    db: DbSession = Depends(get_db_session),
+):
+    """
+    Retrieve the allied power of a city over several hops.
+    Every city within hops alliances counts as an ally, with the usual
+    distance discount. With one hop this is the regular allied power.
     """
     try:
-        return CityService.read_city(db, city_uuid)
+        return await run_db(db, _read_multi_hop_power, city_uuid, hops)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -72,14 +591,14 @@ async def read_city(city_uuid: UUID, db: Session = Depends(get_db)):
 
 @router.patch("/{city_uuid}", response_model=CityDisplay)
 async def update_city(
-    city_uuid: UUID, city_update: CityPatch, db: Session = Depends(get_db)
+    city_uuid: UUID, city_update: CityPatch, db: DbSession = Depends(get_db_session)
 ):
     """
     Update a city. Modifies details of a specific city in the database.
     Only updates the fields provided in the request.
     """
     try:
-        return CityService.update_city(db, city_uuid, city_update)
+        return await run_db(db, _update_city, city_uuid, city_update)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -88,13 +607,13 @@ async def update_city(
 
 
 @router.delete("/{city_uuid}")
-async def delete_city(city_uuid: UUID, db: Session = Depends(get_db)):
+async def delete_city(city_uuid: UUID, db: DbSession = Depends(get_db_session)):
     """
     Delete a city.
     Removes a specific city from the database along its alliances.
     """
     try:
-        CityService.delete_city(db, city_uuid)
+        await run_db(db, CityService.delete_city, city_uuid)
         return {"message": "City deleted successfully"}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
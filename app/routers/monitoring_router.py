@@ -0,0 +1,124 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse, Response
+
+import config.db_engine_config as engine_config
+from monitoring.pool_monitor import pool_monitors
+from monitoring.prometheus import PrometheusWriter
+from monitoring.request_metrics import request_metrics
+from services.city_cache_service import city_cache
+
+router = APIRouter()
+
+# Serves /metrics at the root, where Prometheus scrapes by default
+metrics_router = APIRouter()
+
+# Media type of the Prometheus text exposition format
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4"
+
+
+@router.get("/pool")
+async def read_pool_stats():
+    """
+    Retrieve connection pool telemetry.
+    Returns the pool settings and, for each engine of this worker process,
+    its checked-out, idle and overflow connections, checkout wait time
+    histogram, peaks, timeouts and invalidation counts.
+    """
+    return {
+        "settings": {
+            "pool_size": engine_config.POOL_SIZE,
+            "max_overflow": engine_config.MAX_OVERFLOW,
+            "pool_timeout": engine_config.POOL_TIMEOUT,
+            "pool_pre_ping": engine_config.POOL_PRE_PING,
+            "pool_recycle": engine_config.POOL_RECYCLE,
+            "statement_timeout_ms": engine_config.STATEMENT_TIMEOUT_MS,
+        },
+        "pools": {name: monitor.stats() for name, monitor in pool_monitors.items()},
+    }
+
+
+def render_metrics() -> str:
+    """ Render request, pool and cache metrics in the Prometheus format. """
+    writer = PrometheusWriter()
+    requests = request_metrics.snapshot()
+
+    writer.histograms(
+        "http_request_duration_seconds",
+        "HTTP request latency by method, route and status.",
+        (
+            ((("method", method), ("route", route), ("status", status)), snapshot)
+            for (method, route, status), snapshot in requests["latency"].items()
+        ),
+    )
+    writer.metric("http_requests_in_flight", "gauge", "HTTP requests in progress.")
+    writer.sample("http_requests_in_flight", requests["in_flight"])
+    writer.histograms(
+        "http_request_db_statements",
+        "SQL statements run per HTTP request, by method and route.",
+        (
+            ((("method", method), ("route", route)), snapshot)
+            for (method, route), snapshot in requests["db_statements"].items()
+        ),
+    )
+    writer.histograms(
+        "http_request_db_seconds",
+        "Time spent in SQL statements per HTTP request, by method and route.",
+        (
+            ((("method", method), ("route", route)), snapshot)
+            for (method, route), snapshot in requests["db_seconds"].items()
+        ),
+    )
+    writer.metric("db_statements_total", "counter", "SQL statements run.")
+    writer.sample("db_statements_total", requests["statements_total"])
+    writer.metric(
+        "db_statement_seconds_total", "counter", "Time spent in SQL statements."
+    )
+    writer.sample("db_statement_seconds_total", requests["statement_seconds_total"])
+
+    pools = {name: monitor.stats() for name, monitor in pool_monitors.items()}
+    for key, metric_type, help_text in (
+        ("checked_out", "gauge", "Connections checked out of the pool."),
+        ("checked_in", "gauge", "Idle connections in the pool."),
+        ("overflow", "gauge", "Overflow connections open beyond the pool size."),
+        ("connects", "counter", "Connections opened by the pool."),
+        ("checkouts", "counter", "Connections checked out of the pool."),
+        ("invalidations", "counter", "Connections invalidated."),
+        ("timeouts", "counter", "Checkouts that timed out."),
+    ):
+        name = f"db_pool_{key}" + ("_total" if metric_type == "counter" else "")
+        writer.metric(name, metric_type, help_text)
+        for pool, stats in pools.items():
+            writer.sample(name, stats[key], (("pool", pool),))
+    writer.histograms(
+        "db_pool_checkout_wait_seconds",
+        "Time spent waiting for a pooled connection.",
+        (
+            ((("pool", pool),), stats["checkout_wait_seconds"])
+            for pool, stats in pools.items()
+        ),
+    )
+
+    cache = city_cache.stats()
+    for key, metric_type, help_text in (
+        ("hits", "counter", "City cache hits."),
+        ("misses", "counter", "City cache misses."),
+        ("evictions", "counter", "City cache evictions."),
+        ("invalidations", "counter", "City cache invalidations."),
+        ("entries", "gauge", "Entries in the city cache."),
+        ("size_bytes", "gauge", "Size of the city cache entries."),
+    ):
+        name = f"city_cache_{key}" + ("_total" if metric_type == "counter" else "")
+        writer.metric(name, metric_type, help_text)
+        writer.sample(name, cache[key])
+    return writer.render()
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    """
+    Retrieve metrics in the Prometheus text format.
+    Covers request latency per route and status, requests in flight, SQL
+    statements and time per request, connection pool and city cache
+    statistics of this worker process.
+    """
+    return Response(render_metrics(), media_type=PROMETHEUS_MEDIA_TYPE)
@@ -0,0 +1,40 @@
+from typing import List
+
+from pydantic import BaseModel, UUID4
+
+
+class AllianceBlocDisplay(BaseModel):
+    """
+    Model for displaying the alliance bloc of a city.
+    """
+    city_uuid: UUID4
+    bloc_size: int
+    members: List[UUID4]
+    members_truncated: bool
+
+
+class AllianceNeighbourDisplay(BaseModel):
+    """
+    Model for displaying a city within a number of alliance hops.
+    """
+    city_uuid: UUID4
+    hops: int
+
+
+class AllianceNeighbourhoodDisplay(BaseModel):
+    """
+    Model for displaying the cities within a number of alliance hops.
+    """
+    city_uuid: UUID4
+    hops: int
+    neighbours: List[AllianceNeighbourDisplay]
+
+
+class MultiHopAlliedPowerDisplay(BaseModel):
+    """
+    Model for displaying the allied power of a city over several hops.
+    """
+    city_uuid: UUID4
+    hops: int
+    allied_power: int
+    allies_counted: int
@@ -0,0 +1,22 @@
+from typing import List
+
+from pydantic import BaseModel
+
+
+class BulkRowError(BaseModel):
+    """
+    Model for the validation errors of one imported row.
+    """
+    row: int
+    errors: List[str]
+
+
+class BulkImportReport(BaseModel):
+    """
+    Model for the outcome of a bulk import.
+    """
+    received: int = 0
+    inserted: int = 0
+    failed: int = 0
+    errors: List[BulkRowError] = []
+    errors_truncated: bool = False
@@ -1,8 +1,14 @@
 import re
-from typing import List, Optional
+from typing import Generic, List, Optional, TypeVar
 from enum import Enum
 
-from pydantic import BaseModel, ConfigDict, UUID4, validator, Field
+from pydantic import BaseModel, ConfigDict, UUID4, field_validator, Field
+
+# Pattern of valid city names, compiled once
+NAME_PATTERN = re.compile("^[a-zA-Z ]{3,100}$")
+
+# Maximum number of decimal places of a geo-location
+GEO_LOCATION_DECIMALS = 6
 
 class BeautyEnum(str, Enum):
     """ Enum for city beauty ratings. """
@@ -27,19 +33,24 @@ class CityBase(BaseModel):
 
     model_config = ConfigDict(extra='forbid')
 
-    @validator('name')
+    @field_validator('name')
+    @classmethod
     def validate_name(cls, v):
         """ Ensure name is alphabetic with spaces. """
-        if not re.match("^[a-zA-Z ]{3,100}$", v):
+        if v is not None and not NAME_PATTERN.match(v):
             raise ValueError(
                 'Name must only contain letters and spaces, up to 100 characters'
             )
         return v
 
-    @validator('geo_location_latitude', 'geo_location_longitude')
+    @field_validator('geo_location_latitude', 'geo_location_longitude')
+    @classmethod
     def validate_geo_precision(cls, v):
-        """ Ensure geo-locations have at most 6 decimal places. """
-        if len(str(v).split('.')[-1]) > 6:
+        """
+        Ensure geo-locations have at most 6 decimal places, i.e. that
+        rounding to 6 decimals gives back the same float.
+        """
+        if v is not None and round(v, GEO_LOCATION_DECIMALS) != v:
             raise ValueError('Geo-location should not have more than 6 decimal places')
         return v
 
@@ -49,6 +60,13 @@ class CityCreate(CityBase):
     """
     alliances: Optional[List[UUID4]] = []
 
+class CityBulkRow(CityCreate):
+    """
+    Model for one row of a bulk import. A row may carry its own UUID so
+    that later rows of the same import can ally with it.
+    """
+    city_uuid: Optional[UUID4] = None
+
 class CityAllianceDisplay(BaseModel):
     """
     Model for displaying city alliances.
@@ -67,6 +85,9 @@ class CityDisplayPower(CityBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+# Fields a read can be narrowed to with fields=, in display order
+CITY_FIELDS = tuple(CityDisplayPower.model_fields)
+
 class CityDisplay(CityBase):
     """
     City model for general display purposes.
@@ -76,13 +97,76 @@ class CityDisplay(CityBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class CityNearbyDisplay(CityDisplay):
+    """
+    City model for spatial query results, with the distance to the query point.
+    """
+    distance_km: float
+
 class CityPatch(CityBase):
     """
     Model for patching city data.
     """
-    name: Optional[str] = None
-    geo_location_latitude: Optional[float] = None
-    geo_location_longitude: Optional[float] = None
-    beauty: Optional[BeautyEnum] = None
-    population: Optional[int] = None
+    name: Optional[str] = Field(None, min_length=3, max_length=100, 
+                                description="City name")
+    geo_location_latitude: Optional[float] = Field(None, ge=-90.0, le=90.0, 
+                                                   description="Latitude")
+    geo_location_longitude: Optional[float] = Field(None, ge=-180.0, le=180.0, 
+                                                    description="Longitude")
+    beauty: Optional[BeautyEnum] = Field(None, 
+                                         description="Beauty rating")
+    population: Optional[int] = Field(None, ge=1, le=1000000000, 
+                                      description="Population count")
     alliances: Optional[List[UUID4]] = []
+
+    @field_validator('name', 'geo_location_latitude', 'geo_location_longitude',
+                     'beauty', 'population')
+    @classmethod
+    def validate_not_null(cls, v):
+        """
+        Reject explicit nulls for columns that cannot be null; a field is
+        left unchanged by omitting it.
+        """
+        if v is None:
+            raise ValueError('Field cannot be null; omit it to leave it unchanged')
+        return v
+
+class CityBatchGetRequest(BaseModel):
+    """
+    Model for reading many cities by UUID.
+    """
+    city_uuids: List[UUID4] = Field(..., description="UUIDs of the cities to read")
+
+    model_config = ConfigDict(extra='forbid')
+
+class DistanceMatrixFormat(str, Enum):
+    """ Layouts of a distance matrix. """
+    dense = "dense"
+    condensed = "condensed"
+
+class CityDistanceMatrixRequest(BaseModel):
+    """
+    Model for requesting the pairwise distances between cities.
+    """
+    city_uuids: List[UUID4] = Field(
+        ..., min_length=1, description="UUIDs of the cities, in matrix order"
+    )
+    format: DistanceMatrixFormat = Field(
+        DistanceMatrixFormat.dense,
+        description="dense for full rows, condensed for the upper triangle",
+    )
+    mode: Optional[str] = Field(
+        None, description="Distance mode: ellipsoidal or haversine"
+    )
+
+    model_config = ConfigDict(extra='forbid')
+
+Cities = TypeVar('Cities')
+
+class CityBatchDisplay(BaseModel, Generic[Cities]):
+    """
+    Model for displaying many cities read by UUID, in the order requested,
+    along with the requested UUIDs that matched no city.
+    """
+    cities: List[Cities]
+    missing: List[UUID4]
@@ -0,0 +1,51 @@
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from schemas.city_schema import BeautyEnum
+
+# Characters allowed in name filters, the same as in city names
+NAME_FILTER_PATTERN = "^[a-zA-Z ]+$"
+
+
+class CityFilterParams(BaseModel):
+    """
+    Model for filtering the city list.
+
+    Every filter given must match. The four bounding box bounds go
+    together; a box with min_lon above max_lon crosses the antimeridian.
+    """
+    beauty: Optional[BeautyEnum] = Field(default=None, description="Beauty rating")
+    min_population: Optional[int] = Field(
+        default=None, ge=1, description="Minimum population"
+    )
+    max_population: Optional[int] = Field(
+        default=None, ge=1, description="Maximum population"
+    )
+    name_prefix: Optional[str] = Field(
+        default=None,
+        max_length=100,
+        pattern=NAME_FILTER_PATTERN,
+        description="Case-insensitive name prefix",
+    )
+    name_contains: Optional[str] = Field(
+        default=None,
+        min_length=3,
+        max_length=100,
+        pattern=NAME_FILTER_PATTERN,
+        description="Case-insensitive name substring, at least 3 characters",
+    )
+    min_lat: Optional[float] = Field(
+        default=None, ge=-90.0, le=90.0, description="Bounding box south latitude"
+    )
+    max_lat: Optional[float] = Field(
+        default=None, ge=-90.0, le=90.0, description="Bounding box north latitude"
+    )
+    min_lon: Optional[float] = Field(
+        default=None, ge=-180.0, le=180.0, description="Bounding box west longitude"
+    )
+    max_lon: Optional[float] = Field(
+        default=None, ge=-180.0, le=180.0, description="Bounding box east longitude"
+    )
+
+    model_config = ConfigDict(extra='forbid')
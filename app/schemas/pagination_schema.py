@@ -1,14 +1,48 @@
-from typing import List, Generic, TypeVar
+from enum import Enum
+from typing import List, Generic, Optional, TypeVar
 
 from pydantic import BaseModel, Field, ConfigDict
 
 
+class TotalMode(str, Enum):
+    """ How the total number of cities is determined. """
+    exact = "exact"
+    estimated = "estimated"
+
+
+class CitySort(str, Enum):
+    """
+    Sort orders of the city list, a leading "-" meaning descending. Names
+    sort case-insensitively, byte-wise; ties are broken by UUID.
+    """
+    city_uuid = "city_uuid"
+    city_uuid_desc = "-city_uuid"
+    name = "name"
+    name_desc = "-name"
+    population = "population"
+    population_desc = "-population"
+
+
 class PaginationParams(BaseModel):
     """
     Model for pagination parameters.
+
+    Without a cursor, pages are addressed by page number. With a cursor
+    taken from a previous response's next_cursor, the page starts right
+    after the last city of that response, which costs the same at any depth.
+    A cursor is only valid with the sort of the response it came from.
     """
     page: int = Field(default=1, gt=0, description="Page number")
     page_size: int = Field(default=10, gt=0, le=100, description="Page size limit")
+    cursor: Optional[str] = Field(
+        default=None, description="Opaque cursor for keyset pagination"
+    )
+    sort: CitySort = Field(default=CitySort.city_uuid, description="Sort order")
+    total_mode: Optional[TotalMode] = Field(
+        default=None,
+        description="exact or estimated total, "
+        "defaults to exact for page numbers and estimated for cursors",
+    )
 
     model_config = ConfigDict(extra='forbid')
 
@@ -21,7 +55,9 @@ class PaginatedResponseModel(BaseModel, Generic[Cities]):
     Generic model for paginated responses.
     """
     total: int
-    page: int
+    page: Optional[int]
     page_size: int
     total_pages: int
     cities: List[Cities]
+    total_is_estimate: bool = False
+    next_cursor: Optional[str] = None
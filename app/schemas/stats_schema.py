@@ -0,0 +1,38 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from schemas.city_schema import BeautyEnum
+
+
+class BeautyStatsDisplay(BaseModel):
+    """
+    Model for displaying the statistics of the cities of one beauty rating.
+    """
+    beauty: BeautyEnum
+    city_count: int
+    total_population: int
+    average_allied_power: Optional[float]
+
+
+class DegreeStatsDisplay(BaseModel):
+    """
+    Model for displaying the number of cities with a number of alliances.
+    """
+    degree: int
+    city_count: int
+
+
+class CityStatsDisplay(BaseModel):
+    """
+    Model for displaying aggregate city statistics.
+
+    Average allied power counts the cities with a stored allied power and
+    is null when there are none.
+    """
+    total_cities: int
+    total_population: int
+    total_alliances: int
+    average_allied_power: Optional[float]
+    by_beauty: List[BeautyStatsDisplay]
+    alliance_degrees: List[DegreeStatsDisplay]
@@ -0,0 +1,273 @@
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+
+# Kinds of alliance changes: an alliance formed or broken, and a city
+# deleted along with all of its alliances
+ADD = "add"
+REMOVE = "remove"
+DELETE = "delete"
+
+
+class AllianceGraph:
+    """
+    In-memory alliance graph in compressed sparse row (CSR) form.
+
+    City UUIDs are interned to integer node ids. The neighbours of node i
+    are indices[indptr[i]:indptr[i + 1]], stored in both directions like
+    city_alliances itself, so neighbourhoods are array slices and
+    breadth-first searches are a few vectorized gathers per hop.
+
+    Committed changes are queued and folded into the arrays on the next
+    query. Connected components are labelled lazily after each change and
+    grouped so that a bloc is a contiguous slice of one array. The graph is
+    meant to be reloaded once older than its TTL, to pick up changes
+    committed by other workers.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._index: Dict[UUID, int] = {}
+        self._uuids: List[UUID] = []
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int64)
+        self._components = None
+        self._pending = []
+        self._load_logs = []
+        self._loaded_at: Optional[float] = None
+        self._refreshing = False
+
+    def load_pairs(self, pairs: Iterable[Tuple]):
+        """
+        Replace the graph with the given (city_uuid, allied_city_uuid) pairs.
+
+        Changes committed while the pairs are read are replayed on top of
+        the new arrays. Every change sets the state of an edge, so replaying
+        one the pairs already reflect is harmless.
+        """
+        load_log = []
+        with self._lock:
+            self._load_logs.append(load_log)
+        try:
+            index, uuids, src, dst = {}, [], [], []
+            for city_uuid, allied_city_uuid in pairs:
+                for uuid, ids in ((city_uuid, src), (allied_city_uuid, dst)):
+                    node = index.get(uuid)
+                    if node is None:
+                        node = index[uuid] = len(uuids)
+                        uuids.append(uuid)
+                    ids.append(node)
+            keys = self._sorted_unique(
+                (np.array(src, dtype=np.int64) << 32) | np.array(dst, dtype=np.int64)
+            )
+        finally:
+            with self._lock:
+                self._load_logs.remove(load_log)
+        with self._lock:
+            self._index, self._uuids = index, uuids
+            self._indptr, self._indices = self._build_csr(keys, len(uuids))
+            self._components = None
+            self._pending = load_log
+            self._loaded_at = time.monotonic()
+
+    def is_loaded(self) -> bool:
+        """ Whether the graph has been loaded at least once. """
+        return self._loaded_at is not None
+
+    def claim_refresh(self) -> bool:
+        """
+        Claim the reload of a graph older than its TTL. Returns False when
+        the graph is fresh or another reload is already running.
+        """
+        with self._lock:
+            if (
+                self._refreshing
+                or self._loaded_at is None
+                or time.monotonic() - self._loaded_at <= self.ttl_seconds
+            ):
+                return False
+            self._refreshing = True
+            return True
+
+    def release_refresh(self):
+        """ Mark a claimed reload as finished. """
+        with self._lock:
+            self._refreshing = False
+
+    def apply(self, changes: List[Tuple]):
+        """ Queue committed changes, to be folded in on the next query. """
+        with self._lock:
+            for load_log in self._load_logs:
+                load_log.extend(changes)
+            if self._loaded_at is not None:
+                self._pending.extend(changes)
+
+    def bloc(self, city_uuid: UUID, limit: int) -> Optional[Tuple[int, List[UUID]]]:
+        """
+        Find the bloc of a city: every city connected to it by a chain of
+        alliances, the city included.
+
+        Returns:
+            tuple: The bloc size and up to limit member UUIDs, or None for
+            cities the graph does not know.
+        """
+        with self._lock:
+            self._compact()
+            node = self._index.get(city_uuid)
+            if node is None:
+                return None
+            if self._components is None:
+                self._components = self._label_components(
+                    self._indptr, self._indices
+                )
+            order, sorted_labels, labels = self._components
+            uuids = self._uuids
+        label = labels[node]
+        start = np.searchsorted(sorted_labels, label, side="left")
+        end = np.searchsorted(sorted_labels, label, side="right")
+        members = order[start:min(end, start + limit)]
+        return int(end - start), [uuids[member] for member in members.tolist()]
+
+    def neighbours(self, city_uuid: UUID, hops: int) -> Optional[List[Tuple]]:
+        """
+        Find the cities within a number of alliance hops of a city.
+
+        Returns:
+            list: (city UUID, hop count) pairs ordered by hop count, or None
+            for cities the graph does not know.
+        """
+        with self._lock:
+            self._compact()
+            node = self._index.get(city_uuid)
+            if node is None:
+                return None
+            indptr, indices, uuids = self._indptr, self._indices, self._uuids
+
+        if hops == 1:
+            neighbours = indices[indptr[node]:indptr[node + 1]]
+            return [(uuids[n], 1) for n in neighbours.tolist()]
+
+        visited = np.zeros(len(indptr) - 1, dtype=bool)
+        visited[node] = True
+        frontier = np.array([node], dtype=np.int64)
+        result = []
+        for hop in range(1, hops + 1):
+            starts = indptr[frontier]
+            counts = indptr[frontier + 1] - starts
+            offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+            frontier = np.unique(indices[offsets + np.arange(counts.sum())])
+            frontier = frontier[~visited[frontier]]
+            if not len(frontier):
+                break
+            visited[frontier] = True
+            result.extend((uuids[n], hop) for n in frontier.tolist())
+        return result
+
+    def _intern(self, uuid: UUID) -> int:
+        """ Return the node id of a UUID, adding it; the lock must be held. """
+        node = self._index.get(uuid)
+        if node is None:
+            node = self._index[uuid] = len(self._uuids)
+            self._uuids.append(uuid)
+        return node
+
+    def _compact(self):
+        """ Fold queued changes into the CSR arrays; the lock must be held. """
+        if not self._pending:
+            return
+        edges = {}
+        deleted = set()
+        for kind, city_uuid, allied_city_uuid in self._pending:
+            if kind == DELETE:
+                deleted.add(city_uuid)
+                for edge in edges:
+                    if city_uuid in edge:
+                        edges[edge] = False
+            else:
+                edges[city_uuid, allied_city_uuid] = kind == ADD
+                edges[allied_city_uuid, city_uuid] = kind == ADD
+        self._pending = []
+
+        node_count = len(self._uuids)
+        src = np.repeat(
+            np.arange(node_count, dtype=np.int64), np.diff(self._indptr)
+        )
+        keys = (src << 32) | self._indices
+        keep = np.ones(len(keys), dtype=bool)
+        deleted_nodes = [self._index[u] for u in deleted if u in self._index]
+        if deleted_nodes:
+            keep &= ~np.isin(src, deleted_nodes)
+            keep &= ~np.isin(self._indices, deleted_nodes)
+        added, removed = [], []
+        for (city_uuid, allied_city_uuid), present in edges.items():
+            key = (self._intern(city_uuid) << 32) | self._intern(allied_city_uuid)
+            (added if present else removed).append(key)
+        if removed:
+            removed = np.array(removed, dtype=np.int64)
+            positions = np.searchsorted(keys, removed).clip(max=len(keys) - 1)
+            found = positions[keys[positions] == removed] if len(keys) else []
+            keep[found] = False
+        keys = keys[keep]
+        if added:
+            added = self._sorted_unique(np.array(added, dtype=np.int64))
+            positions = np.searchsorted(keys, added)
+            present = positions < len(keys)
+            present[present] = keys[positions[present]] == added[present]
+            keys = np.insert(keys, positions[~present], added[~present])
+        for uuid in deleted:
+            self._index.pop(uuid, None)
+
+        self._indptr, self._indices = self._build_csr(keys, len(self._uuids))
+        self._components = None
+
+    @staticmethod
+    def _sorted_unique(keys: np.ndarray) -> np.ndarray:
+        """ Sort edge keys in place and drop duplicates. """
+        keys.sort()
+        if len(keys) < 2:
+            return keys
+        return keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+
+    @staticmethod
+    def _build_csr(keys: np.ndarray, node_count: int) -> Tuple:
+        """ Build CSR arrays from sorted, unique (src << 32 | dst) edge keys. """
+        indptr = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys >> 32, minlength=node_count), out=indptr[1:])
+        return indptr, keys & 0xFFFFFFFF
+
+    @staticmethod
+    def _label_components(indptr: np.ndarray, indices: np.ndarray) -> Tuple:
+        """
+        Label connected components by hooking the larger root of every edge
+        under its smaller one, then pointer jumping until every node points
+        to its root.
+
+        Returns:
+            tuple: Node ids grouped by label, their labels in the same
+            order, and the label of every node.
+        """
+        labels = np.arange(len(indptr) - 1, dtype=np.int64)
+        src = np.repeat(labels, np.diff(indptr))
+        one_way = src < indices
+        src, dst = src[one_way], indices[one_way]
+        while True:
+            src_labels, dst_labels = labels[src], labels[dst]
+            mismatched = src_labels != dst_labels
+            if not mismatched.any():
+                break
+            np.minimum.at(
+                labels,
+                np.maximum(src_labels, dst_labels)[mismatched],
+                np.minimum(src_labels, dst_labels)[mismatched],
+            )
+            while True:
+                parents = labels[labels]
+                if np.array_equal(parents, labels):
+                    break
+                labels = parents
+        order = np.argsort(labels, kind="stable")
+        return order, labels[order], labels
@@ -0,0 +1,153 @@
+import logging
+import threading
+from typing import List, Tuple
+from uuid import UUID
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import config.app_config as app_config
+import config.db_postg as db_postg
+from repository.alliance_repository import AllianceRepository
+from repository.city_repository import CityRepository
+from services.alliance_graph import AllianceGraph
+from services.allied_power_service import AlliedPowerService
+
+# Key of Session.info under which alliance changes wait for the commit
+STAGED_CHANGES_KEY = "alliance_graph_changes"
+
+# Rows fetched per batch when loading the graph from city_alliances
+LOAD_BATCH_SIZE = 10000
+
+# Cities loaded per query when computing multi-hop allied power
+ALLIED_CITIES_BATCH_SIZE = 10000
+
+
+# Alliance graph of this worker, kept up to date on every commit
+alliance_graph = AllianceGraph(app_config.ALLIANCE_GRAPH_TTL_SECONDS)
+
+
+def stage_alliance_changes(db: Session, changes: List[Tuple]):
+    """
+    Stage alliance changes on a session, to be applied to the alliance
+    graph once the session commits and dropped if it rolls back.
+    """
+    db.info.setdefault(STAGED_CHANGES_KEY, []).extend(changes)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_staged_changes(session: Session):
+    """ Apply the changes of a committed transaction to the graph. """
+    changes = session.info.pop(STAGED_CHANGES_KEY, None)
+    if changes:
+        alliance_graph.apply(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_staged_changes(session: Session):
+    """ Drop the changes of a rolled back transaction. """
+    session.info.pop(STAGED_CHANGES_KEY, None)
+
+
+class AllianceGraphService:
+    """
+    Static methods for alliance bloc and multi-hop queries.
+
+    Queries are answered by the in-memory alliance graph. The database is
+    only read to load the graph, to tell isolated cities from unknown ones
+    and to fetch the cities whose populations make up multi-hop power.
+    """
+
+    @staticmethod
+    def get_bloc(db: Session, city_uuid: UUID, limit: int) -> Tuple[int, List]:
+        """
+        Find the alliance bloc of a city.
+
+        Returns:
+            tuple: The bloc size and up to limit member UUIDs.
+        """
+        AllianceGraphService.ensure_graph_loaded(db)
+        bloc = alliance_graph.bloc(city_uuid, limit)
+        if bloc is None:
+            AllianceGraphService._check_city(db, city_uuid)
+            return 1, [city_uuid]
+        return bloc
+
+    @staticmethod
+    def get_neighbours(db: Session, city_uuid: UUID, hops: int) -> List[Tuple]:
+        """
+        Find the cities within a number of alliance hops of a city.
+
+        Returns:
+            list: (city UUID, hop count) pairs ordered by hop count.
+        """
+        AllianceGraphService.ensure_graph_loaded(db)
+        neighbours = alliance_graph.neighbours(city_uuid, hops)
+        if neighbours is None:
+            AllianceGraphService._check_city(db, city_uuid)
+            return []
+        return neighbours
+
+    @staticmethod
+    def calculate_allied_power(
+        db: Session, city_uuid: UUID, hops: int
+    ) -> Tuple[int, int]:
+        """
+        Calculate the allied power of a city counting every city within a
+        number of alliance hops as an ally. With one hop this is the
+        regular allied power.
+
+        Returns:
+            tuple: The allied power and the number of allies counted.
+        """
+        city = CityRepository.get_city_by_uuid(db, city_uuid)
+        if not city:
+            raise ValueError("City not found")
+        AllianceGraphService.ensure_graph_loaded(db)
+        ally_uuids = [
+            uuid for uuid, _ in alliance_graph.neighbours(city_uuid, hops) or []
+        ]
+        allied_cities = []
+        for start in range(0, len(ally_uuids), ALLIED_CITIES_BATCH_SIZE):
+            allied_cities += CityRepository.get_allied_cities(
+                db, ally_uuids[start:start + ALLIED_CITIES_BATCH_SIZE]
+            )
+        return (
+            AlliedPowerService.calculate_power_from_allies(city, allied_cities),
+            len(allied_cities),
+        )
+
+    @staticmethod
+    def ensure_graph_loaded(db: Session):
+        """
+        Load the alliance graph with the given session on first use, and
+        reload it in the background once it is older than its TTL.
+        """
+        if not alliance_graph.is_loaded():
+            alliance_graph.load_pairs(
+                AllianceRepository.iter_alliance_pairs(db, LOAD_BATCH_SIZE)
+            )
+        elif alliance_graph.claim_refresh():
+            threading.Thread(
+                target=AllianceGraphService._refresh_graph, daemon=True
+            ).start()
+
+    @staticmethod
+    def _refresh_graph():
+        """ Reload the alliance graph through a session of its own. """
+        db = db_postg.SessionLocal()
+        try:
+            alliance_graph.load_pairs(
+                AllianceRepository.iter_alliance_pairs(db, LOAD_BATCH_SIZE)
+            )
+        except Exception as e:
+            logging.error(f"Error occurred while reloading the alliance graph: {e}")
+        finally:
+            db.close()
+            alliance_graph.release_refresh()
+
+    @staticmethod
+    def _check_city(db: Session, city_uuid: UUID):
+        """ Raise ValueError if a city does not exist. """
+        if not CityRepository.get_city_by_uuid(db, city_uuid):
+            raise ValueError("City not found")
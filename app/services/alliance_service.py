@@ -1,9 +1,12 @@
 from typing import List
 
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 
 from repository.alliance_repository import AllianceRepository
 from models.city_model import City, CityAlliances
+from services.alliance_graph import ADD, DELETE, REMOVE
+from services.alliance_graph_service import stage_alliance_changes
 
 
 class AllianceService:
@@ -11,36 +14,41 @@ class AllianceService:
     Static methods for managing city alliances.
 
     Provides functionality to add, delete, and update alliances
-    for a city using methods from AllianceRepository.
+    for a city using methods from AllianceRepository. Every change is
+    staged for the in-memory alliance graph, which applies it on commit.
     """
 
     @staticmethod
-    def add_city_alliances(db: Session, city_uuid: str, alliances: List[str]):
+    def add_city_alliances(db: Session, city: City, alliances: List[str]):
         """
         Add alliances for a given city.
+
+        Both directions are inserted with one statement, and the new
+        alliances are appended to the city's loaded alliances collection.
         """
         alliance_objects = [
-            CityAlliances(city_uuid=city_uuid, allied_city_uuid=alliance_uuid)
+            CityAlliances(city_uuid=city.city_uuid, allied_city_uuid=alliance_uuid)
             for alliance_uuid in alliances
         ]
-        alliance_objects += [
-            CityAlliances(city_uuid=alliance_uuid, allied_city_uuid=city_uuid)
+        reverse_objects = [
+            CityAlliances(city_uuid=alliance_uuid, allied_city_uuid=city.city_uuid)
             for alliance_uuid in alliances
         ]
-        AllianceRepository.add_city_alliances_bulk(db, alliance_objects)
+        AllianceRepository.add_city_alliances_bulk(
+            db, alliance_objects + reverse_objects
+        )
+        set_committed_value(city, "alliances", city.alliances + alliance_objects)
+        stage_alliance_changes(
+            db, [(ADD, city.city_uuid, alliance_uuid) for alliance_uuid in alliances]
+        )
 
     @staticmethod
-    def delete_city_alliances(db: Session, city: City):
+    def cascade_city_alliances(db: Session, city: City):
         """
-        Delete all alliances for a given city.
+        Account for the alliances of a city that the database deletes along
+        with the city through ON DELETE CASCADE.
         """
-        alliance_pairs = [
-            (city.city_uuid, alliance.allied_city_uuid) for alliance in city.alliances
-        ]
-        alliance_pairs += [
-            (alliance.allied_city_uuid, city.city_uuid) for alliance in city.alliances
-        ]
-        AllianceRepository.delete_city_alliances_bulk(db, alliance_pairs)
+        stage_alliance_changes(db, [(DELETE, city.city_uuid, None)])
 
     @staticmethod
     def update_city_alliances(db: Session, city: City, new_alliances: List[str]):
@@ -53,13 +61,16 @@ class AllianceService:
         to_add = new_alliances_set - existing_alliances
 
         if to_remove:
-            city_alliances_to_remove = [
-                CityAlliances(city_uuid=city.city_uuid, allied_city_uuid=allied_uuid)
-                for allied_uuid in to_remove
-            ]
-            city_with_alliances_to_remove = City(
-                city_uuid=city.city_uuid, alliances=city_alliances_to_remove
+            AllianceRepository.delete_city_alliances_bulk(
+                db, city.city_uuid, list(to_remove)
+            )
+            set_committed_value(
+                city,
+                "alliances",
+                [a for a in city.alliances if a.allied_city_uuid not in to_remove],
+            )
+            stage_alliance_changes(
+                db, [(REMOVE, city.city_uuid, uuid) for uuid in to_remove]
             )
-            AllianceService.delete_city_alliances(db, city_with_alliances_to_remove)
         if to_add:
-            AllianceService.add_city_alliances(db, city.city_uuid, list(to_add))
+            AllianceService.add_city_alliances(db, city, list(to_add))
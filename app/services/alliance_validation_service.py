@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 from sqlalchemy.orm import Session
 
@@ -21,10 +21,14 @@ class AllianceValidationService:
         city: City,
         alliances: List[str],
         include_self_alliance_check: bool = False,
+        allied_cities: Optional[List[City]] = None,
     ):
         """
         Validate if an alliance can be formed with the given city and alliances.
 
+        Checks existence against allied_cities when the caller has already
+        loaded them, and queries the alliance cities otherwise.
+
         Raises ValueError if duplicate alliances, self-alliances,
           or non-existing city UUIDs are found.
         """
@@ -33,7 +37,11 @@ class AllianceValidationService:
             raise ValueError("Duplicate alliances found")
 
         # Retrieve all cities that match the UUIDs in alliances
-        existing_cities = CityRepository.get_cities_by_uuids(db, alliances)
+        existing_cities = (
+            allied_cities
+            if allied_cities is not None
+            else CityRepository.get_cities_by_uuids(db, alliances)
+        )
         existing_city_uuids = {c.city_uuid for c in existing_cities}
 
         for alliance_uuid in alliances:
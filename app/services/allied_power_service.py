@@ -1,10 +1,34 @@
 import logging
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
+import numpy as np
 from sqlalchemy.orm import Session
 from geopy.distance import geodesic
 
 from models.city_model import City
+from repository.alliance_repository import AllianceRepository
 from repository.city_repository import CityRepository
+from services.distance_service import DistanceService
+
+
+# City attributes that allied power depends on, as captured by CityPowerState
+POWER_ATTRIBUTES = {"geo_location_latitude", "geo_location_longitude", "population"}
+
+
+class CityPowerState(NamedTuple):
+    """ Snapshot of the city attributes that allied power depends on. """
+
+    latitude: float
+    longitude: float
+    population: int
+
+    @classmethod
+    def of(cls, city: City) -> "CityPowerState":
+        """ Capture the current state of a city. """
+        return cls(
+            city.geo_location_latitude, city.geo_location_longitude, city.population
+        )
 
 
 class AlliedPowerService:
@@ -45,26 +69,225 @@ class AlliedPowerService:
         Returns:
             int: The calculated allied power of the city.
         """
-        allied_power = city.population
         allied_cities = CityRepository.get_allied_cities(
             db, [alliance.allied_city_uuid for alliance in city.alliances]
         )
-        for allied_city in allied_cities:
-            try:
-                distance = AlliedPowerService.calculate_distance(
-                    city.geo_location_latitude,
-                    city.geo_location_longitude,
-                    allied_city.geo_location_latitude,
-                    allied_city.geo_location_longitude,
+        return AlliedPowerService.calculate_power_from_allies(city, allied_cities)
+
+    @staticmethod
+    def calculate_allied_power_bulk(db: Session, cities: List[City]) -> Dict:
+        """
+        Calculate the allied power of several cities with a fixed number of
+        queries: at most one for alliances not loaded yet and one for all
+        allied cities.
+
+        Returns:
+            dict: Allied power keyed by city UUID.
+        """
+        if not cities:
+            return {}
+        cities_by_uuid = {city.city_uuid: city for city in cities}
+        AllianceRepository.load_alliances(db, cities)
+        alliances = [alliance for city in cities for alliance in city.alliances]
+
+        allied_by_uuid = dict(cities_by_uuid)
+        missing_uuids = {
+            alliance.allied_city_uuid for alliance in alliances
+        } - allied_by_uuid.keys()
+        if missing_uuids:
+            for allied_city in CityRepository.get_allied_cities(
+                db, list(missing_uuids)
+            ):
+                allied_by_uuid[allied_city.city_uuid] = allied_city
+
+        return {
+            city_uuid: AlliedPowerService.calculate_power_from_allies(
+                city,
+                [
+                    allied_by_uuid[alliance.allied_city_uuid]
+                    for alliance in city.alliances
+                    if alliance.allied_city_uuid in allied_by_uuid
+                ],
+            )
+            for city_uuid, city in cities_by_uuid.items()
+        }
+
+    @staticmethod
+    def fill_missing_allied_power(db: Session, cities: List[City]):
+        """
+        Set a live allied power on cities that have no stored value yet.
+        """
+        missing = [city for city in cities if city.allied_power is None]
+        if missing:
+            allied_powers = AlliedPowerService.calculate_allied_power_bulk(db, missing)
+            for city in missing:
+                city.allied_power = allied_powers[city.city_uuid]
+
+    @staticmethod
+    def calculate_power_from_allies(city: City, allied_cities: List[City]) -> int:
+        """
+        Calculate the allied power of a city from already loaded allies.
+
+        Distances and population discounts for all allies are computed in
+        one vectorized pass.
+
+        Returns:
+            int: The calculated allied power of the city.
+        """
+        if not allied_cities:
+            return city.population
+        try:
+            distances = DistanceService.distances_km(
+                city.geo_location_latitude,
+                city.geo_location_longitude,
+                [c.geo_location_latitude for c in allied_cities],
+                [c.geo_location_longitude for c in allied_cities],
+            )
+        except Exception as e:
+            logging.error(f"Error in calculating distance for allied cities: {e}")
+            raise
+        allied_populations = DistanceService.discount_populations(
+            distances, [c.population for c in allied_cities]
+        )
+        return city.population + int(allied_populations.sum())
+
+    @staticmethod
+    def calculate_power_change(
+        before: Optional[CityPowerState],
+        after: Optional[CityPowerState],
+        old_allies: List[City],
+        new_allies: List[City],
+    ) -> Tuple[Optional[int], Dict]:
+        """
+        Work out how a change to one city affects stored allied power.
+
+        A created city has no before state, a deleted one no after state.
+        Only the city itself and its direct allies, old and new, are
+        affected: each ally loses the city's old contribution and gains
+        its new one.
+
+        Returns:
+            tuple: The city's new allied power (None if it was deleted) and
+            the allied power deltas of its allies keyed by city UUID.
+        """
+        deltas = defaultdict(int)
+        if before is not None and old_allies:
+            old_contributions = AlliedPowerService._contributions(before, old_allies)
+            for ally, contribution in zip(old_allies, old_contributions):
+                deltas[ally.city_uuid] -= int(contribution)
+
+        city_power = None
+        if after is not None:
+            city_power = after.population
+            if new_allies:
+                distances = DistanceService.distances_km(
+                    after.latitude,
+                    after.longitude,
+                    [c.geo_location_latitude for c in new_allies],
+                    [c.geo_location_longitude for c in new_allies],
                 )
-                allied_population = allied_city.population
-                if distance > 10000:
-                    allied_population = round(allied_population / 4)
-                elif distance > 1000:
-                    allied_population = round(allied_population / 2)
-
-                allied_power += allied_population
-            except Exception as e:
-                logging.error(f"Error in calculating distance for allied cities: {e}")
-                raise
-        return allied_power
+                new_contributions = DistanceService.discount_populations(
+                    distances, np.full(len(new_allies), after.population)
+                )
+                for ally, contribution in zip(new_allies, new_contributions):
+                    deltas[ally.city_uuid] += int(contribution)
+                city_power += int(
+                    DistanceService.discount_populations(
+                        distances, [c.population for c in new_allies]
+                    ).sum()
+                )
+        return city_power, {uuid: delta for uuid, delta in deltas.items() if delta}
+
+    @staticmethod
+    def apply_power_change(
+        db: Session,
+        city: Optional[City],
+        before: Optional[CityPowerState],
+        old_ally_uuids: set,
+        new_ally_uuids: set,
+        allies: Optional[List[City]] = None,
+    ) -> set:
+        """
+        Update stored allied power after a city was created, updated or
+        deleted, within the caller's transaction.
+
+        Loads the old and new allies in one locking query, unless the
+        caller passes them already locked, stores the city's recomputed
+        power and applies deltas to its allies.
+
+        Returns:
+            set: UUIDs of the allies whose stored power changed.
+        """
+        if allies is None:
+            allies = AlliedPowerService.lock_allies(
+                db, old_ally_uuids | new_ally_uuids
+            )
+        after = CityPowerState.of(city) if city is not None else None
+        city_power, deltas = AlliedPowerService.calculate_power_change(
+            before,
+            after,
+            [ally for ally in allies if ally.city_uuid in old_ally_uuids],
+            [ally for ally in allies if ally.city_uuid in new_ally_uuids],
+        )
+        if city is not None:
+            city.allied_power = city_power
+        CityRepository.increment_allied_power(db, deltas)
+        for ally in allies:
+            if ally.city_uuid in deltas:
+                db.expire(ally, ["allied_power"])
+        return set(deltas)
+
+    @staticmethod
+    def lock_allies(db: Session, ally_uuids: set) -> List[City]:
+        """
+        Load and lock the allies a city write will update, in UUID order.
+        """
+        if not ally_uuids:
+            return []
+        return CityRepository.get_cities_by_uuids(db, list(ally_uuids), for_update=True)
+
+    @staticmethod
+    def lock_city(
+        db: Session, city: City, new_ally_uuids: set, with_allies: bool = True
+    ) -> List[City]:
+        """
+        Lock a city a write will change, in the same query and UUID order
+        as its allies, and refresh it from the locked row.
+
+        With with_allies, its current allies, as loaded, and new_ally_uuids
+        are locked too and its alliances are reloaded once the lock is held.
+        Allies it gained in between are locked by a follow-up query.
+
+        Raises ValueError if the city no longer exists.
+
+        Returns:
+            list: The locked allies, current and new.
+        """
+        ally_uuids = set()
+        if with_allies:
+            ally_uuids = {a.allied_city_uuid for a in city.alliances} | new_ally_uuids
+        locked = CityRepository.get_cities_by_uuids(
+            db, list({city.city_uuid} | ally_uuids), for_update=True
+        )
+        if city not in locked:
+            raise ValueError("City not found")
+        allies = [locked_city for locked_city in locked if locked_city is not city]
+        if with_allies:
+            db.expire(city, ["alliances"])
+            AllianceRepository.load_alliances(db, [city])
+            gained = {a.allied_city_uuid for a in city.alliances} - ally_uuids
+            allies += AlliedPowerService.lock_allies(db, gained)
+        return allies
+
+    @staticmethod
+    def _contributions(state: CityPowerState, allies: List[City]) -> np.ndarray:
+        """ Discounted population a city in the given state adds to each ally. """
+        distances = DistanceService.distances_km(
+            state.latitude,
+            state.longitude,
+            [c.geo_location_latitude for c in allies],
+            [c.geo_location_longitude for c in allies],
+        )
+        return DistanceService.discount_populations(
+            distances, np.full(len(allies), state.population)
+        )
@@ -0,0 +1,291 @@
+import csv
+import json
+import logging
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.city_model import City, CityAlliances
+from repository.alliance_repository import AllianceRepository
+from repository.city_repository import CityRepository
+from services.alliance_graph import ADD
+from services.alliance_graph_service import stage_alliance_changes
+from services.city_stats_service import track_city_stats
+from schemas.bulk_schema import BulkRowError
+from schemas.city_schema import CityBulkRow
+from services.allied_power_service import AlliedPowerService, CityPowerState
+from services.city_cache_service import city_cache
+
+NDJSON = "ndjson"
+CSV = "csv"
+
+CONTENT_TYPES = {
+    "application/x-ndjson": NDJSON,
+    "application/ndjson": NDJSON,
+    "application/jsonl": NDJSON,
+    "text/csv": CSV,
+}
+
+# A parsed row: its line number, the raw field values, or a parse error
+ParsedRow = Tuple[int, Optional[Dict], Optional[str]]
+
+
+class BulkImportService:
+    """
+    Static methods for importing cities in bulk.
+
+    Parses a streamed NDJSON or CSV body into chunks of rows, validates each
+    chunk against the CityCreate rules and writes the valid rows, their
+    alliances and allied power with a handful of set-based statements.
+    """
+
+    @staticmethod
+    def get_format(content_type: str) -> str:
+        """
+        Map a request content type to an import format.
+
+        Raises ValueError for unsupported content types.
+        """
+        media_type = (content_type or "").split(";")[0].strip().lower()
+        if media_type not in CONTENT_TYPES:
+            raise ValueError(
+                f"Unsupported content type {media_type or 'none'}, "
+                f"expected one of {', '.join(CONTENT_TYPES)}"
+            )
+        return CONTENT_TYPES[media_type]
+
+    @staticmethod
+    async def iter_row_chunks(
+        byte_stream: AsyncIterator[bytes], import_format: str, chunk_size: int
+    ) -> AsyncIterator[List[ParsedRow]]:
+        """
+        Parse a streamed body into chunks of rows without buffering it whole.
+
+        Rows are numbered by their line in the body. For CSV, the first
+        non-empty line is the header.
+        """
+        header = None
+        chunk = []
+        async for line_number, line in BulkImportService._iter_lines(byte_stream):
+            if not line.strip():
+                continue
+            if import_format == CSV and header is None:
+                header_line = line.decode("utf-8", "replace")
+                header = [name.strip() for name in next(csv.reader([header_line]))]
+                continue
+            try:
+                chunk.append(
+                    (line_number, BulkImportService._parse_line(line, header), None)
+                )
+            except ValueError as e:
+                chunk.append((line_number, None, str(e)))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def import_chunk(
+        db: Session, parsed_rows: List[ParsedRow]
+    ) -> Tuple[int, List[BulkRowError]]:
+        """
+        Validate and insert one chunk of rows in a single transaction.
+
+        Alliances may reference existing cities or cities of the same chunk.
+        A failing row is reported and skipped, along with any row of the
+        chunk allied to it.
+
+        Returns:
+            tuple: The number of inserted cities and the row errors.
+        """
+        errors = {}
+        valid = {}
+        for row, data, parse_error in parsed_rows:
+            if parse_error is not None:
+                errors[row] = [parse_error]
+                continue
+            try:
+                valid[row] = CityBulkRow.model_validate(data)
+            except ValidationError as e:
+                errors[row] = [
+                    f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}"
+                    for err in e.errors()
+                ]
+
+        BulkImportService._check_rows(valid, errors)
+        referenced = {city.city_uuid for city in valid.values()}
+        for city in valid.values():
+            referenced.update(city.alliances)
+        existing = {
+            city.city_uuid: city
+            for city in (
+                CityRepository.get_cities_by_uuids(
+                    db, list(referenced), for_update=True
+                )
+                if referenced
+                else []
+            )
+        }
+        for row, city in list(valid.items()):
+            if city.city_uuid in existing:
+                errors[row] = [f"City UUID {city.city_uuid} already exists"]
+                del valid[row]
+        BulkImportService._resolve_alliances(valid, existing, errors)
+
+        if valid:
+            try:
+                BulkImportService._insert_rows(db, list(valid.values()), existing)
+                db.commit()
+                city_cache.invalidate(existing)
+            except SQLAlchemyError as e:
+                db.rollback()
+                logging.error(f"SQLAlchemyError occurred during bulk import: {e}")
+                for row in valid:
+                    errors[row] = ["Database error while inserting the chunk"]
+                valid = {}
+        return len(valid), [
+            BulkRowError(row=row, errors=messages)
+            for row, messages in sorted(errors.items())
+        ]
+
+    @staticmethod
+    def _check_rows(valid: Dict, errors: Dict):
+        """ Assign missing UUIDs and reject rows that are invalid on their own. """
+        seen_uuids = set()
+        for row, city in list(valid.items()):
+            if city.city_uuid is None:
+                city.city_uuid = uuid4()
+            if city.city_uuid in seen_uuids:
+                errors[row] = [f"City UUID {city.city_uuid} appears more than once"]
+            elif len(city.alliances) != len(set(city.alliances)):
+                errors[row] = ["Duplicate alliances found"]
+            elif city.city_uuid in city.alliances:
+                errors[row] = ["A city cannot form an alliance with itself"]
+            seen_uuids.add(city.city_uuid)
+            if row in errors:
+                del valid[row]
+
+    @staticmethod
+    def _resolve_alliances(valid: Dict, existing: Dict, errors: Dict):
+        """
+        Reject rows allied to cities that are neither stored nor valid in
+        this chunk, repeating until no rejection invalidates another row.
+        """
+        changed = True
+        while changed:
+            changed = False
+            known = existing.keys() | {city.city_uuid for city in valid.values()}
+            for row, city in list(valid.items()):
+                missing = [uuid for uuid in city.alliances if uuid not in known]
+                if missing:
+                    errors[row] = [
+                        f"City UUID {missing[0]} does not exist for alliance"
+                    ]
+                    del valid[row]
+                    changed = True
+
+    @staticmethod
+    def _insert_rows(db: Session, rows: List[CityBulkRow], existing: Dict):
+        """
+        Insert validated rows, both directions of their alliances, and the
+        allied power of the new cities and of their existing allies.
+        """
+        new_cities = {
+            row.city_uuid: City(**row.model_dump(exclude={"alliances"}))
+            for row in rows
+        }
+        adjacency = defaultdict(set)
+        for row in rows:
+            for allied_uuid in row.alliances:
+                adjacency[row.city_uuid].add(allied_uuid)
+                adjacency[allied_uuid].add(row.city_uuid)
+
+        existing_deltas = defaultdict(int)
+        cities_data = []
+        for row in rows:
+            allies = [
+                new_cities.get(uuid) or existing[uuid]
+                for uuid in adjacency[row.city_uuid]
+            ]
+            city_power, deltas = AlliedPowerService.calculate_power_change(
+                None, CityPowerState.of(new_cities[row.city_uuid]), [], allies
+            )
+            for uuid, delta in deltas.items():
+                if uuid in existing:
+                    existing_deltas[uuid] += delta
+            cities_data.append(
+                {**row.model_dump(exclude={"alliances"}), "allied_power": city_power}
+            )
+
+        track_city_stats(db, [uuid for uuid in adjacency if uuid in existing])
+        track_city_stats(db, list(new_cities), created=True)
+        CityRepository.add_cities_bulk(db, cities_data)
+        AllianceRepository.add_city_alliances_bulk(
+            db,
+            [
+                CityAlliances(city_uuid=city_uuid, allied_city_uuid=allied_uuid)
+                for city_uuid, allied_uuids in adjacency.items()
+                for allied_uuid in allied_uuids
+            ],
+        )
+        CityRepository.increment_allied_power(db, existing_deltas)
+        stage_alliance_changes(
+            db,
+            [
+                (ADD, row.city_uuid, allied_uuid)
+                for row in rows
+                for allied_uuid in row.alliances
+            ],
+        )
+
+    @staticmethod
+    async def _iter_lines(
+        byte_stream: AsyncIterator[bytes],
+    ) -> AsyncIterator[Tuple[int, bytes]]:
+        """ Split a byte stream into numbered lines. """
+        buffer = b""
+        line_number = 0
+        async for data in byte_stream:
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                line_number += 1
+                yield line_number, line.rstrip(b"\r")
+        if buffer:
+            yield line_number + 1, buffer.rstrip(b"\r")
+
+    @staticmethod
+    def _parse_line(line: bytes, header: Optional[List[str]]) -> Dict:
+        """
+        Parse one NDJSON line, or one CSV line given its header.
+
+        CSV alliances are separated by semicolons and empty fields are
+        treated as missing. Raises ValueError on malformed lines.
+        """
+        try:
+            text = line.decode("utf-8")
+        except UnicodeDecodeError:
+            raise ValueError("Row is not valid UTF-8")
+        if header is None:
+            try:
+                data = json.loads(text)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON: {e.msg}")
+            if not isinstance(data, dict):
+                raise ValueError("Row must be a JSON object")
+            return data
+
+        values = next(csv.reader([text]))
+        if len(values) != len(header):
+            raise ValueError(f"Expected {len(header)} columns, got {len(values)}")
+        data = {name: value for name, value in zip(header, values) if value != ""}
+        if "alliances" in data:
+            data["alliances"] = [
+                uuid.strip() for uuid in data["alliances"].split(";") if uuid.strip()
+            ]
+        return data
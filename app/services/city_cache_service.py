@@ -0,0 +1,142 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, NamedTuple, Optional
+
+import config.app_config as app_config
+
+
+def make_etag(body: bytes) -> str:
+    """ Strong ETag of a response body. """
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+class CacheEntry(NamedTuple):
+    """ A cached response body with its strong ETag and expiry time. """
+
+    body: bytes
+    etag: str
+    expires_at: float
+
+
+class CityCache:
+    """
+    Thread-safe LRU cache of encoded city responses with a TTL.
+
+    Memory is bounded by both the number of entries and their total size in
+    bytes; the least recently used entries are evicted first. Hits, misses,
+    evictions and invalidations are counted for monitoring.
+
+    Readers take a generation before loading a value and pass it to set, so
+    a value loaded before a concurrent invalidation is never stored.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._size_bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key) -> Optional[CacheEntry]:
+        """ Return a fresh entry and mark it as recently used, or None. """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry
+
+    def generation(self) -> int:
+        """ Return the current generation, bumped by every invalidation. """
+        with self._lock:
+            return self._generation
+
+    def set(self, key, body: bytes, generation: int) -> CacheEntry:
+        """
+        Store a response body loaded at the given generation and return its
+        entry with a strong ETag. The body is not stored if entries were
+        invalidated since.
+        """
+        entry = CacheEntry(
+            body=body,
+            etag=make_etag(body),
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        if self.max_entries <= 0 or len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if generation != self._generation:
+                return entry
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._size_bytes += len(body)
+            while (
+                len(self._entries) > self.max_entries
+                or self._size_bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+        return entry
+
+    def invalidate(self, keys: Iterable):
+        """ Drop the entries of the given keys, if cached. """
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+                    self._counters["invalidations"] += 1
+
+    def clear(self):
+        """ Drop every entry. """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def stats(self) -> Dict:
+        """ Return the cache counters along with its current size. """
+        with self._lock:
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "size_bytes": self._size_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _remove(self, key):
+        """ Remove an entry; the lock must be held. """
+        entry = self._entries.pop(key)
+        self._size_bytes -= len(entry.body)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag, using the weak
+    comparison RFC 9110 prescribes for this header.
+    """
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(
+        candidate.removeprefix("W/") == etag for candidate in candidates
+    )
+
+
+# Cache of fully computed GET /cities/{city_uuid} responses, keyed by UUID
+city_cache = CityCache(
+    app_config.CITY_CACHE_MAX_ENTRIES,
+    app_config.CITY_CACHE_MAX_BYTES,
+    app_config.CITY_CACHE_TTL_SECONDS,
+)
@@ -1,13 +1,41 @@
 import logging
 from math import ceil
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from uuid import UUID
 
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 
+import config.app_config as app_config
+from models.city_model import City
+from repository.alliance_repository import AllianceRepository
 from repository.city_repository import CityRepository
 from services.alliance_service import AllianceService
 from services.alliance_validation_service import AllianceValidationService
-from services.allied_power_service import AlliedPowerService
+from services.allied_power_service import (
+    POWER_ATTRIBUTES,
+    AlliedPowerService,
+    CityPowerState,
+)
+from services.city_cache_service import city_cache
+from services.city_stats_service import track_city_stats
+from services.pagination_service import PaginationService
+from schemas.city_schema import CITY_FIELDS
+from schemas.filter_schema import CityFilterParams
+from schemas.pagination_schema import CitySort, TotalMode
+
+
+class CityPage(NamedTuple):
+    """
+    One page of cities along with its pagination metadata. Cities are
+    entities, or records of the requested fields for sparse reads.
+    """
+
+    cities: List
+    total: int
+    total_pages: int
+    total_is_estimate: bool
+    next_cursor: Optional[str]
 
 
 class CityService:
@@ -21,107 +49,434 @@ class CityService:
     @staticmethod
     def create_city(db: Session, city_data, alliances):
         """
-        Create a new city along with its alliances.
+        Create a new city along with its alliances in a single transaction.
+
+        The allies are loaded and locked by one query that also validates
+        them, and the city is inserted with its allied power already set.
         """
-        success = False
-        new_city = None
+        alliances = alliances or []
+        allies = AlliedPowerService.lock_allies(db, set(alliances))
+        if alliances:
+            AllianceValidationService.validate_alliance(
+                db,
+                city_data,
+                alliances,
+                include_self_alliance_check=False,
+                allied_cities=allies,
+            )
         try:
-            if alliances:
-                AllianceValidationService.validate_alliance(
-                    db, city_data, alliances, include_self_alliance_check=False
-                )
+            track_city_stats(db, [ally.city_uuid for ally in allies])
             new_city = CityRepository.add_city(db, city_data)
-            db.commit()
-            db.refresh(new_city)
+            AlliedPowerService.apply_power_change(
+                db, new_city, None, set(), set(alliances), allies=allies
+            )
+            db.flush()
+            track_city_stats(db, [new_city.city_uuid], created=True)
             if alliances:
-                AllianceService.add_city_alliances(db, new_city.city_uuid, alliances)
-                db.commit()
-            success = True
-            return new_city
-        except ValueError as ve:
-            raise ve
-        except Exception as e:
-            if new_city and not success:
-                try:
-                    CityRepository.delete_city(db, new_city)
-                    db.commit()
-                except SQLAlchemyError as e_cleanup:
-                    db.rollback()
-                    logging.error(
-                        f"SQLAlchemyError occurred during cleanup: {e_cleanup}"
-                    )
-                    raise e_cleanup
+                AllianceService.add_city_alliances(db, new_city, alliances)
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logging.error(f"SQLAlchemyError occurred: {e}")
             raise e
+        city_cache.invalidate([new_city.city_uuid, *alliances])
+        return new_city
 
     @staticmethod
-    def read_cities(db: Session, pagination):
+    def read_cities(
+        db: Session,
+        pagination,
+        include_allied_power: bool = False,
+        fields: Optional[List[str]] = None,
+        city_filter: Optional[CityFilterParams] = None,
+    ):
         """
-        Read a paginated list of cities.
+        Read a filtered, sorted, paginated list of cities.
+
+        Pages are ordered by the requested sort, then by UUID. A cursor
+        switches to keyset pagination, and the total is exact or estimated
+        depending on the total mode.
+        With include_allied_power, cities without a stored allied power
+        get it calculated in a batch. With fields, only those columns are
+        selected and the page holds records built by build_city_records.
         """
-        total_count = CityRepository.count_cities(db)
+        city_filter = CityService.check_filter(city_filter)
+        sort_field = pagination.sort.value.lstrip("-")
+        descending = pagination.sort.value.startswith("-")
+        after = None
+        if pagination.cursor is not None:
+            after = CityService._decode_city_cursor(pagination.cursor, pagination.sort)
+
+        total_mode = pagination.total_mode or (
+            TotalMode.exact if after is None else TotalMode.estimated
+        )
+        total_count, total_is_estimate = CityService.count_cities(
+            db, total_mode, city_filter
+        )
         total_pages = ceil(total_count / pagination.page_size)
-        if pagination.page > total_pages and total_count > 0:
-            raise ValueError(f"Page must be less than or equal to {total_pages}")
-        skip = (pagination.page - 1) * pagination.page_size
-        cities = CityRepository.get_cities(db, skip, pagination.page_size)
-        return cities, total_count, total_pages
+
+        if after is None:
+            if (
+                not total_is_estimate
+                and pagination.page > total_pages
+                and total_count > 0
+            ):
+                raise ValueError(f"Page must be less than or equal to {total_pages}")
+            skip = (pagination.page - 1) * pagination.page_size
+        else:
+            skip = 0
+        if fields is None:
+            cities = CityRepository.get_cities(
+                db,
+                skip,
+                pagination.page_size,
+                city_filter,
+                sort_field,
+                descending,
+                after,
+            )
+            if include_allied_power:
+                AlliedPowerService.fill_missing_allied_power(db, cities)
+        else:
+            # The sort column is read too, for the cursor
+            columns = CityService.field_columns(fields)
+            if sort_field not in columns:
+                columns.append(sort_field)
+            cities = CityRepository.get_city_columns(
+                db,
+                columns,
+                skip,
+                pagination.page_size,
+                city_filter,
+                sort_field,
+                descending,
+                after,
+            )
+
+        next_cursor = None
+        if len(cities) == pagination.page_size:
+            next_cursor = CityService._encode_city_cursor(cities[-1], pagination.sort)
+        if fields is not None:
+            cities = CityService.build_city_records(db, cities, fields)
+        return CityPage(
+            cities=cities,
+            total=total_count,
+            total_pages=total_pages,
+            total_is_estimate=total_is_estimate,
+            next_cursor=next_cursor,
+        )
+
+    @staticmethod
+    def check_filter(
+        city_filter: Optional[CityFilterParams],
+    ) -> Optional[CityFilterParams]:
+        """
+        Check that the filters of the city list fit together.
+
+        Raises ValueError for an incomplete bounding box or inverted ranges.
+
+        Returns:
+            The filters, or None when none is set.
+        """
+        if city_filter is None or not city_filter.model_dump(exclude_none=True):
+            return None
+        box = [
+            city_filter.min_lat,
+            city_filter.max_lat,
+            city_filter.min_lon,
+            city_filter.max_lon,
+        ]
+        if None in box and any(bound is not None for bound in box):
+            raise ValueError(
+                "min_lat, max_lat, min_lon and max_lon must be given together"
+            )
+        if city_filter.min_lat is not None and (
+            city_filter.min_lat > city_filter.max_lat
+        ):
+            raise ValueError("min_lat must not exceed max_lat")
+        if (
+            city_filter.min_population is not None
+            and city_filter.max_population is not None
+            and city_filter.min_population > city_filter.max_population
+        ):
+            raise ValueError("min_population must not exceed max_population")
+        return city_filter
+
+    @staticmethod
+    def _encode_city_cursor(city, sort: CitySort) -> str:
+        """
+        Encode the sort key of the last city of a page into a cursor.
+
+        Cursors of the default UUID order hold the UUID alone. The others
+        lead with the sort they were made for, then hold the sort value
+        and the UUID, so they cannot be followed under another sort.
+        """
+        sort_field = sort.value.lstrip("-")
+        key = [city.city_uuid]
+        if sort_field == "name":
+            key.insert(0, city.name.lower())
+        elif sort_field != "city_uuid":
+            key.insert(0, getattr(city, sort_field))
+        if sort != CitySort.city_uuid:
+            key.insert(0, sort.value)
+        return PaginationService.encode_cursor(key)
+
+    @staticmethod
+    def _decode_city_cursor(cursor: str, sort: CitySort) -> Tuple:
+        """
+        Decode a cursor made by _encode_city_cursor into the sort key of
+        the city the page starts after.
+
+        Raises ValueError if the cursor is malformed or was made for
+        another sort.
+        """
+        values = PaginationService.decode_cursor(cursor)
+        if sort != CitySort.city_uuid:
+            if not values or values[0] != sort.value:
+                raise ValueError("Cursor does not match the sort order")
+            values = values[1:]
+        sort_field = sort.value.lstrip("-")
+        value_type = {"name": str, "population": int}.get(sort_field)
+        try:
+            *sort_values, after_key = values
+            after_uuid = UUID(after_key)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        if value_type is None and sort_values:
+            raise ValueError("Invalid cursor")
+        if value_type is not None and (
+            len(sort_values) != 1
+            or type(sort_values[0]) is not value_type  # rejects booleans too
+        ):
+            raise ValueError("Invalid cursor")
+        return (*sort_values, after_uuid)
+
+    @staticmethod
+    def count_cities(
+        db: Session,
+        total_mode: TotalMode,
+        city_filter: Optional[CityFilterParams] = None,
+    ) -> Tuple[int, bool]:
+        """
+        Count cities exactly, or estimate the count from table statistics,
+        or from the planner's estimate for the filters.
+
+        Estimates are only used for counts large enough for COUNT(*) to be
+        expensive; smaller counts are always exact.
+
+        Returns:
+            tuple: The count and whether it is an estimate.
+        """
+        if total_mode == TotalMode.estimated:
+            if city_filter is None:
+                estimate = CityRepository.estimate_city_count(db)
+            else:
+                estimate = CityRepository.estimate_filtered_city_count(
+                    db, city_filter
+                )
+            if estimate >= app_config.COUNT_ESTIMATE_MIN_ROWS:
+                return estimate, True
+        return CityRepository.count_cities(db, city_filter), False
 
     @staticmethod
     def read_city(db: Session, city_uuid):
         """
         Read a single city by its UUID.
+
+        Uses the stored allied power, falling back to a live calculation
+        for cities whose power has not been materialized yet.
         """
-        city = CityRepository.get_city_by_uuid(db, city_uuid)
+        city = CityRepository.get_city_by_uuid(db, city_uuid, with_alliances=True)
         if city:
-            city.allied_power = AlliedPowerService.calculate_allied_power(db, city)
+            if city.allied_power is None:
+                city.allied_power = AlliedPowerService.calculate_allied_power(db, city)
             return city
         else:
             raise ValueError("City not found")
 
+    @staticmethod
+    def read_city_record(db: Session, city_uuid, fields: List[str]) -> Dict:
+        """
+        Read only the given fields of a city by its UUID, as a record built
+        by build_city_records.
+        """
+        row = CityRepository.get_city_columns_by_uuid(
+            db, city_uuid, CityService.field_columns(fields)
+        )
+        if row is None:
+            raise ValueError("City not found")
+        return CityService.build_city_records(db, [row], fields)[0]
+
+    @staticmethod
+    def field_columns(fields: List[str]) -> List[str]:
+        """ The city columns to select for the given fields. """
+        return [field for field in fields if field != "alliances"]
+
+    @staticmethod
+    def build_city_records(db: Session, rows: List, fields: List[str]) -> List[Dict]:
+        """
+        Build records holding only the given fields, in display order, from
+        rows of the matching columns.
+
+        Alliances are loaded for all rows with one query of UUID pairs, and
+        only when requested. Rows without a stored allied power get it
+        calculated in a batch.
+        """
+        allied_uuids = {}
+        if "alliances" in fields:
+            allied_uuids = AllianceRepository.get_allied_uuids_by_city_uuids(
+                db, [row.city_uuid for row in rows]
+            )
+        allied_powers = {}
+        if "allied_power" in fields:
+            missing = [row.city_uuid for row in rows if row.allied_power is None]
+            if missing:
+                allied_powers = AlliedPowerService.calculate_allied_power_bulk(
+                    db, CityRepository.get_cities_by_uuids(db, missing)
+                )
+
+        records = []
+        for row in rows:
+            record = {}
+            for field in CITY_FIELDS:
+                if field not in fields:
+                    continue
+                if field == "alliances":
+                    record[field] = [
+                        {"allied_city_uuid": allied_city_uuid}
+                        for allied_city_uuid in allied_uuids.get(row.city_uuid, [])
+                    ]
+                elif field == "beauty":
+                    record[field] = row.beauty.value
+                elif field == "allied_power" and row.allied_power is None:
+                    record[field] = allied_powers[row.city_uuid]
+                else:
+                    record[field] = getattr(row, field)
+            records.append(record)
+        return records
+
+    @staticmethod
+    def read_cities_by_uuids(
+        db: Session, city_uuids: List[UUID], include_allied_power: bool = False
+    ) -> Tuple[List[City], List[UUID]]:
+        """
+        Read many cities by UUID with one query, in the order requested.
+
+        With include_allied_power, cities without a stored allied power get
+        it calculated in a batch.
+
+        Returns:
+            tuple: The cities found and the UUIDs that matched no city.
+        """
+        city_uuids = list(dict.fromkeys(city_uuids))
+        if len(city_uuids) > app_config.BATCH_GET_MAX_CITIES:
+            raise ValueError(
+                f"At most {app_config.BATCH_GET_MAX_CITIES} cities can be "
+                "requested at once"
+            )
+        found = {
+            city.city_uuid: city
+            for city in CityRepository.get_cities_by_uuids(
+                db, city_uuids, with_alliances=True
+            )
+        }
+        cities = [found[uuid] for uuid in city_uuids if uuid in found]
+        if include_allied_power:
+            AlliedPowerService.fill_missing_allied_power(db, cities)
+        return cities, [uuid for uuid in city_uuids if uuid not in found]
+
     @staticmethod
     def update_city(db: Session, city_uuid, city_update):
         """
-        Update a city by its UUID.
+        Update a city by its UUID in a single transaction.
+
+        The city is locked before it is changed. When alliances or the
+        attributes allied power depends on change, its old and new allies
+        are locked by the same query, which also validates the new
+        alliances.
         """
-        city = CityRepository.get_city_by_uuid(db, city_uuid)
+        city = CityRepository.get_city_by_uuid(db, city_uuid, with_alliances=True)
         if not city:
             raise ValueError("City not found")
-        update_data = city_update.dict(exclude_unset=True)
+        update_data = city_update.model_dump(exclude_unset=True)
+        if not update_data:
+            return city
+
+        new_alliances = update_data.pop("alliances", None)
+        affects_allies = new_alliances is not None or bool(
+            update_data.keys() & POWER_ATTRIBUTES
+        )
+        allies = AlliedPowerService.lock_city(
+            db, city, set(new_alliances or []), with_allies=affects_allies
+        )
+        if affects_allies or "beauty" in update_data:
+            track_city_stats(db, [city.city_uuid, *(ally.city_uuid for ally in allies)])
+        before = CityPowerState.of(city)
+        old_ally_uuids = {a.allied_city_uuid for a in city.alliances}
+        new_ally_uuids = old_ally_uuids if new_alliances is None else set(new_alliances)
         if update_data:
-            try:
-                if "alliances" in update_data:
-                    AllianceValidationService.validate_alliance(
-                        db,
-                        city,
-                        update_data["alliances"],
-                        include_self_alliance_check=True,
-                    )
-                    AllianceService.update_city_alliances(
-                        db, city, update_data.pop("alliances")
-                    )
-                if update_data:
-                    CityRepository.update_city(db, city, update_data)
-                db.commit()
-            except SQLAlchemyError as e:
-                db.rollback()
-                logging.error(f"SQLAlchemyError occurred: {e}")
-                raise e
+            CityRepository.update_city(db, city, update_data)
+        power_changed = (
+            new_ally_uuids != old_ally_uuids or CityPowerState.of(city) != before
+        )
+        if new_alliances is not None:
+            AllianceValidationService.validate_alliance(
+                db,
+                city,
+                new_alliances,
+                include_self_alliance_check=True,
+                allied_cities=allies,
+            )
+        try:
+            if new_alliances is not None:
+                AllianceService.update_city_alliances(db, city, new_alliances)
+            stale_uuids = {city.city_uuid}
+            if power_changed:
+                AlliedPowerService.apply_power_change(
+                    db, city, before, old_ally_uuids, new_ally_uuids, allies=allies
+                )
+                stale_uuids |= old_ally_uuids | new_ally_uuids
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise e
+        city_cache.invalidate(stale_uuids)
         return city
 
     @staticmethod
     def delete_city(db: Session, city_uuid):
         """
-        Delete a city by its UUID.
+        Delete a city by its UUID in a single transaction.
+
+        The city is locked along with its allies before its allied power
+        contribution is removed from them. Its alliances are removed by the
+        database along with the city.
         """
-        city = CityRepository.get_city_by_uuid(db, city_uuid)
-        if city:
-            try:
-                AllianceService.delete_city_alliances(db, city)
-                CityRepository.delete_city(db, city)
+        city = CityRepository.get_city_by_uuid(db, city_uuid, with_alliances=True)
+        if not city:
+            raise ValueError("City not found")
+        allies = AlliedPowerService.lock_city(db, city, set())
+        try:
+            old_ally_uuids = {a.allied_city_uuid for a in city.alliances}
+            track_city_stats(db, [city.city_uuid, *old_ally_uuids])
+            AlliedPowerService.apply_power_change(
+                db,
+                None,
+                CityPowerState.of(city),
+                old_ally_uuids,
+                set(),
+                allies=allies,
+            )
+            AllianceService.cascade_city_alliances(db, city)
+            deleted = CityRepository.delete_city(db, city)
+            if deleted:
                 db.commit()
-            except SQLAlchemyError as e:
-                db.rollback()
-                logging.error(f"SQLAlchemyError occurred: {e}")
-                raise e
-        else:
+        except SQLAlchemyError as e:
+            db.rollback()
+            logging.error(f"SQLAlchemyError occurred: {e}")
+            raise e
+        if not deleted:
+            db.rollback()
             raise ValueError("City not found")
+        city_cache.invalidate([city_uuid, *old_ally_uuids])
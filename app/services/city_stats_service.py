@@ -0,0 +1,221 @@
+import random
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import config.app_config as app_config
+from repository.stats_repository import BEAUTY_COUNTERS, StatsRepository
+
+# Key of Session.info under which the states of tracked cities wait for
+# the commit
+STAGED_STATES_KEY = "city_stats_states"
+
+
+class CityStats(NamedTuple):
+    """ City statistics summed from the rollup counters. """
+
+    total_cities: int
+    total_population: int
+    total_alliances: int
+    average_allied_power: Optional[float]
+    by_beauty: List[Dict]
+    alliance_degrees: List[Dict]
+
+
+def track_city_stats(db: Session, city_uuids, created: bool = False):
+    """
+    Snapshot the state of cities a transaction is about to change, so that
+    the rollup counters can be updated by the difference when it commits.
+
+    Call it once the cities are locked FOR UPDATE and before they are
+    changed, so that no concurrent transaction can commit a change to them
+    between the snapshot and the commit. Cities tracked earlier in the
+    transaction keep their first snapshot. With created, the cities are new
+    and have no state before the transaction.
+    """
+    states = db.info.setdefault(STAGED_STATES_KEY, {})
+    untracked = [uuid for uuid in dict.fromkeys(city_uuids) if uuid not in states]
+    if not untracked:
+        return
+    found = {} if created else StatsRepository.get_city_states(db, untracked)
+    for uuid in untracked:
+        states[uuid] = found.get(uuid)
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_staged_states(session: Session):
+    """
+    Add the difference between the tracked cities' states before and after
+    the transaction to one shard of the rollups, within the transaction.
+    """
+    before = session.info.pop(STAGED_STATES_KEY, None)
+    if not before:
+        return
+    session.flush()
+    after = StatsRepository.get_city_states(session, list(before))
+    beauty_deltas, degree_deltas = CityStatsService.calculate_deltas(before, after)
+    if beauty_deltas or degree_deltas:
+        StatsRepository.add_stats_deltas(
+            session,
+            random.randrange(app_config.STATS_SHARDS),
+            beauty_deltas,
+            degree_deltas,
+        )
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_staged_states(session: Session):
+    """ Drop the tracked states of a rolled back transaction. """
+    session.info.pop(STAGED_STATES_KEY, None)
+
+
+class CityStatsService:
+    """
+    Static methods for the city statistics served by GET /cities/stats.
+
+    Statistics are read from rollup counters that every city write updates
+    in its own transaction, so reading them costs the same at any table
+    size. The counters can be verified against, and refreshed from, a full
+    recompute over the city tables.
+    """
+
+    @staticmethod
+    def read_stats(db: Session) -> CityStats:
+        """ Sum the rollup counters into city statistics. """
+        beauty_rows = StatsRepository.get_beauty_stats(db)
+        degree_rows = StatsRepository.get_degree_stats(db)
+        return CityStats(
+            total_cities=int(sum(row.city_count for row in beauty_rows)),
+            total_population=int(sum(row.total_population for row in beauty_rows)),
+            total_alliances=int(
+                sum(row.degree * row.city_count for row in degree_rows) // 2
+            ),
+            average_allied_power=CityStatsService._average(
+                sum(row.total_allied_power for row in beauty_rows),
+                sum(row.allied_power_count for row in beauty_rows),
+            ),
+            by_beauty=[
+                {
+                    "beauty": row.beauty.value,
+                    "city_count": int(row.city_count),
+                    "total_population": int(row.total_population),
+                    "average_allied_power": CityStatsService._average(
+                        row.total_allied_power, row.allied_power_count
+                    ),
+                }
+                for row in beauty_rows
+            ],
+            alliance_degrees=[
+                {"degree": row.degree, "city_count": int(row.city_count)}
+                for row in degree_rows
+            ],
+        )
+
+    @staticmethod
+    def refresh_stats(db: Session):
+        """
+        Replace the rollup counters with a full recompute and commit.
+
+        Writes to the rollups wait while the recompute runs.
+        """
+        StatsRepository.lock_stats(db)
+        StatsRepository.replace_stats(
+            db,
+            StatsRepository.aggregate_beauty_stats(db),
+            StatsRepository.aggregate_degree_stats(db),
+        )
+        db.commit()
+
+    @staticmethod
+    def verify_stats(db: Session) -> List[str]:
+        """
+        Compare the rollup counters with a full recompute, reading both from
+        one snapshot.
+
+        Returns:
+            list: A description of every mismatching counter.
+        """
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        mismatches = CityStatsService._compare(
+            "beauty",
+            {
+                row.beauty.value: tuple(row[1:])
+                for row in StatsRepository.get_beauty_stats(db)
+            },
+            {
+                row.beauty.value: tuple(row[1:])
+                for row in StatsRepository.aggregate_beauty_stats(db)
+            },
+            BEAUTY_COUNTERS,
+        )
+        mismatches += CityStatsService._compare(
+            "degree",
+            {
+                row.degree: (row.city_count,)
+                for row in StatsRepository.get_degree_stats(db)
+            },
+            {
+                row.degree: (row.city_count,)
+                for row in StatsRepository.aggregate_degree_stats(db)
+            },
+            ("city_count",),
+        )
+        db.rollback()
+        return mismatches
+
+    @staticmethod
+    def calculate_deltas(before: Dict, after: Dict) -> Tuple[Dict, Dict]:
+        """
+        Calculate the rollup deltas of cities moving from one state to
+        another, None standing for a city that does not exist.
+
+        Returns:
+            tuple: Non-zero tuples of BEAUTY_COUNTERS deltas keyed by beauty,
+            and non-zero city count deltas keyed by alliance degree.
+        """
+        beauty_deltas = defaultdict(lambda: [0] * len(BEAUTY_COUNTERS))
+        degree_deltas = defaultdict(int)
+        for city_uuid, old_state in before.items():
+            for state, sign in ((old_state, -1), (after.get(city_uuid), 1)):
+                if state is None:
+                    continue
+                counters = beauty_deltas[state.beauty]
+                counters[0] += sign
+                counters[1] += sign * state.population
+                if state.allied_power is not None:
+                    counters[2] += sign * state.allied_power
+                    counters[3] += sign
+                degree_deltas[state.degree] += sign
+        return (
+            {
+                beauty: tuple(counters)
+                for beauty, counters in beauty_deltas.items()
+                if any(counters)
+            },
+            {degree: count for degree, count in degree_deltas.items() if count},
+        )
+
+    @staticmethod
+    def _compare(label: str, stored: Dict, live: Dict, counters: Tuple) -> List[str]:
+        """ Describe the counters that differ between rollups and recompute. """
+        mismatches = []
+        for key in sorted(stored.keys() | live.keys()):
+            zero = (0,) * len(counters)
+            stored_values = stored.get(key, zero)
+            live_values = live.get(key, zero)
+            for counter, stored_value, live_value in zip(
+                counters, stored_values, live_values
+            ):
+                if stored_value != live_value:
+                    mismatches.append(
+                        f"{label}={key}\t{counter}\t"
+                        f"stored={stored_value}\tlive={live_value}"
+                    )
+        return mismatches
+
+    @staticmethod
+    def _average(total: int, count: int) -> Optional[float]:
+        """ Divide a total by a count, None for an empty count. """
+        return float(total) / float(count) if count else None
@@ -0,0 +1,117 @@
+from typing import Iterator, List, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+import config.app_config as app_config
+from repository.city_repository import CityRepository
+from services.distance_service import DistanceService
+from services.json_encoding_service import JsonEncodingService
+
+DENSE = "dense"
+CONDENSED = "condensed"
+
+
+class DistanceMatrixService:
+    """
+    Static methods for pairwise distance matrices between sets of cities.
+
+    Distances are computed for a block of rows at a time in one vectorized
+    pass and encoded to JSON right away, so a matrix is streamed without
+    ever being held in memory as a whole. Blocks hold at most
+    DISTANCE_MATRIX_BLOCK_CELLS distances.
+    """
+
+    @staticmethod
+    def load_locations(db: Session, city_uuids: List) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Load the geolocations of cities, in the order requested.
+
+        Raises ValueError for too many cities or for UUIDs matching no city.
+
+        Returns:
+            tuple: Arrays of latitudes and longitudes.
+        """
+        if len(city_uuids) > app_config.DISTANCE_MATRIX_MAX_CITIES:
+            raise ValueError(
+                f"At most {app_config.DISTANCE_MATRIX_MAX_CITIES} cities can be "
+                "requested at once"
+            )
+        locations = {
+            row.city_uuid: (row.geo_location_latitude, row.geo_location_longitude)
+            for row in CityRepository.get_city_locations(
+                db, list(dict.fromkeys(city_uuids))
+            )
+        }
+        missing = [str(uuid) for uuid in city_uuids if uuid not in locations]
+        if missing:
+            raise ValueError(f"Cities not found: {', '.join(missing[:10])}")
+        points = np.array([locations[uuid] for uuid in city_uuids], dtype=np.float64)
+        return points[:, 0], points[:, 1]
+
+    @staticmethod
+    def iter_matrix(
+        city_uuids: List,
+        lats: np.ndarray,
+        lons: np.ndarray,
+        matrix_format: str,
+        mode: str,
+    ) -> Iterator[bytes]:
+        """
+        Encode a distance matrix as a JSON object, one block at a time.
+
+        A dense matrix lists every row in full. A condensed matrix lists
+        the upper triangle row by row, pairs (i, j) with i < j, like
+        scipy.spatial.distance.pdist, and computes about half as many
+        distances. Distances are in kilometers, rounded to meters.
+        """
+        yield (
+            b'{"city_uuids":'
+            + JsonEncodingService.encode([str(uuid) for uuid in city_uuids])
+            + b',"format":'
+            + JsonEncodingService.encode(matrix_format)
+            + b',"mode":'
+            + JsonEncodingService.encode(mode)
+            + b',"unit":"km","distances":['
+        )
+        separator = b""
+        for block in DistanceMatrixService.iter_blocks(
+            lats, lons, matrix_format == CONDENSED, mode
+        ):
+            if block.size:
+                # Strip the brackets of the block's list to splice it in
+                yield separator + JsonEncodingService.encode(block.tolist())[1:-1]
+                separator = b","
+        yield b"]}"
+
+    @staticmethod
+    def iter_blocks(
+        lats: np.ndarray, lons: np.ndarray, condensed: bool, mode: str
+    ) -> Iterator[np.ndarray]:
+        """
+        Compute a distance matrix in blocks of consecutive rows.
+
+        Yields:
+            np.ndarray: Rounded distances of the block's rows, as a 2D array
+            for a dense matrix, or their upper triangle part flattened for a
+            condensed one.
+        """
+        n = len(lats)
+        rows_per_block = max(1, app_config.DISTANCE_MATRIX_BLOCK_CELLS // max(n, 1))
+        for start in range(0, n, rows_per_block):
+            stop = min(start + rows_per_block, n)
+            # A condensed block only needs the columns from its first row on
+            first_column = start if condensed else 0
+            block = np.round(
+                DistanceService.distances_km(
+                    lats[start:stop, None],
+                    lons[start:stop, None],
+                    lats[None, first_column:],
+                    lons[None, first_column:],
+                    mode,
+                ),
+                3,
+            )
+            if condensed:
+                block = block[np.triu_indices(stop - start, 1, block.shape[1])]
+            yield block
@@ -0,0 +1,197 @@
+import logging
+
+import numpy as np
+from geopy.distance import geodesic
+
+import config.app_config as app_config
+
+# Mean Earth radius in kilometers, used by the haversine mode.
+EARTH_RADIUS_KM = 6371.0088
+
+# WGS-84 ellipsoid parameters, used by the ellipsoidal mode.
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+
+VINCENTY_MAX_ITERATIONS = 200
+VINCENTY_TOLERANCE = 1e-12
+
+HAVERSINE = "haversine"
+ELLIPSOIDAL = "ellipsoidal"
+DISTANCE_MODES = (HAVERSINE, ELLIPSOIDAL)
+
+
+class DistanceService:
+    """
+    Static methods for vectorized distance calculations.
+
+    Computes distances between one or many pairs of geographical points in
+    a single NumPy pass, and applies the allied population discount to
+    whole arrays of allies at once.
+    """
+
+    @staticmethod
+    def get_mode(mode: str = None) -> str:
+        """
+        Resolve the distance mode, falling back to the configured default.
+
+        Raises ValueError if the mode is not supported.
+        """
+        mode = mode or app_config.ALLIED_POWER_DISTANCE_MODE
+        if mode not in DISTANCE_MODES:
+            raise ValueError(
+                f"Unsupported distance mode {mode}, expected one of {DISTANCE_MODES}"
+            )
+        return mode
+
+    @staticmethod
+    def distances_km(lat1, lon1, lat2, lon2, mode: str = None) -> np.ndarray:
+        """
+        Calculate distances in kilometers between points.
+
+        All arguments may be scalars or arrays and are broadcast against
+        each other, so one city can be compared to many allies, or a block
+        of cities to another block.
+
+        Returns:
+            np.ndarray: Distances in kilometers, not rounded.
+        """
+        lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+            *(np.asarray(v, dtype=np.float64) for v in (lat1, lon1, lat2, lon2))
+        )
+        if DistanceService.get_mode(mode) == HAVERSINE:
+            return DistanceService._haversine_km(lat1, lon1, lat2, lon2)
+        return DistanceService._vincenty_km(lat1, lon1, lat2, lon2)
+
+    @staticmethod
+    def discount_populations(
+        distances_km: np.ndarray, populations: np.ndarray
+    ) -> np.ndarray:
+        """
+        Apply the allied population discount based on distance.
+
+        Allies further than 10000 km count for a quarter of their
+        population and allies further than 1000 km for half of it, with
+        distances rounded to whole kilometers first.
+        """
+        distances = np.rint(distances_km)
+        populations = np.asarray(populations, dtype=np.float64)
+        discounted = np.where(
+            distances > 10000,
+            populations / 4,
+            np.where(distances > 1000, populations / 2, populations),
+        )
+        return np.rint(discounted).astype(np.int64)
+
+    @staticmethod
+    def _haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+        """ Great-circle distance on a spherical Earth. """
+        phi1, phi2 = np.radians(lat1), np.radians(lat2)
+        d_phi = phi2 - phi1
+        d_lambda = np.radians(lon2 - lon1)
+        h = (
+            np.sin(d_phi / 2) ** 2
+            + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+        )
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+    @staticmethod
+    def _vincenty_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+        """
+        Distance on the WGS-84 ellipsoid using Vincenty's inverse formula.
+
+        Nearly antipodal points, for which the iteration does not converge,
+        are resolved one by one with geopy's geodesic.
+        """
+        shape = lat1.shape
+        lat1, lon1 = lat1.ravel(), lon1.ravel()
+        lat2, lon2 = lat2.ravel(), lon2.ravel()
+
+        big_l = np.radians(lon2 - lon1)
+        u1 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat1)))
+        u2 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat2)))
+        sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+        sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+
+        lam = big_l.copy()
+        active = np.arange(big_l.size)
+        converged = np.zeros(big_l.size, dtype=bool)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for _ in range(VINCENTY_MAX_ITERATIONS):
+                if active.size == 0:
+                    break
+                terms = DistanceService._vincenty_terms(
+                    lam[active],
+                    sin_u1[active],
+                    cos_u1[active],
+                    sin_u2[active],
+                    cos_u2[active],
+                )
+                sin_sigma, cos_sigma, sigma, sin_alpha, cos2_alpha, cos_2sm = terms
+                c = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+                lam_next = big_l[active] + (1 - c) * WGS84_F * sin_alpha * (
+                    sigma
+                    + c
+                    * sin_sigma
+                    * (cos_2sm + c * cos_sigma * (-1 + 2 * cos_2sm**2))
+                )
+                done = np.abs(lam_next - lam[active]) < VINCENTY_TOLERANCE
+                lam[active] = lam_next
+                converged[active[done]] = True
+                active = active[~done]
+
+            terms = DistanceService._vincenty_terms(
+                lam, sin_u1, cos_u1, sin_u2, cos_u2
+            )
+            sin_sigma, cos_sigma, sigma, _, cos2_alpha, cos_2sm = terms
+            u_sq = cos2_alpha * (WGS84_A**2 - WGS84_B**2) / WGS84_B**2
+            a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+            b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+            delta_sigma = (
+                b
+                * sin_sigma
+                * (
+                    cos_2sm
+                    + b
+                    / 4
+                    * (
+                        cos_sigma * (-1 + 2 * cos_2sm**2)
+                        - b
+                        / 6
+                        * cos_2sm
+                        * (-3 + 4 * sin_sigma**2)
+                        * (-3 + 4 * cos_2sm**2)
+                    )
+                )
+            )
+            distances = WGS84_B * a * (sigma - delta_sigma) / 1000
+
+        unresolved = np.flatnonzero(~converged | ~np.isfinite(distances))
+        if unresolved.size:
+            logging.debug(
+                f"Falling back to geodesic for {unresolved.size} point pairs"
+            )
+        for i in unresolved:
+            distances[i] = geodesic((lat1[i], lon1[i]), (lat2[i], lon2[i])).kilometers
+        return distances.reshape(shape)
+
+    @staticmethod
+    def _vincenty_terms(lam, sin_u1, cos_u1, sin_u2, cos_u2):
+        """ Shared trigonometric terms of one Vincenty iteration. """
+        sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+        sin_sigma = np.sqrt(
+            (cos_u2 * sin_lam) ** 2
+            + (cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam) ** 2
+        )
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        # Coincident points have sin_sigma == 0 and a distance of zero.
+        sin_alpha = np.where(
+            sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma
+        )
+        cos2_alpha = 1 - sin_alpha**2
+        # Points on the equator have cos2_alpha == 0.
+        cos_2sm = np.where(
+            cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha
+        )
+        return sin_sigma, cos_sigma, sigma, sin_alpha, cos2_alpha, cos_2sm
@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+from typing import Iterable
+
+import config.app_config as app_config
+import config.db_engine_config as engine_config
+import config.db_postg as db_postg
+from repository.city_repository import CityRepository
+from services.bulk_import_service import CSV, NDJSON
+
+EXPORT_FIELDS = [
+    "city_uuid",
+    "name",
+    "geo_location_latitude",
+    "geo_location_longitude",
+    "beauty",
+    "population",
+]
+
+MEDIA_TYPES = {NDJSON: "application/x-ndjson", CSV: "text/csv"}
+
+
+class ExportService:
+    """
+    Static methods for streaming all cities out of the database.
+
+    Rows are read from a server-side cursor in batches and encoded straight
+    to NDJSON or CSV bytes, in the same layout POST /cities/bulk accepts,
+    so memory use does not depend on the size of the table.
+    """
+
+    @staticmethod
+    def iter_export(export_format: str, with_alliances: bool):
+        """
+        Return an iterator of encoded export chunks.
+
+        The iterator opens its own session, because the response body is
+        produced after the request's session dependency has been closed.
+        It is asynchronous on the asyncio path and synchronous otherwise,
+        in which case Starlette iterates it on a worker thread.
+        """
+        if export_format not in MEDIA_TYPES:
+            raise ValueError(
+                f"Unsupported export format {export_format}, "
+                f"expected one of {', '.join(MEDIA_TYPES)}"
+            )
+        if engine_config.DB_ASYNC:
+            return ExportService._iter_export_async(export_format, with_alliances)
+        return ExportService._iter_export_sync(export_format, with_alliances)
+
+    @staticmethod
+    def encode_rows(rows: Iterable, export_format: str, with_alliances: bool) -> bytes:
+        """ Encode a batch of export rows as NDJSON lines or CSV records. """
+        if export_format == NDJSON:
+            lines = []
+            for row in rows:
+                record = {
+                    "city_uuid": str(row.city_uuid),
+                    "name": row.name,
+                    "geo_location_latitude": row.geo_location_latitude,
+                    "geo_location_longitude": row.geo_location_longitude,
+                    "beauty": row.beauty.value,
+                    "population": row.population,
+                }
+                if with_alliances:
+                    record["alliances"] = [str(uuid) for uuid in row.alliances or []]
+                lines.append(json.dumps(record, separators=(",", ":")))
+            return ("\n".join(lines) + "\n").encode()
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        for row in rows:
+            record = [
+                row.city_uuid,
+                row.name,
+                row.geo_location_latitude,
+                row.geo_location_longitude,
+                row.beauty.value,
+                row.population,
+            ]
+            if with_alliances:
+                record.append(";".join(str(uuid) for uuid in row.alliances or []))
+            writer.writerow(record)
+        return buffer.getvalue().encode()
+
+    @staticmethod
+    def _csv_header(with_alliances: bool) -> bytes:
+        """ Header line of a CSV export. """
+        fields = EXPORT_FIELDS + ["alliances"] if with_alliances else EXPORT_FIELDS
+        return (",".join(fields) + "\n").encode()
+
+    @staticmethod
+    def _iter_export_sync(export_format: str, with_alliances: bool):
+        """ Stream encoded chunks through a regular session. """
+        if export_format == CSV:
+            yield ExportService._csv_header(with_alliances)
+        db = db_postg.SessionLocal()
+        try:
+            for rows in CityRepository.stream_cities(
+                db, with_alliances, app_config.EXPORT_BATCH_SIZE
+            ):
+                yield ExportService.encode_rows(rows, export_format, with_alliances)
+        finally:
+            db.close()
+
+    @staticmethod
+    async def _iter_export_async(export_format: str, with_alliances: bool):
+        """ Stream encoded chunks through an asyncio session. """
+        if export_format == CSV:
+            yield ExportService._csv_header(with_alliances)
+        async with db_postg.AsyncSessionLocal() as db:
+            async for rows in CityRepository.stream_cities_async(
+                db, with_alliances, app_config.EXPORT_BATCH_SIZE
+            ):
+                yield ExportService.encode_rows(rows, export_format, with_alliances)
@@ -0,0 +1,174 @@
+import math
+from typing import List, Optional, Tuple
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Precision of the geohash stored per city, about 3.7 cm x 1.9 cm cells
+GEOHASH_PRECISION = 12
+
+# Conservative kilometers per degree, so that bounding boxes are never too
+# small: the shortest degree of latitude on WGS-84, and a degree of
+# longitude at the equator scaled by the cosine of the latitude
+KM_PER_DEGREE_LATITUDE = 110.574
+KM_PER_DEGREE_LONGITUDE = 111.320
+
+# Safety margin applied to search radii when choosing covering cells
+RADIUS_MARGIN = 1.01
+
+
+class GeohashService:
+    """
+    Static methods for geohash encoding and radius and box coverings.
+
+    A geohash interleaves longitude and latitude bits into a base32 string,
+    so that cities sharing a prefix lie in the same cell. Indexed with a
+    B-tree, a handful of prefix range scans find every city near a point.
+    """
+
+    @staticmethod
+    def encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+        """ Encode a point as a geohash of the given precision. """
+        lat_range = [-90.0, 90.0]
+        lon_range = [-180.0, 180.0]
+        chars = []
+        bits = 0
+        bit_count = 0
+        even = True
+        while len(chars) < precision:
+            value, value_range = (lon, lon_range) if even else (lat, lat_range)
+            middle = (value_range[0] + value_range[1]) / 2
+            if value >= middle:
+                bits = bits * 2 + 1
+                value_range[0] = middle
+            else:
+                bits = bits * 2
+                value_range[1] = middle
+            even = not even
+            bit_count += 1
+            if bit_count == 5:
+                chars.append(GEOHASH_ALPHABET[bits])
+                bits = 0
+                bit_count = 0
+        return "".join(chars)
+
+    @staticmethod
+    def cell_size(precision: int) -> Tuple[float, float]:
+        """
+        Size of a geohash cell of the given precision.
+
+        Returns:
+            tuple: Cell height in degrees of latitude and width in degrees
+            of longitude.
+        """
+        lon_bits = math.ceil(5 * precision / 2)
+        lat_bits = 5 * precision // 2
+        return 180.0 / 2**lat_bits, 360.0 / 2**lon_bits
+
+    @staticmethod
+    def covering_prefixes(
+        lat: float, lon: float, radius_km: float
+    ) -> Optional[List[str]]:
+        """
+        Find geohash prefixes whose cells together cover every point within
+        radius_km of the given point.
+
+        Picks the longest precision whose cells are at least as large as
+        the bounding box of the circle, so the box touches at most four
+        cells.
+
+        Returns:
+            list: Geohash prefixes, or None when the circle reaches a pole
+            or spans too much longitude to be covered by cells.
+        """
+        radius_km *= RADIUS_MARGIN
+        lat_delta = radius_km / KM_PER_DEGREE_LATITUDE
+        min_lat, max_lat = lat - lat_delta, lat + lat_delta
+        if min_lat <= -90.0 or max_lat >= 90.0:
+            return None
+        widest_lat = max(abs(min_lat), abs(max_lat))
+        lon_delta = radius_km / (
+            KM_PER_DEGREE_LONGITUDE * math.cos(math.radians(widest_lat))
+        )
+        if lon_delta >= 180.0:
+            return None
+
+        corner_lons = [
+            (corner_lon + 180.0) % 360.0 - 180.0
+            for corner_lon in (lon - lon_delta, lon + lon_delta)
+        ]
+        return GeohashService.covering_box_prefixes(
+            min_lat, max_lat, corner_lons[0], corner_lons[1]
+        )
+
+    @staticmethod
+    def covering_box_prefixes(
+        min_lat: float, max_lat: float, min_lon: float, max_lon: float
+    ) -> Optional[List[str]]:
+        """
+        Find geohash prefixes whose cells together cover a bounding box.
+        A box with min_lon above max_lon crosses the antimeridian.
+
+        Picks the longest precision whose cells are at least as large as
+        the box, so the box touches at most four cells.
+
+        Returns:
+            list: Geohash prefixes, or None when the box is too large to be
+            covered by four cells.
+        """
+        lat_span = max_lat - min_lat
+        lon_span = max_lon - min_lon
+        if min_lon > max_lon:
+            lon_span += 360.0
+        for precision in range(GEOHASH_PRECISION, 0, -1):
+            cell_height, cell_width = GeohashService.cell_size(precision)
+            if cell_height >= lat_span and cell_width >= lon_span:
+                break
+        else:
+            return None
+
+        return sorted(
+            {
+                GeohashService.encode(corner_lat, corner_lon, precision)
+                for corner_lat in (min_lat, max_lat)
+                for corner_lon in (min_lon, max_lon)
+            }
+        )
+
+    @staticmethod
+    def box_cell_prefixes(
+        min_lat: float,
+        max_lat: float,
+        min_lon: float,
+        max_lon: float,
+        precision: int = 1,
+    ) -> List[str]:
+        """
+        Find every geohash cell of the given precision that a bounding box
+        touches, for boxes too large for covering_box_prefixes. A box with
+        min_lon above max_lon crosses the antimeridian.
+
+        Returns:
+            list: Geohash prefixes, at most 32 at precision 1.
+        """
+        cell_height, cell_width = GeohashService.cell_size(precision)
+        rows = round(180.0 / cell_height)
+        columns = round(360.0 / cell_width)
+
+        def index(value, origin, size, count):
+            return min(int((value - origin) // size), count - 1)
+
+        first_row = index(min_lat, -90.0, cell_height, rows)
+        last_row = index(max_lat, -90.0, cell_height, rows)
+        first_column = index(min_lon, -180.0, cell_width, columns)
+        last_column = index(max_lon, -180.0, cell_width, columns)
+        if min_lon > max_lon:
+            last_column += columns
+        return sorted(
+            GeohashService.encode(
+                -90.0 + (row + 0.5) * cell_height,
+                -180.0 + (column % columns + 0.5) * cell_width,
+                precision,
+            )
+            for row in range(first_row, last_row + 1)
+            for column in range(first_column, last_column + 1)
+        )
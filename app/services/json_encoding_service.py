@@ -0,0 +1,158 @@
+import json
+from typing import Any, Dict, List
+from uuid import UUID
+
+from models.city_model import City
+
+try:
+    import orjson
+except ImportError:  # optional dependency, the stdlib encoder is used instead
+    orjson = None
+
+
+def is_portable_float(value: float) -> bool:
+    """
+    Whether orjson prints a float exactly like json.dumps. Python switches
+    to exponent notation below 1e-4 and from 1e16 on, and writes it
+    differently (1e-05 against 1e-5); NaN and infinities are rejected by
+    the stdlib encoder only.
+    """
+    return value == 0 or 1e-4 <= abs(value) < 1e16
+
+
+def encode_uuid(value: Any) -> str:
+    """ Encode UUIDs for the stdlib encoder, which orjson does natively. """
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JsonEncodingService:
+    """
+    Static methods for encoding city responses straight to JSON bytes.
+
+    The fast path reads ORM rows into plain dicts laid out like the display
+    schemas and encodes them once, instead of building display models that
+    FastAPI validates again against the response model before encoding.
+    Output is byte-identical to JSONResponse: orjson is used when it is
+    installed and every float prints the same way in both encoders, and
+    the stdlib encoder, with JSONResponse's settings, otherwise.
+    """
+
+    @staticmethod
+    def encode(content: Any, portable: bool = True) -> bytes:
+        """
+        Encode content like JSONResponse.render, with UUIDs as strings.
+        Pass portable=False when content holds floats that orjson would
+        print differently.
+        """
+        if orjson is not None and portable:
+            try:
+                return orjson.dumps(content)
+            except orjson.JSONEncodeError:
+                pass  # e.g. integers beyond 64 bits
+        return json.dumps(
+            content,
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+            default=encode_uuid,
+        ).encode("utf-8")
+
+    @staticmethod
+    def city_record(city: City, with_allied_power: bool) -> Dict:
+        """
+        Lay out a city like CityDisplay, or CityDisplayPower with allied
+        power. UUIDs are left to the encoder.
+        """
+        record = {
+            "name": city.name,
+            "geo_location_latitude": city.geo_location_latitude,
+            "geo_location_longitude": city.geo_location_longitude,
+            "beauty": city.beauty.value,
+            "population": city.population,
+            "city_uuid": city.city_uuid,
+            "alliances": [
+                {"allied_city_uuid": alliance.allied_city_uuid}
+                for alliance in city.alliances
+            ],
+        }
+        if with_allied_power:
+            record["allied_power"] = city.allied_power
+        return record
+
+    @staticmethod
+    def encode_city(city: City) -> bytes:
+        """ Encode a city like CityDisplayPower. """
+        return JsonEncodingService.encode(
+            JsonEncodingService.city_record(city, with_allied_power=True),
+            JsonEncodingService._has_portable_floats([city]),
+        )
+
+    @staticmethod
+    def encode_city_page(
+        city_page, page: Any, page_size: int, with_allied_power: bool
+    ) -> bytes:
+        """ Encode a CityPage like PaginatedResponseModel. """
+        return JsonEncodingService.encode(
+            JsonEncodingService._page_content(
+                city_page,
+                page,
+                page_size,
+                [
+                    JsonEncodingService.city_record(city, with_allied_power)
+                    for city in city_page.cities
+                ],
+            ),
+            JsonEncodingService._has_portable_floats(city_page.cities),
+        )
+
+    @staticmethod
+    def encode_city_record(record: Dict) -> bytes:
+        """ Encode a record of a sparse city read. """
+        return JsonEncodingService.encode(
+            record, JsonEncodingService._has_portable_record_floats([record])
+        )
+
+    @staticmethod
+    def encode_city_record_page(city_page, page: Any, page_size: int) -> bytes:
+        """ Encode a CityPage of records like PaginatedResponseModel. """
+        return JsonEncodingService.encode(
+            JsonEncodingService._page_content(
+                city_page, page, page_size, city_page.cities
+            ),
+            JsonEncodingService._has_portable_record_floats(city_page.cities),
+        )
+
+    @staticmethod
+    def _page_content(city_page, page: Any, page_size: int, records: List) -> Dict:
+        """ Lay out a page of city records like PaginatedResponseModel. """
+        return {
+            "total": city_page.total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": city_page.total_pages,
+            "cities": records,
+            "total_is_estimate": city_page.total_is_estimate,
+            "next_cursor": city_page.next_cursor,
+        }
+
+    @staticmethod
+    def _has_portable_floats(cities: List[City]) -> bool:
+        """ Whether every coordinate of the cities is a portable float. """
+        return all(
+            is_portable_float(city.geo_location_latitude)
+            and is_portable_float(city.geo_location_longitude)
+            for city in cities
+        )
+
+    @staticmethod
+    def _has_portable_record_floats(records: List[Dict]) -> bool:
+        """ Whether every coordinate in the records is a portable float. """
+        return all(
+            is_portable_float(record[key])
+            for record in records
+            for key in ("geo_location_latitude", "geo_location_longitude")
+            if key in record
+        )
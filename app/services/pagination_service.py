@@ -0,0 +1,36 @@
+import base64
+import binascii
+import json
+from typing import List
+
+
+class PaginationService:
+    """
+    Static methods for keyset pagination cursors.
+
+    A cursor carries the sort key values of the last row of a page, encoded
+    as URL-safe base64 JSON so clients treat it as opaque.
+    """
+
+    @staticmethod
+    def encode_cursor(values: List) -> str:
+        """ Encode the sort key values of the last row into a cursor. """
+        payload = json.dumps({"k": values}, separators=(",", ":"), default=str)
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> List:
+        """
+        Decode a cursor back into sort key values.
+
+        Raises ValueError if the cursor is malformed.
+        """
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            values = payload["k"]
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise ValueError("Invalid cursor")
+        if not isinstance(values, list):
+            raise ValueError("Invalid cursor")
+        return values
@@ -0,0 +1,124 @@
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+import config.app_config as app_config
+from models.city_model import City
+from repository.city_repository import CityRepository
+from services.distance_service import DistanceService
+from services.geohash_service import GeohashService
+
+# Half of the Earth's meridian circumference, the largest possible distance
+MAX_DISTANCE_KM = 20004.0
+
+# Candidate locations read from the server-side cursor at a time
+SCAN_BATCH_SIZE = 10000
+
+
+class SpatialService:
+    """
+    Static methods for radius and k-nearest-neighbour city queries.
+
+    Candidates come from geohash prefix range scans on the indexed geohash
+    column, so only the cells around the query point are read. Only their
+    UUIDs and locations are streamed, and exact distances are computed a
+    batch at a time in vectorized passes. Just the nearest matches are then
+    loaded as cities, so memory stays bounded even when a radius too large
+    for a covering makes the search read every city.
+    """
+
+    @staticmethod
+    def find_within_radius(
+        db: Session, lat: float, lon: float, radius_km: float, limit: int
+    ) -> List[Tuple[City, float]]:
+        """
+        Find the cities within radius_km of a point, nearest first, at most
+        limit of them.
+
+        Returns:
+            list: Pairs of city and distance in kilometers.
+        """
+        return SpatialService._load_cities(
+            db, SpatialService._search(db, lat, lon, radius_km, limit)
+        )
+
+    @staticmethod
+    def find_nearest(
+        db: Session, lat: float, lon: float, k: int, max_radius_km: Optional[float]
+    ) -> List[Tuple[City, float]]:
+        """
+        Find the k cities nearest to a point, optionally within a radius.
+
+        The search radius starts at KNN_INITIAL_RADIUS_KM and grows until
+        k cities are found, the radius limit is reached, or the whole globe
+        has been searched.
+
+        Returns:
+            list: Pairs of city and distance in kilometers.
+        """
+        max_radius_km = min(max_radius_km or MAX_DISTANCE_KM, MAX_DISTANCE_KM)
+        radius_km = min(app_config.KNN_INITIAL_RADIUS_KM, max_radius_km)
+        while True:
+            if GeohashService.covering_prefixes(lat, lon, radius_km) is None:
+                # The search reads every city anyway, so widen it fully
+                radius_km = max_radius_km
+            matches = SpatialService._search(db, lat, lon, radius_km, k)
+            if len(matches) >= k or radius_km >= max_radius_km:
+                break
+            radius_km = min(radius_km * 4, max_radius_km)
+        return SpatialService._load_cities(db, matches)
+
+    @staticmethod
+    def _search(
+        db: Session, lat: float, lon: float, radius_km: float, limit: int
+    ) -> List[Tuple[UUID, float]]:
+        """
+        Stream the locations in the covering cells, or of every city when
+        the radius is too large for a covering, and keep the nearest limit
+        cities inside the radius.
+
+        Returns:
+            list: Pairs of city UUID and distance in kilometers, nearest first.
+        """
+        city_uuids: List[UUID] = []
+        distances = np.empty(0)
+        for rows in CityRepository.stream_city_locations_in_geohash_cells(
+            db, GeohashService.covering_prefixes(lat, lon, radius_km), SCAN_BATCH_SIZE
+        ):
+            batch_distances = DistanceService.distances_km(
+                lat,
+                lon,
+                [row.geo_location_latitude for row in rows],
+                [row.geo_location_longitude for row in rows],
+            )
+            inside = np.flatnonzero(batch_distances <= radius_km)
+            city_uuids += [rows[i].city_uuid for i in inside]
+            distances = np.concatenate([distances, batch_distances[inside]])
+            if len(city_uuids) > limit:
+                nearest = np.argsort(distances, kind="stable")[:limit]
+                city_uuids = [city_uuids[i] for i in nearest]
+                distances = distances[nearest]
+        order = np.argsort(distances, kind="stable")[:limit]
+        return [(city_uuids[i], float(distances[i])) for i in order]
+
+    @staticmethod
+    def _load_cities(
+        db: Session, matches: List[Tuple[UUID, float]]
+    ) -> List[Tuple[City, float]]:
+        """ Load the matched cities with their alliances, keeping their order. """
+        if not matches:
+            return []
+        cities = {
+            city.city_uuid: city
+            for city in CityRepository.get_cities_by_uuids(
+                db, [city_uuid for city_uuid, _ in matches], with_alliances=True
+            )
+        }
+        # A city deleted since its location was read is left out
+        return [
+            (cities[city_uuid], distance)
+            for city_uuid, distance in matches
+            if city_uuid in cities
+        ]
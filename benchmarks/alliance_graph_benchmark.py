@@ -0,0 +1,107 @@
+"""
+Micro-benchmark for the in-memory alliance graph.
+
+Builds a random graph of cities with a given number of alliances, then
+times bloc lookups, k-hop neighbourhoods and the folding of queued changes.
+Bloc sizes are checked against a plain breadth-first search.
+
+Usage:
+    python benchmarks/alliance_graph_benchmark.py [--cities 500000] \
+        [--alliances 2000000] [--queries 1000]
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from collections import deque
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from services.alliance_graph import ADD, AllianceGraph  # noqa: E402
+
+
+def random_pairs(rng, uuids, alliances):
+    """Yield both directions of distinct random alliances."""
+    a = rng.integers(0, len(uuids), alliances)
+    b = rng.integers(0, len(uuids), alliances)
+    keys = np.unique(np.minimum(a, b)[a != b] * len(uuids) + np.maximum(a, b)[a != b])
+    for key in keys.tolist():
+        x, y = divmod(key, len(uuids))
+        yield uuids[x], uuids[y]
+        yield uuids[y], uuids[x]
+
+
+def bfs_size(adjacency, start):
+    """Reference bloc size by breadth-first search over Python sets."""
+    seen, queue = {start}, deque([start])
+    while queue:
+        for neighbour in adjacency.get(queue.popleft(), ()):
+            if neighbour not in seen:
+                seen.add(neighbour)
+                queue.append(neighbour)
+    return len(seen)
+
+
+def per_query_us(fn, samples):
+    """Return the mean time of fn over samples in microseconds."""
+    start = time.perf_counter()
+    for sample in samples:
+        fn(sample)
+    return (time.perf_counter() - start) / len(samples) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cities", type=int, default=500000)
+    parser.add_argument("--alliances", type=int, default=2000000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    uuids = [
+        uuid.UUID(int=int(x), version=4) for x in rng.integers(0, 2**62, args.cities)
+    ]
+    pairs = list(random_pairs(rng, uuids, args.alliances))
+
+    graph = AllianceGraph(ttl_seconds=float("inf"))
+    start = time.perf_counter()
+    graph.load_pairs(pairs)
+    print(f"load            : {time.perf_counter() - start:8.2f} s "
+          f"for {len(pairs)} directed edges")
+
+    start = time.perf_counter()
+    graph.bloc(pairs[0][0], 1)
+    print(f"components      : {(time.perf_counter() - start) * 1000:8.2f} ms")
+
+    samples = [pairs[i][0] for i in rng.integers(0, len(pairs), args.queries)]
+    elapsed = per_query_us(lambda u: graph.bloc(u, 10), samples)
+    print(f"bloc            : {elapsed:8.1f} us")
+    for hops in (1, 2, 3):
+        elapsed = per_query_us(lambda u: graph.neighbours(u, hops), samples)
+        print(f"neighbours {hops} hop: {elapsed:8.1f} us")
+
+    changes = [(ADD, samples[i], samples[-i - 1]) for i in range(len(samples) // 2)]
+    graph.apply(changes)
+    start = time.perf_counter()
+    graph.bloc(samples[0], 1)
+    print(f"fold {len(changes):>3} changes: {(time.perf_counter() - start) * 1000:8.2f} ms "
+          "(including relabelling)")
+
+    adjacency = {}
+    for city_uuid, allied_city_uuid in pairs:
+        adjacency.setdefault(city_uuid, set()).add(allied_city_uuid)
+    for _, city_uuid, allied_city_uuid in changes:
+        adjacency.setdefault(city_uuid, set()).add(allied_city_uuid)
+        adjacency.setdefault(allied_city_uuid, set()).add(city_uuid)
+    mismatches = sum(
+        graph.bloc(u, 1)[0] != bfs_size(adjacency, u) for u in samples[:20]
+    )
+    print(f"bloc size mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
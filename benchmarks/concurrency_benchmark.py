@@ -0,0 +1,58 @@
+"""
+Concurrency benchmark for a running API instance.
+
+Sends a fixed number of requests at increasing numbers of in-flight
+requests and reports throughput per level. Run it once against a server
+started with DB_ASYNC=false and once with DB_ASYNC=true to compare how
+each database path scales with concurrency.
+
+Usage:
+    python benchmarks/concurrency_benchmark.py --base-url http://localhost:8080 \
+        [--path /cities/] [--requests 2000] [--levels 1,4,16,64]
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+async def run_level(client, path, total_requests, concurrency):
+    """Send total_requests GETs with at most concurrency in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            response = await client.get(path)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total_requests)))
+    return time.perf_counter() - start, errors
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8080")
+    parser.add_argument("--path", default="/cities/")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--levels", default="1,4,16,64")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",")]
+    limits = httpx.Limits(max_connections=max(levels))
+    async with httpx.AsyncClient(
+        base_url=args.base_url, limits=limits, timeout=60
+    ) as client:
+        await run_level(client, args.path, min(args.requests, 50), 1)  # warm-up
+        print(f"{'in-flight':>9} {'req/s':>10} {'errors':>7}")
+        for level in levels:
+            elapsed, errors = await run_level(client, args.path, args.requests, level)
+            print(f"{level:>9} {args.requests / elapsed:>10.1f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,340 @@
+"""
+Load test for the API with mixed, seeded workloads.
+
+Seeds the database through POST /cities/bulk with a configurable number of
+cities, the first of which are hubs that every other city allies with, then
+keeps a fixed number of requests in flight, each picking a scenario by
+weight:
+
+    create   POST /cities/ with a few random allies
+    list     GET /cities/ pages, half of them with include=allied_power
+    list_sparse
+             GET /cities/ pages narrowed to fields=name,population
+    read_hub GET /cities/{uuid} of a hub city, with its allied power
+    rewire   PATCH /cities/{uuid} replacing the alliances of a city
+    delete   DELETE /cities/{uuid} of a city seeded or created for it
+
+By default requests go straight to the ASGI app in this process, which
+needs the PG* variables of a disposable database, e.g. the db service of
+docker-compose.yml (docker compose up -d db, then PGHOST=localhost
+PGPORT=5432 PGUSER=postgres PGPASSWORD=postgres PGDATABASE=gridscaledb).
+With --base-url a running instance is loaded instead. Reads of hub cities
+go through the city cache; set CITY_CACHE_MAX_ENTRIES=0 to measure the
+database path.
+
+Throughput, latency percentiles and the mean response size of every
+scenario are printed and written as JSON to --output, so runs can be
+compared across commits.
+
+Usage:
+    python benchmarks/load_test.py [--cities 10000] [--hubs 20] \
+        [--requests 5000] [--concurrency 16] \
+        [--mix create=1,list=2,list_sparse=0,read_hub=4,rewire=2,delete=1] \
+        [--base-url http://localhost:8080] [--output load_test.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import string
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from uuid import uuid4
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+SCENARIOS = ("create", "list", "list_sparse", "read_hub", "rewire", "delete")
+
+# Fields requested by the list_sparse scenario
+SPARSE_FIELDS = "name,population"
+
+# Alliances of every seeded city: some hubs and some earlier cities
+HUB_ALLIANCES = 2
+RANDOM_ALLIANCES = 2
+
+# Rows sent per POST /cities/bulk request when seeding
+SEED_BATCH_SIZE = 5000
+
+
+def random_city(rng, alliances):
+    """Return the body of a valid random city."""
+    return {
+        "name": "Load "
+        + "".join(rng.choice(string.ascii_letters) for _ in range(10)),
+        "geo_location_latitude": round(rng.uniform(-90, 90), 6),
+        "geo_location_longitude": round(rng.uniform(-180, 180), 6),
+        "beauty": rng.choice(["Ugly", "Average", "Gorgeous"]),
+        "population": rng.randint(1, 10_000_000),
+        "alliances": alliances,
+    }
+
+
+class Workload:
+    """Seeded cities shared by the scenarios, and their latency samples."""
+
+    def __init__(self, client, rng, page_size):
+        self.client = client
+        self.rng = rng
+        self.page_size = page_size
+        self.hubs = []
+        self.cities = []
+        self.deletable = []
+        self.latencies = defaultdict(list)
+        self.sizes = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def seed(self, cities, hubs, deletable):
+        """Create hubs, regular cities and cities reserved for deletion."""
+        rows = []
+        for index in range(cities + deletable):
+            city_uuid = str(uuid4())
+            alliances = set()
+            if index >= hubs:
+                alliances.update(self.rng.sample(self.hubs, min(HUB_ALLIANCES, hubs)))
+                if len(self.cities) > hubs:
+                    alliances.update(
+                        self.cities[self.rng.randrange(hubs, len(self.cities))]
+                        for _ in range(RANDOM_ALLIANCES)
+                    )
+            rows.append(
+                {**random_city(self.rng, sorted(alliances)), "city_uuid": city_uuid}
+            )
+            if index < hubs:
+                self.hubs.append(city_uuid)
+            if index < cities:
+                self.cities.append(city_uuid)
+            else:
+                self.deletable.append(city_uuid)
+        for start in range(0, len(rows), SEED_BATCH_SIZE):
+            body = "\n".join(
+                json.dumps(row) for row in rows[start:start + SEED_BATCH_SIZE]
+            )
+            response = await self.client.post(
+                "/cities/bulk",
+                content=body.encode(),
+                headers={"Content-Type": "application/x-ndjson"},
+            )
+            response.raise_for_status()
+            report = response.json()
+            if report["failed"]:
+                raise RuntimeError(f"Seeding failed: {report['errors'][:5]}")
+
+    async def create(self):
+        allies = self.rng.sample(self.cities, min(3, len(self.cities)))
+        response = await self.client.post(
+            "/cities/", json=random_city(self.rng, allies)
+        )
+        if response.status_code == 200:
+            self.deletable.append(response.json()["city_uuid"])
+        return response
+
+    async def list(self):
+        pages = max(1, len(self.cities) // self.page_size)
+        params = {"page": self.rng.randint(1, pages), "page_size": self.page_size}
+        if self.rng.random() < 0.5:
+            params["include"] = "allied_power"
+        return await self.client.get("/cities/", params=params)
+
+    async def list_sparse(self):
+        pages = max(1, len(self.cities) // self.page_size)
+        params = {
+            "page": self.rng.randint(1, pages),
+            "page_size": self.page_size,
+            "fields": SPARSE_FIELDS,
+        }
+        return await self.client.get("/cities/", params=params)
+
+    async def read_hub(self):
+        return await self.client.get(f"/cities/{self.rng.choice(self.hubs)}")
+
+    async def rewire(self):
+        city_uuid = self.rng.choice(self.cities[len(self.hubs):])
+        allies = set(self.rng.sample(self.hubs, min(HUB_ALLIANCES, len(self.hubs))))
+        allies.update(self.rng.sample(self.cities, RANDOM_ALLIANCES))
+        allies.discard(city_uuid)
+        return await self.client.patch(
+            f"/cities/{city_uuid}", json={"alliances": sorted(allies)}
+        )
+
+    async def delete(self):
+        if not self.deletable:
+            return None
+        city_uuid = self.deletable.pop(self.rng.randrange(len(self.deletable)))
+        return await self.client.delete(f"/cities/{city_uuid}")
+
+    async def run_one(self, scenario):
+        """Run one request of a scenario and record its latency."""
+        start = time.perf_counter()
+        response = await getattr(self, scenario)()
+        elapsed = time.perf_counter() - start
+        if response is None:
+            return
+        self.latencies[scenario].append(elapsed)
+        self.sizes[scenario].append(len(response.content))
+        if response.status_code >= 400:
+            self.errors[scenario] += 1
+
+
+async def drive(workload, mix, requests, concurrency):
+    """Send requests with at most concurrency in flight; return seconds."""
+    scenarios = [scenario for scenario in SCENARIOS if mix.get(scenario)]
+    weights = [mix[scenario] for scenario in scenarios]
+    plan = workload.rng.choices(scenarios, weights, k=requests)
+    queue = iter(plan)
+
+    async def worker():
+        for scenario in queue:
+            await workload.run_one(scenario)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+def summarize(latencies, sizes, errors, elapsed):
+    """Throughput, latency percentiles and mean size of one set of samples."""
+    samples = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "mean_ms": round(float(samples.mean()), 3),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+        "max_ms": round(float(samples.max()), 3),
+        "mean_bytes": round(float(np.mean(sizes))),
+    }
+
+
+def git_commit():
+    """Return the commit of the working tree, if it is a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@asynccontextmanager
+async def open_client(base_url, concurrency):
+    """Client for a running instance, or for the ASGI app in this process."""
+    if base_url:
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(
+            base_url=base_url, limits=limits, timeout=120
+        ) as client:
+            yield client
+        return
+
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://load-test",
+            timeout=120,
+        ) as client:
+            yield client
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--base-url", default=None)
+    parser.add_argument("--cities", type=int, default=10000)
+    parser.add_argument("--hubs", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument(
+        "--mix", default="create=1,list=2,read_hub=4,rewire=2,delete=1"
+    )
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default="load_test.json")
+    args = parser.parse_args()
+
+    mix = {}
+    for item in args.mix.split(","):
+        scenario, weight = item.split("=")
+        if scenario not in SCENARIOS:
+            parser.error(f"unknown scenario {scenario}, expected one of {SCENARIOS}")
+        mix[scenario] = float(weight)
+    if args.hubs < 1 or args.cities <= args.hubs:
+        parser.error("--cities must exceed --hubs, and --hubs must be positive")
+
+    rng = random.Random(args.seed)
+    total_weight = sum(mix.values())
+    deletable = int(args.requests * mix.get("delete", 0) / total_weight) + 1
+
+    async with open_client(args.base_url, args.concurrency) as client:
+        workload = Workload(client, rng, args.page_size)
+        start = time.perf_counter()
+        await workload.seed(args.cities, args.hubs, deletable)
+        seed_seconds = time.perf_counter() - start
+        print(f"seeded {args.cities + deletable} cities in {seed_seconds:.2f} s")
+
+        await drive(workload, mix, min(args.requests // 10, 200), args.concurrency)
+        workload.latencies.clear()
+        workload.sizes.clear()
+        workload.errors.clear()
+        elapsed = await drive(workload, mix, args.requests, args.concurrency)
+
+    results = {
+        scenario: summarize(
+            workload.latencies[scenario],
+            workload.sizes[scenario],
+            workload.errors[scenario],
+            elapsed,
+        )
+        for scenario in SCENARIOS
+        if workload.latencies[scenario]
+    }
+    results["total"] = summarize(
+        [sample for samples in workload.latencies.values() for sample in samples],
+        [size for sizes in workload.sizes.values() for size in sizes],
+        sum(workload.errors.values()),
+        elapsed,
+    )
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "target": args.base_url or "asgi",
+        "parameters": {**vars(args), "mix": mix},
+        "seed_seconds": round(seed_seconds, 3),
+        "elapsed_seconds": round(elapsed, 3),
+        "scenarios": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+
+    print(
+        f"{'scenario':>11} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+        f"{'p99 ms':>9} {'bytes':>8} {'errors':>7}"
+    )
+    for scenario, stats in results.items():
+        print(
+            f"{scenario:>11} {stats['throughput_rps']:>9.1f} "
+            f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+            f"{stats['p99_ms']:>9.2f} {stats['mean_bytes']:>8} "
+            f"{stats['errors']:>7}"
+        )
+    print(f"written to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+"""
+Overhead benchmark for request metrics.
+
+Calls a minimal ASGI app directly, with and without MetricsMiddleware, and
+runs SQL statements on an in-memory SQLite engine with and without the
+statement timing hooks, reporting the added cost per request and per
+statement.
+
+Usage:
+    python benchmarks/metrics_overhead_benchmark.py [--requests 20000] \
+        [--statements 20000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from fastapi import FastAPI
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from monitoring.request_metrics import (  # noqa: E402
+    MetricsMiddleware,
+    RequestMetrics,
+    instrument_engine,
+)
+
+
+def build_app(with_metrics):
+    """Return a one-route app, optionally wrapped in the metrics middleware."""
+    app = FastAPI()
+
+    @app.get("/cities/{city_uuid}")
+    async def read_city(city_uuid: str):
+        return {"city_uuid": city_uuid}
+
+    if with_metrics:
+        app.add_middleware(MetricsMiddleware, metrics=RequestMetrics())
+    return app
+
+
+async def drive(app, requests):
+    """Send requests straight through the ASGI interface; return seconds."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/cities/0f4b2c8e-1b6a-4c9e-9d53-3b7f5c2e9a10",
+        "raw_path": b"/cities/0f4b2c8e-1b6a-4c9e-9d53-3b7f5c2e9a10",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"benchmark")],
+        "client": ("127.0.0.1", 1),
+        "server": ("benchmark", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(min(requests, 500)):  # warm-up
+        await app(dict(scope), receive, send)
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return time.perf_counter() - start
+
+
+def run_statements(instrumented, statements):
+    """Run SELECT 1 statements on SQLite; return seconds."""
+    engine = create_engine("sqlite://")
+    if instrumented:
+        instrument_engine(engine, RequestMetrics())
+    with engine.connect() as connection:
+        statement = text("SELECT 1")
+        connection.execute(statement)
+        start = time.perf_counter()
+        for _ in range(statements):
+            connection.execute(statement).scalar()
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--statements", type=int, default=20000)
+    args = parser.parse_args()
+
+    base = asyncio.run(drive(build_app(False), args.requests))
+    measured = asyncio.run(drive(build_app(True), args.requests))
+    print(
+        f"request   : {base / args.requests * 1e6:7.1f} us without metrics, "
+        f"{measured / args.requests * 1e6:7.1f} us with, "
+        f"+{(measured - base) / args.requests * 1e6:5.1f} us per request"
+    )
+
+    base = run_statements(False, args.statements)
+    measured = run_statements(True, args.statements)
+    print(
+        f"statement : {base / args.statements * 1e6:7.1f} us without hooks, "
+        f"{measured / args.statements * 1e6:7.1f} us with, "
+        f"+{(measured - base) / args.statements * 1e6:5.1f} us per statement"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Serialization benchmark and byte-identity check for city list responses.
+
+Builds pages of in-memory City rows with alliances and serves them from a
+minimal app in two ways: through the display models and the response
+model, like GET /cities/ by default, and encoded straight to bytes, like
+with FAST_JSON_RESPONSES. Every response body of the fast path is compared
+byte for byte with the default one, including pages with coordinates that
+orjson prints differently, and the time per page is reported for orjson
+and for the stdlib fallback.
+
+Usage:
+    python benchmarks/serialization_benchmark.py [--rows 100] [--pages 50] \
+        [--repeats 20]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+
+from fastapi import FastAPI
+from fastapi.responses import Response
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import services.json_encoding_service as json_encoding_service  # noqa: E402
+from models.city_model import BeautyEnum, City, CityAlliances  # noqa: E402
+from routers.city_router import build_city_page_model  # noqa: E402
+from schemas.pagination_schema import (  # noqa: E402
+    PaginatedResponseModel,
+    PaginationParams,
+)
+from services.city_service import CityPage  # noqa: E402
+from services.json_encoding_service import JsonEncodingService  # noqa: E402
+
+
+def random_city(rng, tiny_coordinates):
+    """An in-memory city with up to 8 alliances and stored allied power."""
+    latitude = round(rng.uniform(-90, 90), rng.randint(0, 6))
+    if tiny_coordinates and rng.random() < 0.1:
+        latitude = rng.choice([5e-05, -1.2e-05, 0.0])
+    city = City(
+        city_uuid=uuid.UUID(int=rng.getrandbits(128), version=4),
+        name="".join(rng.choice("abcdefgh ") for _ in range(rng.randint(3, 30))),
+        geo_location_latitude=latitude,
+        geo_location_longitude=round(rng.uniform(-180, 180), rng.randint(0, 6)),
+        beauty=rng.choice(list(BeautyEnum)),
+        population=rng.randint(1, 10**9),
+        allied_power=rng.randint(1, 10**10),
+    )
+    city.alliances = [
+        CityAlliances(allied_city_uuid=uuid.UUID(int=rng.getrandbits(128), version=4))
+        for _ in range(rng.randint(0, 8))
+    ]
+    return city
+
+
+def random_page(rng, rows, tiny_coordinates):
+    """A CityPage of random cities with pagination metadata."""
+    return CityPage(
+        cities=[random_city(rng, tiny_coordinates) for _ in range(rows)],
+        total=rng.randint(rows, 10**6),
+        total_pages=rng.randint(1, 10**4),
+        total_is_estimate=rng.random() < 0.5,
+        next_cursor=rng.choice([None, "eyJrIjpbIjEyMyJdfQ"]),
+    )
+
+
+def build_app(pages):
+    """Serve each page in the default and the fast way."""
+    app = FastAPI()
+    pagination = PaginationParams(page=3, page_size=100)
+
+    @app.get("/default/{index}/{allied_power}", response_model=PaginatedResponseModel)
+    def default(index: int, allied_power: bool):
+        return build_city_page_model(pages[index], pagination, allied_power)
+
+    @app.get("/fast/{index}/{allied_power}")
+    def fast(index: int, allied_power: bool):
+        return Response(
+            JsonEncodingService.encode_city_page(
+                pages[index], pagination.page, pagination.page_size, allied_power
+            ),
+            media_type="application/json",
+        )
+
+    return app
+
+
+async def get(app, path):
+    """Call the app directly through ASGI and return the response body."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"benchmark")],
+        "client": ("127.0.0.1", 1),
+        "server": ("benchmark", 80),
+    }
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def time_pages(app, mode, pages, repeats):
+    """Mean milliseconds to serve one page in a mode."""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for index in range(len(pages)):
+            await get(app, f"/{mode}/{index}/true")
+    return (time.perf_counter() - start) / (repeats * len(pages)) * 1000
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    pages = [
+        random_page(rng, args.rows, tiny_coordinates=index % 2 == 1)
+        for index in range(args.pages)
+    ]
+    app = build_app(pages)
+    orjson = json_encoding_service.orjson
+
+    mismatches = 0
+    for encoder in ("orjson", "stdlib"):
+        json_encoding_service.orjson = orjson if encoder == "orjson" else None
+        for index in range(len(pages)):
+            for allied_power in ("true", "false"):
+                default = await get(app, f"/default/{index}/{allied_power}")
+                fast = await get(app, f"/fast/{index}/{allied_power}")
+                mismatches += default != fast
+    print(f"{args.pages * 4} pages compared, {mismatches} not byte-identical")
+
+    json_encoding_service.orjson = orjson
+    default_ms = await time_pages(app, "default", pages, args.repeats)
+    print(f"default          : {default_ms:7.3f} ms per {args.rows}-row page")
+    if orjson is not None:
+        fast_ms = await time_pages(app, "fast", pages, args.repeats)
+        print(
+            f"fast with orjson : {fast_ms:7.3f} ms per page "
+            f"({default_ms / fast_ms:.1f}x)"
+        )
+    json_encoding_service.orjson = None
+    fast_ms = await time_pages(app, "fast", pages, args.repeats)
+    print(f"fast with stdlib : {fast_ms:7.3f} ms per page ({default_ms / fast_ms:.1f}x)")
+    json_encoding_service.orjson = orjson
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
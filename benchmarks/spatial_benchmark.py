@@ -0,0 +1,103 @@
+"""
+Benchmark and correctness check for geohash radius queries.
+
+Simulates the indexed geohash column with a sorted list and bisect range
+scans, then compares radius query results against geopy's geodesic, the
+reference of AlliedPowerService.calculate_distance, and reports the time
+per query of the indexed search and of a vectorized brute-force scan.
+Only the cities within REFERENCE_MARGIN of the radius by haversine
+distance are measured with geopy, which keeps the reference affordable.
+
+Usage:
+    python benchmarks/spatial_benchmark.py [--cities 200000] [--queries 200]
+"""
+import argparse
+import bisect
+import os
+import sys
+import time
+
+import numpy as np
+from geopy.distance import geodesic
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from services.distance_service import HAVERSINE, DistanceService  # noqa: E402
+from services.geohash_service import GeohashService  # noqa: E402
+
+# Relative margin over the radius of the haversine prefilter of the
+# reference, above the spherical Earth's largest error of about 0.56%
+REFERENCE_MARGIN = 1.01
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cities", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    lats = np.round(np.degrees(np.arcsin(rng.uniform(-1, 1, args.cities))), 6)
+    lons = np.round(rng.uniform(-180, 180, args.cities), 6)
+    start = time.perf_counter()
+    hashes = [GeohashService.encode(a, b) for a, b in zip(lats, lons)]
+    print(f"encoded {args.cities} geohashes in {time.perf_counter() - start:.2f} s")
+    order = np.argsort(hashes)
+    index = [hashes[i] for i in order]
+
+    mismatches = 0
+    indexed_time = brute_time = 0.0
+    candidates_read = 0
+    for _ in range(args.queries):
+        lat = float(np.degrees(np.arcsin(rng.uniform(-1, 1))))
+        lon = float(rng.uniform(-180, 180))
+        radius_km = float(10 ** rng.uniform(0, 3.5))
+
+        start = time.perf_counter()
+        prefixes = GeohashService.covering_prefixes(lat, lon, radius_km)
+        if prefixes is None:
+            rows = order
+        else:
+            rows = np.concatenate(
+                [
+                    order[
+                        bisect.bisect_left(index, prefix) : bisect.bisect_left(
+                            index, prefix + "~"
+                        )
+                    ]
+                    for prefix in prefixes
+                ]
+            ).astype(int)
+        candidates_read += len(rows)
+        distances = DistanceService.distances_km(lat, lon, lats[rows], lons[rows])
+        found = set(rows[distances <= radius_km].tolist())
+        indexed_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        all_distances = DistanceService.distances_km(lat, lon, lats, lons)
+        np.flatnonzero(all_distances <= radius_km)
+        brute_time += time.perf_counter() - start
+
+        near = np.flatnonzero(
+            DistanceService.distances_km(lat, lon, lats, lons, HAVERSINE)
+            <= radius_km * REFERENCE_MARGIN + 1
+        )
+        expected = {
+            int(i)
+            for i in near
+            if geodesic((lat, lon), (lats[i], lons[i])).kilometers <= radius_km
+        }
+
+        mismatches += len(found ^ expected)
+
+    print(
+        f"indexed: {indexed_time / args.queries * 1000:8.3f} ms/query, "
+        f"{candidates_read / args.queries:10.1f} candidates/query"
+    )
+    print(f"brute  : {brute_time / args.queries * 1000:8.3f} ms/query")
+    print(f"mismatching cities: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
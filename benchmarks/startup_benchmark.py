@@ -0,0 +1,106 @@
+"""
+Cold start benchmark for multi-worker deployments.
+
+Starts a number of fresh Python processes at once, like the workers of a
+uvicorn or gunicorn deployment, and has each import the application and,
+with --with-db, run its startup (engine creation, optional pool warm-up
+and a first query). Reports the import and startup time of the workers
+and the wall time until all of them are ready.
+
+Importing the app does not touch the database, so the default run needs
+no database settings at all. --with-db needs the PG* variables of a
+reachable database; set POOL_WARMUP to include the warm-up.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--workers 4] [--runs 5] [--with-db]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app"))
+
+# Script run by every worker: time the import, then the application startup
+WORKER_SCRIPT = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+startup = None
+if sys.argv[1] == "with-db":
+    from sqlalchemy import text
+    import config.db_postg as db_postg
+
+    async def start_up():
+        async with main.app.router.lifespan_context(main.app):
+            with db_postg.SessionLocal() as db:
+                db.execute(text("SELECT 1"))
+
+    asyncio.run(start_up())
+    startup = time.perf_counter() - imported
+print(json.dumps({"import": imported - start, "startup": startup}))
+"""
+
+
+def run_workers(workers, with_db):
+    """Start workers at once; return their timings and the wall time."""
+    start = time.perf_counter()
+    processes = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                WORKER_SCRIPT,
+                "with-db" if with_db else "import-only",
+            ],
+            cwd=APP_DIR,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        for _ in range(workers)
+    ]
+    timings = []
+    for process in processes:
+        stdout, stderr = process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"Worker failed:\n{stderr}")
+        timings.append(json.loads(stdout.strip().splitlines()[-1]))
+    return timings, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--with-db", action="store_true")
+    args = parser.parse_args()
+
+    run_workers(1, args.with_db)  # warm the bytecode and OS file caches
+    imports, startups, walls = [], [], []
+    for _ in range(args.runs):
+        timings, wall = run_workers(args.workers, args.with_db)
+        imports += [timing["import"] for timing in timings]
+        if args.with_db:
+            startups += [timing["startup"] for timing in timings]
+        walls.append(wall)
+
+    print(f"{args.workers} workers, {args.runs} runs")
+    print(
+        f"import : median {statistics.median(imports) * 1000:8.1f} ms, "
+        f"max {max(imports) * 1000:8.1f} ms"
+    )
+    if startups:
+        print(
+            f"startup: median {statistics.median(startups) * 1000:8.1f} ms, "
+            f"max {max(startups) * 1000:8.1f} ms"
+        )
+    print(f"all workers ready: median {statistics.median(walls) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
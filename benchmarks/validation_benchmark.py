@@ -0,0 +1,272 @@
+"""
+Throughput and equivalence check for city request validation.
+
+Validates a fuzzed corpus of CityCreate and CityPatch payloads with the
+current schemas and with a copy of the previous ones (Pydantic v1-style
+validators, an uncompiled name pattern and string based precision checks),
+reports the payloads validated per second by each, and lists every payload
+they disagree on. Disagreements in the known differences below are counted
+separately; any other one is a regression.
+
+Known differences:
+    tiny_exponent  Coordinates below 1e-4 printed in exponent notation, such
+                   as 1e-07, were accepted because the part after "." was
+                   read from "1e-07"; they now count their real decimals.
+    null_name      A null name in a patch raised TypeError inside the old
+                   validator, i.e. a server error; it is now rejected, like
+                   any null for a column that cannot be null.
+    nan            NaN coordinates slipped past the range checks and were
+                   accepted; NaN never equals its rounding, so they are now
+                   rejected.
+    out_of_range   A patch redeclared its fields without the bounds of
+                   CityBase, so a population of -5, a latitude of 500 or a
+                   101-character name ending in a newline was accepted;
+                   patches now keep the bounds of a new city.
+
+Every payload of OUT_OF_RANGE_PATCHES must be rejected by the current
+CityPatch; any one accepted is reported as a regression.
+
+Usage:
+    python benchmarks/validation_benchmark.py [--payloads 20000] [--seed 7]
+"""
+import argparse
+import math
+import os
+import random
+import re
+import sys
+import time
+import uuid
+import warnings
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, UUID4, ValidationError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from schemas.city_schema import BeautyEnum, CityCreate, CityPatch  # noqa: E402
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    from pydantic import validator
+
+    class LegacyCityBase(BaseModel):
+        """The city schema before native validators, for comparison."""
+
+        name: str = Field(..., min_length=3, max_length=100)
+        geo_location_latitude: float = Field(..., ge=-90.0, le=90.0)
+        geo_location_longitude: float = Field(..., ge=-180.0, le=180.0)
+        beauty: BeautyEnum = Field(...)
+        population: int = Field(..., ge=1, le=1000000000)
+
+        model_config = ConfigDict(extra="forbid")
+
+        @validator("name")
+        def validate_name(cls, v):
+            if not re.match("^[a-zA-Z ]{3,100}$", v):
+                raise ValueError(
+                    "Name must only contain letters and spaces, up to 100 characters"
+                )
+            return v
+
+        @validator("geo_location_latitude", "geo_location_longitude")
+        def validate_geo_precision(cls, v):
+            if len(str(v).split(".")[-1]) > 6:
+                raise ValueError(
+                    "Geo-location should not have more than 6 decimal places"
+                )
+            return v
+
+    class LegacyCityCreate(LegacyCityBase):
+        alliances: Optional[List[UUID4]] = []
+
+    class LegacyCityPatch(LegacyCityBase):
+        name: Optional[str] = None
+        geo_location_latitude: Optional[float] = None
+        geo_location_longitude: Optional[float] = None
+        beauty: Optional[BeautyEnum] = None
+        population: Optional[int] = None
+        alliances: Optional[List[UUID4]] = []
+
+
+# Patches with one field outside the bounds of CityBase
+OUT_OF_RANGE_PATCHES = [
+    {"population": -5},
+    {"population": 0},
+    {"population": 10**9 + 1},
+    {"geo_location_latitude": 500},
+    {"geo_location_latitude": -90.000001},
+    {"geo_location_latitude": math.inf},
+    {"geo_location_longitude": 180.5},
+    {"geo_location_longitude": -math.inf},
+    {"name": "ab"},
+    {"name": "a" * 101},
+    {"name": "Berlin", "population": -5, "geo_location_latitude": 500},
+]
+
+
+def fuzz_name(rng):
+    """A name that is valid, or broken in one of many ways."""
+    length = rng.choice([1, 2, 3, 4, 10, 50, 99, 100, 101, 150])
+    letters = "abcdefghijklmnopqrstuvwxyzABCXYZ  "
+    name = "".join(rng.choice(letters) for _ in range(length))
+    mutation = rng.randrange(12)
+    if mutation == 0:
+        name += "\n"
+    elif mutation == 1:
+        name = name[:-1] + rng.choice("0-_.'éßЖ\t\n")
+    elif mutation == 2:
+        return rng.choice(["", "   ", None, 42, "São Paulo", "New\nYork"])
+    return name
+
+
+def fuzz_coordinate(rng, bound):
+    """A coordinate with 0 to 10 decimals, in exponent form, or off limits."""
+    kind = rng.randrange(10)
+    if kind == 0:
+        return rng.choice(
+            [bound, -bound, bound + 1e-6, 0, -0.0, math.nan, math.inf, "12.5", "x"]
+        )
+    if kind == 1:
+        return rng.choice([1, 2.5, 3, 1.25, 7]) * 10.0 ** -rng.randint(5, 12)
+    value = round(rng.uniform(-bound, bound), rng.randint(0, 10))
+    if kind == 2:
+        return int(value)
+    return value
+
+
+def fuzz_payload(rng, patch):
+    """A CityCreate or CityPatch body with random fields valid or not."""
+    payload = {
+        "name": fuzz_name(rng),
+        "geo_location_latitude": fuzz_coordinate(rng, 90),
+        "geo_location_longitude": fuzz_coordinate(rng, 180),
+        "beauty": rng.choice(["Ugly", "Average", "Gorgeous", "ugly", "Pretty"]),
+        "population": rng.choice(
+            [rng.randint(1, 10**9), 0, -5, 10**9 + 1, 1.0, 1.5, "100"]
+        ),
+        "alliances": rng.choice(
+            [[], [str(uuid.uuid4())], ["not-a-uuid"], [str(uuid.uuid1())], None]
+        ),
+    }
+    if rng.random() < 0.05:
+        payload["extra_field"] = 1
+    if patch:
+        payload = {key: value for key, value in payload.items() if rng.random() < 0.4}
+    else:
+        for key in list(payload):
+            if rng.random() < 0.03:
+                del payload[key]
+    return payload
+
+
+def outcome(model, payload):
+    """'ok', 'invalid' or the name of the exception validation raised."""
+    try:
+        model.model_validate(payload)
+        return "ok"
+    except ValidationError:
+        return "invalid"
+    except Exception as e:
+        return type(e).__name__
+
+
+def out_of_range(payload):
+    """Whether a payload has a field outside the bounds of CityBase."""
+    name = payload.get("name")
+    if isinstance(name, str) and not 3 <= len(name) <= 100:
+        return True
+    for key, bound, minimum in (
+        ("geo_location_latitude", 90, None),
+        ("geo_location_longitude", 180, None),
+        ("population", 10**9, 1),
+    ):
+        value = payload.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            low = -bound if minimum is None else minimum
+            if not low <= value <= bound:
+                return True
+    return False
+
+
+def known_difference(payload):
+    """Name the known difference a disagreement falls under, if any."""
+    if "name" in payload and payload["name"] is None:
+        return "null_name"
+    for key in ("geo_location_latitude", "geo_location_longitude"):
+        value = payload.get(key)
+        if isinstance(value, float) and math.isnan(value):
+            return "nan"
+        if isinstance(value, float) and "e-" in str(value):
+            return "tiny_exponent"
+    if out_of_range(payload):
+        return "out_of_range"
+    return None
+
+
+def throughput(model, corpus, repeats):
+    """Payloads validated per second, errors included."""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for payload in corpus:
+            try:
+                model.model_validate(payload)
+            except (ValidationError, TypeError):
+                pass
+    return len(corpus) * repeats / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--payloads", type=int, default=20000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for label, patch, current, legacy in (
+        ("create", False, CityCreate, LegacyCityCreate),
+        ("patch", True, CityPatch, LegacyCityPatch),
+    ):
+        corpus = [fuzz_payload(rng, patch) for _ in range(args.payloads)]
+        if patch:
+            corpus += OUT_OF_RANGE_PATCHES
+        accepted = []
+        known = {}
+        unexpected = []
+        for payload in corpus:
+            new, old = outcome(current, payload), outcome(legacy, payload)
+            if new == old == "ok":
+                accepted.append(payload)
+            if new != old:
+                difference = known_difference(payload)
+                if difference:
+                    known[difference] = known.get(difference, 0) + 1
+                else:
+                    unexpected.append((payload, old, new))
+
+        for subset, payloads in (("all", corpus), ("valid", accepted)):
+            legacy_rate = throughput(legacy, payloads, args.repeats)
+            current_rate = throughput(current, payloads, args.repeats)
+            print(
+                f"{label:>6} {subset:>5}: {legacy_rate:10.0f} payloads/s before, "
+                f"{current_rate:10.0f} after ({current_rate / legacy_rate:.2f}x), "
+                f"{len(payloads)} payloads"
+            )
+        print(f"        known differences: {known or 'none'}")
+        print(f"        unexpected differences: {len(unexpected)}")
+        for payload, old, new in unexpected[:10]:
+            print(f"          {old} -> {new}: {payload}")
+        if patch:
+            slipped = [
+                payload
+                for payload in OUT_OF_RANGE_PATCHES
+                if outcome(current, payload) != "invalid"
+            ]
+            print(f"        out-of-range patches accepted: {len(slipped)}")
+            for payload in slipped:
+                print(f"          {payload}")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,14 @@ def get_city(city_uuid):
     return response.json()
 
 
+def get_cities_by_uuids(city_uuids):
+    """Retrieve many cities by UUID with a single request."""
+    response = requests.post(
+        f"{BASE_URL}/cities/batch-get", json={"city_uuids": list(city_uuids)}
+    )
+    return response.json()
+
+
 def get_cities():
     """Retrieve all cities."""
     response = requests.get(f"{BASE_URL}/cities/")
@@ -41,9 +49,21 @@ def print_city_state():
     """Print the state of each city with alliance names."""
     cities_response = get_cities()
     cities = cities_response["cities"]
+    alliance_uuids = {
+        alliance["allied_city_uuid"]
+        for city in cities
+        for alliance in city["alliances"]
+    }
+    names = {}
+    if alliance_uuids:
+        try:
+            allies = get_cities_by_uuids(alliance_uuids)["cities"]
+            names = {ally["city_uuid"]: ally["name"] for ally in allies}
+        except Exception as e:
+            names = {uuid: f"Error Fetching City: {e}" for uuid in alliance_uuids}
     for city in cities:
-        alliance_uuids = [
-            alliance["allied_city_uuid"] for alliance in city["alliances"]
+        alliance_names = [
+            names.get(alliance["allied_city_uuid"], "Unknown City")
+            for alliance in city["alliances"]
         ]
-        alliance_names = [get_city_name_by_uuid(uuid) for uuid in alliance_uuids]
         print(f"City: {city['name']}, Alliances: {alliance_names}")
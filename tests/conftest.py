@@ -0,0 +1,65 @@
+"""
+Shared fixtures.
+
+The application modules are imported from app/, as the service runs them.
+Tests that need a database are skipped unless the PG* variables of a
+disposable database are set, e.g. the db service of docker-compose.yml
+(docker compose up -d db, then PGHOST=localhost PGPORT=5432 PGUSER=postgres
+PGPASSWORD=postgres PGDATABASE=gridscaledb). Its city tables are emptied
+before every such test. Query inspection is on, so query budgets can be
+asserted.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+os.environ.setdefault("QUERY_DEBUG", "true")
+
+from sqlalchemy import text  # noqa: E402
+
+import config.db_postg as db_postg  # noqa: E402
+from commands.bootstrap import upgrade_schema  # noqa: E402
+
+# Settings of the database the tests run against
+PG_VARIABLES = ("PGHOST", "PGPORT", "PGUSER", "PGPASSWORD", "PGDATABASE")
+
+# Tables emptied before every database test
+CITY_TABLES = ("city_alliances", "city", "city_beauty_stats", "city_degree_stats")
+
+
+@pytest.fixture(scope="session")
+def engine():
+    """ The engine of a disposable database with an up to date schema. """
+    missing = [name for name in PG_VARIABLES if name not in os.environ]
+    if missing:
+        pytest.skip(f"needs a disposable database, {', '.join(missing)} not set")
+    engine = db_postg.init_engine()
+    with engine.begin() as connection:
+        upgrade_schema(connection)
+    yield engine
+    db_postg.engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    """ A session on emptied city tables. """
+    with engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {', '.join(CITY_TABLES)}"))
+    session = db_postg.SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client(db):
+    """
+    A test client of the application on emptied city tables. The lifespan
+    is not run, so requests share the engine of the engine fixture.
+    """
+    from fastapi.testclient import TestClient
+
+    from main import app
+
+    return TestClient(app)
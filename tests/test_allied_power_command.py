@@ -0,0 +1,86 @@
+"""
+The allied power consistency check: the stored allied power maintained by
+city writes matches the live one after creating, moving, growing and
+deleting allied cities, and a rebuild repairs a corrupted value.
+"""
+import pytest
+
+import config.db_postg as db_postg
+from commands.allied_power import compare_allied_power
+from repository.city_repository import CityRepository
+from schemas.city_schema import CityPatch
+from services.city_service import CityService
+
+# Cities per batch, small enough for the check to walk several batches
+BATCH_SIZE = 2
+
+
+def city_data(name: str, latitude: float, longitude: float) -> dict:
+    """ The fields of a valid city. """
+    return {
+        "name": name,
+        "geo_location_latitude": latitude,
+        "geo_location_longitude": longitude,
+        "beauty": "Average",
+        "population": 50000,
+    }
+
+
+def mismatches(rebuild: bool = False) -> int:
+    """
+    Run the check, or the rebuild, in a session of its own, like the
+    command, so that it reads what the writes committed.
+    """
+    with db_postg.SessionLocal() as db:
+        return compare_allied_power(db, BATCH_SIZE, rebuild=rebuild)
+
+
+@pytest.fixture
+def allied_cities(db):
+    """ A hub allied with cities near it, across an ocean and far away. """
+    allies = [
+        CityService.create_city(db, city_data(name, latitude, longitude), [])
+        for name, latitude, longitude in (
+            ("Near", 52.0, 13.0),
+            ("Across", 40.7, -74.0),
+            ("Far", -33.9, 151.2),
+        )
+    ]
+    hub = CityService.create_city(
+        db, city_data("Hub", 52.5, 13.4), [ally.city_uuid for ally in allies]
+    )
+    return hub, allies
+
+
+def test_writes_keep_allied_power_consistent(db, allied_cities):
+    hub, allies = allied_cities
+    assert mismatches() == 0
+
+    # Moves the ally from under 1000 km to over 10000 km, and grows it
+    CityService.update_city(
+        db,
+        allies[0].city_uuid,
+        CityPatch(
+            geo_location_latitude=-34.6, geo_location_longitude=-58.4, population=9000
+        ),
+    )
+    assert mismatches() == 0
+
+    CityService.update_city(db, hub.city_uuid, CityPatch(population=70000))
+    assert mismatches() == 0
+
+    CityService.delete_city(db, allies[1].city_uuid)
+    assert mismatches() == 0
+
+    CityService.delete_city(db, hub.city_uuid)
+    assert mismatches() == 0
+
+
+def test_rebuild_repairs_stored_allied_power(db, allied_cities):
+    hub, _ = allied_cities
+    CityRepository.set_allied_power(db, {hub.city_uuid: 1})
+    db.commit()
+
+    assert mismatches() == 1
+    assert mismatches(rebuild=True) == 1
+    assert mismatches() == 0
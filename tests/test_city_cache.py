@@ -0,0 +1,135 @@
+"""
+The read-through cache of GET /cities/{city_uuid}: a hit runs no SQL
+statement, If-None-Match revalidates against the cached ETag, and a write
+to a city or to one of its allies is never followed by a stale read,
+allied power included.
+"""
+import pytest
+
+from monitoring.query_budget import assert_query_budget
+from services.city_cache_service import city_cache
+
+
+def city_data(name: str, latitude: float, alliances=()) -> dict:
+    """ The body of a valid city. """
+    return {
+        "name": name,
+        "geo_location_latitude": latitude,
+        "geo_location_longitude": 13.4,
+        "beauty": "Average",
+        "population": 50000,
+        "alliances": [str(city_uuid) for city_uuid in alliances],
+    }
+
+
+@pytest.fixture
+def cities(client):
+    """ A city and its ally, as UUID strings, with the cache empty. """
+    ally = client.post("/cities/", json=city_data("Ally", 52.0)).json()["city_uuid"]
+    city = client.post(
+        "/cities/", json=city_data("City", 52.5, [ally])
+    ).json()["city_uuid"]
+    city_cache.clear()
+    return city, ally
+
+
+def fresh_body(client, city_uuid):
+    """ The body of a city read from the database, bypassing the cache. """
+    city_cache.clear()
+    return client.get(f"/cities/{city_uuid}").json()
+
+
+def test_cache_hit_runs_no_statements(client, cities):
+    city, _ = cities
+    miss = client.get(f"/cities/{city}")
+
+    hit = client.get(f"/cities/{city}")
+
+    assert int(miss.headers["X-DB-Queries"]) > 0
+    assert hit.status_code == 200
+    assert hit.content == miss.content
+    assert hit.headers["ETag"] == miss.headers["ETag"]
+    assert_query_budget(hit, max_queries=0)
+
+
+def test_if_none_match_revalidates(client, cities):
+    city, _ = cities
+    etag = client.get(f"/cities/{city}").headers["ETag"]
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}'):
+        not_modified = client.get(
+            f"/cities/{city}", headers={"If-None-Match": if_none_match}
+        )
+        assert not_modified.status_code == 304
+        assert not_modified.headers["ETag"] == etag
+        assert not_modified.content == b""
+        assert_query_budget(not_modified, max_queries=0)
+
+    client.patch(f"/cities/{city}", json={"population": 60000})
+    modified = client.get(f"/cities/{city}", headers={"If-None-Match": etag})
+
+    assert modified.status_code == 200
+    assert modified.headers["ETag"] != etag
+    assert modified.json()["population"] == 60000
+
+
+@pytest.mark.parametrize(
+    "changed, patch",
+    [
+        pytest.param("city", {"population": 90000}, id="city population"),
+        pytest.param("city", {"name": "Renamed City"}, id="city name"),
+        pytest.param("city", {"alliances": []}, id="city alliances"),
+        pytest.param("ally", {"population": 90000}, id="ally population"),
+        pytest.param(
+            "ally",
+            {"geo_location_latitude": -33.9, "geo_location_longitude": 151.2},
+            id="ally moved",
+        ),
+    ],
+)
+def test_patch_is_never_followed_by_a_stale_read(client, cities, changed, patch):
+    city, ally = cities
+    uuids = {"city": city, "ally": ally}
+    before = {
+        label: client.get(f"/cities/{city_uuid}").json()
+        for label, city_uuid in uuids.items()
+    }
+
+    response = client.patch(f"/cities/{uuids[changed]}", json=patch)
+    after = {
+        label: client.get(f"/cities/{city_uuid}").json()
+        for label, city_uuid in uuids.items()
+    }
+
+    assert response.status_code == 200
+    assert after[changed] != before[changed]
+    for label, city_uuid in uuids.items():
+        assert after[label] == fresh_body(client, city_uuid)
+
+
+def test_ally_patch_refreshes_allied_power(client, cities):
+    city, ally = cities
+    before = client.get(f"/cities/{city}").json()["allied_power"]
+
+    client.patch(f"/cities/{ally}", json={"population": 90000})
+    after = client.get(f"/cities/{city}").json()["allied_power"]
+
+    assert after == before + 40000
+
+
+@pytest.mark.parametrize("deleted", ["city", "ally"])
+def test_delete_is_never_followed_by_a_stale_read(client, cities, deleted):
+    uuids = dict(zip(("city", "ally"), cities))
+    for city_uuid in uuids.values():
+        client.get(f"/cities/{city_uuid}")
+
+    deleted_uuid = uuids.pop(deleted)
+    (survivor,) = uuids.values()
+
+    response = client.delete(f"/cities/{deleted_uuid}")
+
+    assert response.status_code == 200
+    assert client.get(f"/cities/{deleted_uuid}").status_code == 404
+    body = client.get(f"/cities/{survivor}").json()
+    assert body["alliances"] == []
+    assert body == fresh_body(client, survivor)
@@ -0,0 +1,82 @@
+"""
+Query budgets of GET /cities/: a page costs the same number of SQL
+statements whatever its size and whether allied power is included, so
+loading its alliances never turns into one query per city.
+"""
+import uuid
+
+import pytest
+
+from models.city_model import City, CityAlliances
+from monitoring.query_budget import assert_query_budget
+
+# Statements of a city page: the total count, the page and its alliances
+CITY_PAGE_QUERIES = 3
+# Added by include=allied_power: the allies of the whole page, in one query
+ALLIED_POWER_QUERIES = 1
+# Added by a cursor page: the table statistics read to estimate the total
+ESTIMATED_TOTAL_QUERIES = 1
+
+
+def seed_cities(db, count: int):
+    """ Insert cities, each allied with the next two around a ring. """
+    city_uuids = [uuid.uuid4() for _ in range(count)]
+    db.add_all(
+        City(
+            city_uuid=city_uuid,
+            name=f"City {chr(ord('a') + i % 26)}{chr(ord('a') + i // 26)}",
+            geo_location_latitude=i / 10,
+            geo_location_longitude=i / 10,
+            beauty="Average",
+            population=1000 + i,
+        )
+        for i, city_uuid in enumerate(city_uuids)
+    )
+    db.flush()
+    db.add_all(
+        CityAlliances(city_uuid=city_uuid, allied_city_uuid=allied_uuid)
+        for i, city_uuid in enumerate(city_uuids)
+        for offset in (-2, -1, 1, 2)
+        for allied_uuid in [city_uuids[(i + offset) % count]]
+    )
+    db.commit()
+
+
+@pytest.mark.parametrize("include", [None, "allied_power"])
+@pytest.mark.parametrize("page_size", [1, 10, 100])
+def test_city_page_query_budget(client, db, include, page_size):
+    seed_cities(db, 120)
+    params = {"page_size": page_size}
+    if include:
+        params["include"] = include
+
+    response = client.get("/cities/", params=params)
+
+    assert response.status_code == 200
+    assert len(response.json()["cities"]) == page_size
+    assert_query_budget(
+        response,
+        max_queries=CITY_PAGE_QUERIES + (ALLIED_POWER_QUERIES if include else 0),
+    )
+
+
+@pytest.mark.parametrize("include", [None, "allied_power"])
+def test_city_cursor_page_query_budget(client, db, include):
+    seed_cities(db, 120)
+    params = {"page_size": 50, "sort": "name"}
+    if include:
+        params["include"] = include
+    first_page = client.get("/cities/", params=params).json()
+
+    response = client.get(
+        "/cities/", params={**params, "cursor": first_page["next_cursor"]}
+    )
+
+    assert response.status_code == 200
+    assert len(response.json()["cities"]) == 50
+    assert_query_budget(
+        response,
+        max_queries=CITY_PAGE_QUERIES
+        + ESTIMATED_TOTAL_QUERIES
+        + (ALLIED_POWER_QUERIES if include else 0),
+    )
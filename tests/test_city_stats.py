@@ -0,0 +1,97 @@
+"""
+The rollup counters behind GET /cities/stats: after creating, patching,
+deleting and bulk importing cities, failed writes included, they match a
+full recount, and a rolled back transaction leaves no tracked state behind
+to be applied by a later commit.
+"""
+import json
+import uuid
+
+import config.app_config as app_config
+import config.db_postg as db_postg
+from repository.city_repository import CityRepository
+from schemas.city_schema import CityPatch
+from services.city_service import CityService
+from services.city_stats_service import (
+    STAGED_STATES_KEY,
+    CityStatsService,
+    track_city_stats,
+)
+
+
+def city_data(name: str, latitude: float, beauty: str = "Average", alliances=()):
+    """ The body of a valid city. """
+    return {
+        "name": name,
+        "geo_location_latitude": latitude,
+        "geo_location_longitude": 13.4,
+        "beauty": beauty,
+        "population": 50000,
+        "alliances": [str(city_uuid) for city_uuid in alliances],
+    }
+
+
+def stats_mismatches():
+    """ Verify the rollups in a session of their own, as committed. """
+    with db_postg.SessionLocal() as db:
+        return CityStatsService.verify_stats(db)
+
+
+def test_writes_keep_stats_consistent(client, monkeypatch):
+    monkeypatch.setattr(app_config, "BULK_IMPORT_CHUNK_SIZE", 2)
+    uuids = []
+    for i, beauty in enumerate(["Ugly", "Average", "Gorgeous", "Average"]):
+        response = client.post(
+            "/cities/", json=city_data("City", i * 10.0, beauty, uuids[-2:])
+        )
+        assert response.status_code == 200
+        uuids.append(response.json()["city_uuid"])
+    assert stats_mismatches() == []
+
+    for patch, status_code in (
+        ({"beauty": "Gorgeous", "population": 70000}, 200),
+        ({"geo_location_latitude": -33.9, "geo_location_longitude": 151.2}, 200),
+        ({"alliances": [uuids[2]]}, 200),
+        # Rolled back: the ally does not exist
+        ({"population": 1, "alliances": [str(uuid.uuid4())]}, 400),
+    ):
+        response = client.patch(f"/cities/{uuids[0]}", json=patch)
+        assert response.status_code == status_code
+        assert stats_mismatches() == []
+
+    assert client.delete(f"/cities/{uuids[1]}").status_code == 200
+    assert stats_mismatches() == []
+
+    imported = [str(uuid.uuid4()) for _ in range(5)]
+    rows = [
+        {**city_data("Imported", i, "Ugly", [uuids[0]]), "city_uuid": city_uuid}
+        for i, city_uuid in enumerate(imported)
+    ]
+    rows[3]["alliances"] = [imported[2]]
+    rows[4]["population"] = -5
+    response = client.post(
+        "/cities/bulk",
+        content="\n".join(json.dumps(row) for row in rows),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 4
+    assert stats_mismatches() == []
+
+    assert client.get("/cities/stats").json()["total_cities"] == 7
+
+
+def test_rollback_discards_staged_states(db):
+    city = CityService.create_city(db, city_data("City", 10.0), [])
+    CityRepository.get_cities_by_uuids(db, [city.city_uuid], for_update=True)
+    track_city_stats(db, [city.city_uuid])
+    assert city.city_uuid in db.info[STAGED_STATES_KEY]
+
+    db.rollback()
+
+    assert STAGED_STATES_KEY not in db.info
+    # A snapshot left behind would predate this change and skew the next one
+    with db_postg.SessionLocal() as other:
+        CityService.update_city(other, city.city_uuid, CityPatch(population=70000))
+    CityService.update_city(db, city.city_uuid, CityPatch(population=90000))
+    assert stats_mismatches() == []
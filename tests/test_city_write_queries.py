@@ -0,0 +1,77 @@
+"""
+Query budgets of the city write paths: creating, updating and deleting a
+city runs the same number of SQL statements whatever its number of allies,
+since allies are locked, validated and updated in bulk.
+"""
+import pytest
+
+from monitoring.query_budget import query_budget
+from schemas.city_schema import CityPatch
+from services.city_service import CityService
+
+# Statements of each write, including the rollup upserts of its commit
+CREATE_QUERIES = 8
+UPDATE_NAME_QUERIES = 4
+UPDATE_POPULATION_QUERIES = 8
+UPDATE_ALLIANCES_QUERIES = 11
+DELETE_QUERIES = 9
+
+# Times a statement shape may repeat in one write: the rollup states are
+# read before and after the change
+MAX_REPEATS = 2
+
+
+def city_data(name: str, latitude: float = 10.0) -> dict:
+    """ The fields of a valid city. """
+    return {
+        "name": name,
+        "geo_location_latitude": latitude,
+        "geo_location_longitude": 20.0,
+        "beauty": "Average",
+        "population": 50000,
+    }
+
+
+@pytest.fixture(params=[2, 10], ids=["2 allies", "10 allies"])
+def ally_uuids(request, db):
+    return [
+        CityService.create_city(db, city_data("Ally", i / 10), []).city_uuid
+        for i in range(request.param)
+    ]
+
+
+def test_create_city_query_budget(db, ally_uuids):
+    with query_budget(max_queries=CREATE_QUERIES, max_repeats=MAX_REPEATS):
+        CityService.create_city(db, city_data("New City"), ally_uuids)
+
+
+def test_update_city_name_query_budget(db, ally_uuids):
+    city = CityService.create_city(db, city_data("Old Name"), ally_uuids)
+
+    with query_budget(max_queries=UPDATE_NAME_QUERIES, max_repeats=MAX_REPEATS):
+        CityService.update_city(db, city.city_uuid, CityPatch(name="New Name"))
+
+
+def test_update_city_population_query_budget(db, ally_uuids):
+    city = CityService.create_city(db, city_data("Growing City"), ally_uuids)
+
+    with query_budget(
+        max_queries=UPDATE_POPULATION_QUERIES, max_repeats=MAX_REPEATS
+    ):
+        CityService.update_city(db, city.city_uuid, CityPatch(population=90000))
+
+
+def test_update_city_alliances_query_budget(db, ally_uuids):
+    city = CityService.create_city(db, city_data("Fickle City"), ally_uuids[1:])
+
+    with query_budget(max_queries=UPDATE_ALLIANCES_QUERIES, max_repeats=MAX_REPEATS):
+        CityService.update_city(
+            db, city.city_uuid, CityPatch(alliances=ally_uuids[:1])
+        )
+
+
+def test_delete_city_query_budget(db, ally_uuids):
+    city = CityService.create_city(db, city_data("Doomed City"), ally_uuids)
+
+    with query_budget(max_queries=DELETE_QUERIES, max_repeats=MAX_REPEATS):
+        CityService.delete_city(db, city.city_uuid)
@@ -0,0 +1,200 @@
+"""
+The vectorized distance engine against the per-ally geopy reference.
+
+In ellipsoidal mode, DistanceService must agree with
+AlliedPowerService.calculate_distance, geopy's geodesic rounded to whole
+kilometers, on every discount bucket, including distances just either side
+of the 1000 km and 10000 km thresholds. In haversine mode, the spherical
+Earth is off by up to HAVERSINE_MAX_RELATIVE_ERROR, so a pair may change
+bucket, but only when its geodesic distance is that close to a threshold;
+this is the drift documented for ALLIED_POWER_DISTANCE_MODE. No database is
+needed.
+"""
+import logging
+
+import numpy as np
+import pytest
+from geopy.distance import geodesic
+
+from services.allied_power_service import AlliedPowerService
+from services.distance_service import ELLIPSOIDAL, HAVERSINE, DistanceService
+
+# Largest relative error of the spherical Earth against the WGS-84 ellipsoid,
+# about 0.56% along the meridians
+HAVERSINE_MAX_RELATIVE_ERROR = 0.006
+
+# Discount thresholds of allied populations, in kilometers
+THRESHOLDS_KM = (1000, 10000)
+
+# Largest error of the ellipsoidal mode against geodesic, in kilometers
+ELLIPSOIDAL_TOLERANCE_KM = 1e-6
+
+# Population of every ally, divisible by 4 so each bucket discounts it to a
+# distinct whole number
+POPULATION = 1_000_000
+
+# (label, lat1, lon1, lat2, lon2) of the special point pairs
+SPECIAL_PAIRS = [
+    ("coincident", 52.520008, 13.404954, 52.520008, 13.404954),
+    ("coincident at the north pole", 90.0, 0.0, 90.0, 123.0),
+    ("pole to pole", 90.0, 0.0, -90.0, 0.0),
+    ("north pole to near it", 90.0, 0.0, 89.5, 100.0),
+    ("south pole to the tropics", -90.0, 45.0, 10.0, 20.0),
+    ("along the equator", 0.0, 0.0, 0.0, 90.0),
+    ("across the antimeridian", 10.0, 179.9, -10.0, -179.9),
+    ("antipodal on the equator", 0.0, 0.0, 0.0, 180.0),
+    ("near-antipodal", 0.0, 0.0, 0.5, 179.7),
+    ("near-antipodal off the equator", 10.0, 20.0, -10.0, -160.0001),
+]
+
+# Pairs whose Vincenty iteration does not converge
+NEAR_ANTIPODAL_PAIRS = [
+    pair for pair in SPECIAL_PAIRS if "antipodal" in pair[0]
+]
+
+
+def threshold_pairs():
+    """
+    Pairs at geodesic distances just either side of each threshold once
+    rounded to whole kilometers, such as 1000.4 km and 1000.6 km, in
+    several directions from several origins.
+    """
+    pairs = []
+    for origin in ((52.520008, 13.404954), (-33.8688, 151.2093), (0.0, 0.0)):
+        for bearing in (0.0, 45.0, 90.0, 200.0):
+            for threshold in THRESHOLDS_KM:
+                for offset in (-0.6, -0.4, 0.4, 0.6):
+                    point = geodesic(kilometers=threshold + offset).destination(
+                        origin, bearing
+                    )
+                    pairs.append(
+                        (
+                            f"{threshold}{offset:+} km at {bearing} from {origin}",
+                            *origin,
+                            point.latitude,
+                            point.longitude,
+                        )
+                    )
+    return pairs
+
+
+def random_pairs(count: int = 2000, seed: int = 7):
+    """ Seeded random pairs with coordinates of six decimals, like cities. """
+    rng = np.random.default_rng(seed)
+    lats = np.round(rng.uniform(-90, 90, (count, 2)), 6)
+    lons = np.round(rng.uniform(-180, 180, (count, 2)), 6)
+    return [
+        (f"random {i}", lats[i, 0], lons[i, 0], lats[i, 1], lons[i, 1])
+        for i in range(count)
+    ]
+
+
+ALL_PAIRS = {
+    "special": SPECIAL_PAIRS,
+    "threshold": threshold_pairs(),
+    "random": random_pairs(),
+}
+
+
+def reference_discount(distance_km: int, population: int) -> int:
+    """ The discount of the original per-ally loop, on a rounded distance. """
+    if distance_km > 10000:
+        return round(population / 4)
+    if distance_km > 1000:
+        return round(population / 2)
+    return population
+
+
+def compute(pairs, mode):
+    """ Distances and discounted populations of pairs, by the engine. """
+    lat1, lon1, lat2, lon2 = (np.array(column) for column in zip(*pairs))
+    distances = DistanceService.distances_km(lat1, lon1, lat2, lon2, mode)
+    return distances, DistanceService.discount_populations(
+        distances, np.full(len(pairs), POPULATION)
+    )
+
+
+def reference(pairs):
+    """ Geodesic distances and discounted populations, one pair at a time. """
+    distances = np.array(
+        [
+            geodesic((lat1, lon1), (lat2, lon2)).kilometers
+            for _, lat1, lon1, lat2, lon2 in pairs
+        ]
+    )
+    discounts = np.array(
+        [
+            reference_discount(
+                AlliedPowerService.calculate_distance(lat1, lon1, lat2, lon2),
+                POPULATION,
+            )
+            for _, lat1, lon1, lat2, lon2 in pairs
+        ]
+    )
+    return distances, discounts
+
+
+@pytest.mark.parametrize("kind", sorted(ALL_PAIRS))
+def test_ellipsoidal_mode_matches_geodesic(kind):
+    pairs = [pair[1:] for pair in ALL_PAIRS[kind]]
+    expected_distances, expected_discounts = reference(ALL_PAIRS[kind])
+
+    distances, discounts = compute(pairs, ELLIPSOIDAL)
+
+    np.testing.assert_allclose(
+        distances, expected_distances, rtol=0, atol=ELLIPSOIDAL_TOLERANCE_KM
+    )
+    mismatching = [
+        ALL_PAIRS[kind][i][0]
+        for i in np.flatnonzero(discounts != expected_discounts)
+    ]
+    assert mismatching == []
+
+
+@pytest.mark.parametrize("kind", sorted(ALL_PAIRS))
+def test_haversine_drift_is_confined_to_the_thresholds(kind):
+    pairs = [pair[1:] for pair in ALL_PAIRS[kind]]
+    expected_distances, expected_discounts = reference(ALL_PAIRS[kind])
+
+    distances, discounts = compute(pairs, HAVERSINE)
+
+    np.testing.assert_allclose(
+        distances,
+        expected_distances,
+        rtol=HAVERSINE_MAX_RELATIVE_ERROR,
+        atol=ELLIPSOIDAL_TOLERANCE_KM,
+    )
+    drifting = [
+        ALL_PAIRS[kind][i][0]
+        for i in np.flatnonzero(discounts != expected_discounts)
+        if not any(
+            abs(expected_distances[i] - threshold)
+            <= threshold * HAVERSINE_MAX_RELATIVE_ERROR
+            for threshold in THRESHOLDS_KM
+        )
+    ]
+    assert drifting == []
+
+
+def test_near_antipodal_pairs_fall_back_to_geodesic(caplog):
+    pairs = [pair[1:] for pair in NEAR_ANTIPODAL_PAIRS]
+
+    with caplog.at_level(logging.DEBUG):
+        distances, _ = compute(pairs, ELLIPSOIDAL)
+
+    assert f"Falling back to geodesic for {len(pairs)} point pairs" in caplog.text
+    assert np.all(np.isfinite(distances))
+    assert np.all(distances > 19900)
+
+
+def test_distances_broadcast_one_city_against_many():
+    lats = np.array([10.0, 20.0, -30.0])
+    lons = np.array([0.0, 50.0, 170.0])
+
+    distances = DistanceService.distances_km(52.5, 13.4, lats, lons, ELLIPSOIDAL)
+
+    assert distances.shape == (3,)
+    assert distances.tolist() == pytest.approx(
+        [geodesic((52.5, 13.4), point).kilometers for point in zip(lats, lons)],
+        abs=ELLIPSOIDAL_TOLERANCE_KM,
+    )
@@ -0,0 +1,211 @@
+"""
+Check that filtered and sorted city list queries are served by indexes.
+
+Seeds the city table of the disposable test database to EXPLAIN_ROWS
+cities (200000 by default; set it to 1000000 for a production-sized run),
+then reads the common filter and sort combinations of GET /cities/ through
+CityService, following one cursor each. Every page query the service issues
+is captured and run again under EXPLAIN; a test fails if any of them reads
+the city table with a sequential scan. Count queries are not checked,
+since totals over broad filters may rightly scan. Neither are bounding
+boxes larger than a one-character geohash cell, which match too large a
+share of the table for an index to pay off; they are only checked to find
+every city inside.
+"""
+import os
+import random
+import re
+import string
+
+import pytest
+from sqlalchemy import event, text
+
+import config.db_postg as db_postg
+from repository.city_repository import CityRepository
+from schemas.filter_schema import CityFilterParams
+from schemas.pagination_schema import PaginationParams
+from services.city_service import CityService
+
+# Cities seeded before the plans are checked
+EXPLAIN_ROWS = int(os.environ.get("EXPLAIN_ROWS", 200_000))
+
+# Rows inserted per statement when seeding
+SEED_BATCH_SIZE = 10000
+
+# Name stems, so that prefix and substring filters match a realistic share
+NAME_STEMS = ["Berlin", "Bern", "Bergen", "Paris", "Porto", "Tokyo", "Lima", "Oslo"]
+
+# (label, pagination, filters, fields) of the combinations checked
+CASES = [
+    ("default order", {}, {}, None),
+    ("sorted by name", {"sort": "name"}, {}, None),
+    ("sorted by population desc", {"sort": "-population"}, {}, None),
+    (
+        "gorgeous over 1M by population desc",
+        {"sort": "-population"},
+        {"beauty": "Gorgeous", "min_population": 1_000_000},
+        None,
+    ),
+    ("gorgeous by name", {"sort": "name"}, {"beauty": "Gorgeous"}, None),
+    ("name prefix", {}, {"name_prefix": "ber"}, None),
+    ("name prefix by name", {"sort": "name"}, {"name_prefix": "Bergen k"}, None),
+    ("name contains", {}, {"name_contains": "rgen xq"}, None),
+    (
+        "population range by population",
+        {"sort": "population"},
+        {"min_population": 1_000_000, "max_population": 1_010_000},
+        None,
+    ),
+    (
+        "bounding box",
+        {},
+        {"min_lat": 52.3, "max_lat": 52.7, "min_lon": 13.1, "max_lon": 13.7},
+        None,
+    ),
+    (
+        "bounding box across the antimeridian",
+        {"sort": "population"},
+        {"min_lat": -18.5, "max_lat": -17.5, "min_lon": 179.6, "max_lon": -179.6},
+        None,
+    ),
+    (
+        "sparse fields by population",
+        {"sort": "population"},
+        {"beauty": "Ugly"},
+        ["name", "population"],
+    ),
+]
+
+# A SELECT reading the city table, as opposed to city_alliances
+CITY_SELECT = re.compile(r"^\s*SELECT\b.*\bFROM city\b(?!_)", re.DOTALL)
+
+
+@pytest.fixture(scope="module")
+def seeded_engine(engine):
+    """ The test engine, with EXPLAIN_ROWS random cities and fresh statistics. """
+    rng = random.Random(7)
+    with engine.begin() as connection:
+        connection.execute(text("TRUNCATE city_alliances, city"))
+    with db_postg.SessionLocal() as db:
+        for start in range(0, EXPLAIN_ROWS, SEED_BATCH_SIZE):
+            CityRepository.add_cities_bulk(
+                db,
+                [
+                    {
+                        "name": rng.choice(NAME_STEMS)
+                        + " "
+                        + "".join(rng.choice(string.ascii_lowercase) for _ in range(6)),
+                        "geo_location_latitude": round(rng.uniform(-90, 90), 6),
+                        "geo_location_longitude": round(rng.uniform(-180, 180), 6),
+                        "beauty": rng.choice(["Ugly", "Average", "Gorgeous"]),
+                        "population": rng.randint(1, 10_000_000),
+                    }
+                    for _ in range(min(SEED_BATCH_SIZE, EXPLAIN_ROWS - start))
+                ],
+            )
+            db.commit()
+    with engine.connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT").execute(
+            text("VACUUM ANALYZE city")
+        )
+    return engine
+
+
+def capture_queries(engine, case_pagination, case_filters, fields):
+    """ Read a first page and the page after it; return the city SELECTs. """
+    captured = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if CITY_SELECT.match(statement):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        with db_postg.SessionLocal() as db:
+            city_filter = CityFilterParams(**case_filters)
+            pagination = PaginationParams(page_size=50, **case_pagination)
+            page = CityService.read_cities(
+                db, pagination, fields=fields, city_filter=city_filter
+            )
+            if page.next_cursor:
+                CityService.read_cities(
+                    db,
+                    PaginationParams(
+                        page_size=50, cursor=page.next_cursor, **case_pagination
+                    ),
+                    fields=fields,
+                    city_filter=city_filter,
+                )
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return captured
+
+
+def seq_scans(plan):
+    """ Yield every sequential scan of the city table in a plan tree. """
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") == "city":
+        yield plan
+    for child in plan.get("Plans", []):
+        yield from seq_scans(child)
+
+
+@pytest.mark.parametrize(
+    "case_pagination, case_filters, fields",
+    [pytest.param(*case[1:], id=case[0]) for case in CASES],
+)
+def test_page_queries_use_indexes(seeded_engine, case_pagination, case_filters, fields):
+    captured = capture_queries(seeded_engine, case_pagination, case_filters, fields)
+
+    page_queries = [
+        (statement, parameters)
+        for statement, parameters in captured
+        if "count(" not in statement
+    ]
+    assert page_queries
+    scanning = []
+    for statement, parameters in page_queries:
+        with seeded_engine.connect() as connection:
+            plan = connection.exec_driver_sql(
+                "EXPLAIN (FORMAT JSON) " + statement, parameters
+            ).scalar()[0]["Plan"]
+        if any(seq_scans(plan)):
+            scanning.append(statement)
+    assert not scanning, "Page queries scan the city table sequentially:\n" + (
+        "\n".join(scanning)
+    )
+
+
+@pytest.mark.parametrize(
+    "box",
+    [
+        {"min_lat": -60.0, "max_lat": 60.0, "min_lon": 10.0, "max_lon": 20.0},
+        {"min_lat": 10.0, "max_lat": 20.0, "min_lon": -100.0, "max_lon": 100.0},
+        {"min_lat": 10.0, "max_lat": 20.0, "min_lon": 150.0, "max_lon": -150.0},
+        {"min_lat": -90.0, "max_lat": 90.0, "min_lon": -180.0, "max_lon": 180.0},
+    ],
+)
+def test_large_bounding_boxes_find_every_city_inside(seeded_engine, box):
+    if box["min_lon"] <= box["max_lon"]:
+        longitude = "geo_location_longitude BETWEEN :min_lon AND :max_lon"
+    else:
+        longitude = (
+            "(geo_location_longitude >= :min_lon "
+            "OR geo_location_longitude <= :max_lon)"
+        )
+    with seeded_engine.connect() as connection:
+        expected = connection.execute(
+            text(
+                "SELECT count(*) FROM city "
+                "WHERE geo_location_latitude BETWEEN :min_lat AND :max_lat "
+                f"AND {longitude}"
+            ),
+            box,
+        ).scalar()
+
+    with db_postg.SessionLocal() as db:
+        page = CityService.read_cities(
+            db, PaginationParams(page_size=10), city_filter=CityFilterParams(**box)
+        )
+
+    assert expected > 0
+    assert page.total == expected
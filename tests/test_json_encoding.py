@@ -0,0 +1,143 @@
+"""
+Byte identity of FAST_JSON_RESPONSES: city pages and single cities encoded
+straight from ORM rows equal the bodies FastAPI renders through the display
+models and response models, with orjson and with the stdlib fallback. No
+database is needed; the rows are built in memory.
+"""
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+
+import services.json_encoding_service as json_encoding_service
+from models.city_model import BeautyEnum, City, CityAlliances
+from routers.city_router import build_city_page_model
+from schemas.city_schema import CityDisplayPower
+from schemas.pagination_schema import PaginatedResponseModel, PaginationParams
+from services.city_service import CityPage
+from services.json_encoding_service import JsonEncodingService
+
+# Coordinates of the cities, including ones below 1e-4 that Python prints
+# in exponent notation and orjson does not
+ORDINARY_COORDINATES = [
+    (0.0, 0.0),
+    (52.52, 13.405),
+    (-33.8688, 151.2093),
+    (90.0, -180.0),
+    (1.5, -0.0001),
+    (12.345678, 100.0),
+]
+TINY_COORDINATES = [(5e-05, 13.405), (-1.2e-05, 1e-06), (0.000001, -0.000099)]
+
+
+def make_city(index: int, latitude: float, longitude: float) -> City:
+    """ An in-memory city with index alliances. """
+    return City(
+        city_uuid=uuid.UUID(int=index + 1, version=4),
+        name=f"City {'abcdefgh'[index % 8]}",
+        geo_location_latitude=latitude,
+        geo_location_longitude=longitude,
+        beauty=list(BeautyEnum)[index % 3],
+        population=1000 * (index + 1),
+        allied_power=None if index == 0 else 10**10 + index,
+        alliances=[
+            CityAlliances(allied_city_uuid=uuid.UUID(int=100 + i, version=4))
+            for i in range(index)
+        ],
+    )
+
+
+def make_page(coordinates) -> CityPage:
+    """ A page of in-memory cities at the given coordinates. """
+    return CityPage(
+        cities=[make_city(i, lat, lon) for i, (lat, lon) in enumerate(coordinates)],
+        total=1234,
+        total_pages=124,
+        total_is_estimate=False,
+        next_cursor="eyJrIjpbIjEyMyJdfQ",
+    )
+
+
+PAGES = {
+    "ordinary": make_page(ORDINARY_COORDINATES),
+    "tiny": make_page(TINY_COORDINATES),
+    "mixed": make_page(ORDINARY_COORDINATES + TINY_COORDINATES),
+    "empty": make_page([]),
+}
+CITIES = {
+    f"{label}-{index}": city
+    for label in ("ordinary", "tiny")
+    for index, city in enumerate(PAGES[label].cities)
+}
+
+
+@pytest.fixture(scope="module")
+def client():
+    """ Serve each page and city both through the response models and fast. """
+    app = FastAPI()
+    pagination = PaginationParams(page=3, page_size=10)
+
+    @app.get("/default/pages/{label}", response_model=PaginatedResponseModel)
+    def default_page(label: str, allied_power: bool):
+        return build_city_page_model(PAGES[label], pagination, allied_power)
+
+    @app.get("/fast/pages/{label}")
+    def fast_page(label: str, allied_power: bool):
+        return Response(
+            JsonEncodingService.encode_city_page(
+                PAGES[label], pagination.page, pagination.page_size, allied_power
+            ),
+            media_type="application/json",
+        )
+
+    @app.get("/default/cities/{label}", response_model=CityDisplayPower)
+    def default_city(label: str):
+        return CityDisplayPower.model_validate(CITIES[label])
+
+    @app.get("/fast/cities/{label}")
+    def fast_city(label: str):
+        return Response(
+            JsonEncodingService.encode_city(CITIES[label]),
+            media_type="application/json",
+        )
+
+    return TestClient(app)
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def encoder(request, monkeypatch):
+    """ Encode with orjson, when installed, and with it missing. """
+    if request.param == "orjson" and json_encoding_service.orjson is None:
+        pytest.skip("orjson is not installed")
+    if request.param == "stdlib":
+        monkeypatch.setattr(json_encoding_service, "orjson", None)
+    return request.param
+
+
+@pytest.mark.parametrize("allied_power", [True, False])
+@pytest.mark.parametrize("label", sorted(PAGES))
+def test_city_page_bodies_are_identical(client, encoder, label, allied_power):
+    params = {"allied_power": allied_power}
+
+    default = client.get(f"/default/pages/{label}", params=params)
+    fast = client.get(f"/fast/pages/{label}", params=params)
+
+    assert default.status_code == fast.status_code == 200
+    assert fast.content == default.content
+
+
+@pytest.mark.parametrize("label", sorted(CITIES))
+def test_city_bodies_are_identical(client, encoder, label):
+    default = client.get(f"/default/cities/{label}")
+    fast = client.get(f"/fast/cities/{label}")
+
+    assert default.status_code == fast.status_code == 200
+    assert fast.content == default.content
+
+
+def test_tiny_floats_fall_back_to_the_stdlib_encoder(encoder):
+    body = JsonEncodingService.encode_city(PAGES["tiny"].cities[0])
+
+    assert b'"geo_location_latitude":5e-05' in body
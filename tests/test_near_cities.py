@@ -0,0 +1,141 @@
+"""
+GET /cities/near: radius queries are capped at NEAR_MAX_RESULTS, nearest
+first, also when the radius is too large for a geohash covering and every
+city is scanned, and only the returned cities are loaded. Results are
+checked against geopy's geodesic, one city at a time.
+"""
+import uuid
+
+import pytest
+from geopy.distance import geodesic
+
+import config.app_config as app_config
+from monitoring.query_budget import assert_query_budget
+from repository.city_repository import CityRepository
+from services.allied_power_service import AlliedPowerService
+
+# Statements of a near query: the streamed locations, the returned cities
+# and their alliances
+NEAR_QUERIES = 3
+
+
+def add_cities(db, locations):
+    """ Insert cities at (latitude, longitude) pairs; return (uuid, lat, lon). """
+    cities = [(uuid.uuid4(), latitude, longitude) for latitude, longitude in locations]
+    CityRepository.add_cities_bulk(
+        db,
+        [
+            {
+                "city_uuid": city_uuid,
+                "name": "Near City",
+                "geo_location_latitude": latitude,
+                "geo_location_longitude": longitude,
+                "beauty": "Average",
+                "population": 1000,
+            }
+            for city_uuid, latitude, longitude in cities
+        ],
+    )
+    db.commit()
+    return cities
+
+
+@pytest.fixture
+def cities(db):
+    """ Cities spread along the equator, every 10 degrees of longitude. """
+    return add_cities(db, [(0.0, float(lon)) for lon in range(-170, 180, 10)])
+
+
+def nearest(cities, lon, count, radius_km=None):
+    """
+    The UUIDs of the count cities nearest to (0, lon), within radius_km if
+    given, by AlliedPowerService.calculate_distance.
+    """
+    distances = sorted(
+        (AlliedPowerService.calculate_distance(0.0, lon, latitude, longitude), i)
+        for i, (_, latitude, longitude) in enumerate(cities)
+    )
+    return [
+        cities[i][0]
+        for distance, i in distances
+        if radius_km is None or distance <= radius_km
+    ][:count]
+
+
+@pytest.mark.parametrize(
+    "radius_km, max_results",
+    [pytest.param(2000.0, 3, id="covered"), pytest.param(20000.0, 5, id="full scan")],
+)
+def test_radius_query_is_capped(client, cities, monkeypatch, radius_km, max_results):
+    monkeypatch.setattr(app_config, "NEAR_MAX_RESULTS", max_results)
+
+    response = client.get(
+        "/cities/near", params={"lat": 0.0, "lon": 3.0, "radius_km": radius_km}
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [uuid.UUID(city["city_uuid"]) for city in body] == nearest(
+        cities, 3.0, max_results
+    )
+    assert [city["distance_km"] for city in body] == sorted(
+        city["distance_km"] for city in body
+    )
+    assert_query_budget(response, max_queries=NEAR_QUERIES)
+
+
+def test_radius_query_returns_only_cities_inside(client, cities):
+    response = client.get(
+        "/cities/near", params={"lat": 0.0, "lon": 3.0, "radius_km": 1000.0}
+    )
+
+    assert response.status_code == 200
+    assert [uuid.UUID(city["city_uuid"]) for city in response.json()] == nearest(
+        cities, 3.0, len(cities), radius_km=1000.0
+    )
+
+
+@pytest.mark.parametrize("radius_km", [500.0, 3000.0])
+def test_radius_query_edges(client, db, cities, radius_km):
+    # One city 1 km inside the radius and one 1 km outside, off the equator
+    inside, outside = add_cities(
+        db,
+        [
+            (round(point.latitude, 6), round(point.longitude, 6))
+            for point in (
+                geodesic(kilometers=radius_km + offset).destination(
+                    (0.0, 3.0), bearing
+                )
+                for offset, bearing in ((-1.0, 20.0), (1.0, 160.0))
+            )
+        ],
+    )
+    everything = cities + [inside, outside]
+
+    response = client.get(
+        "/cities/near", params={"lat": 0.0, "lon": 3.0, "radius_km": radius_km}
+    )
+
+    assert response.status_code == 200
+    found = [uuid.UUID(city["city_uuid"]) for city in response.json()]
+    assert inside[0] in found
+    assert outside[0] not in found
+    assert found == nearest(everything, 3.0, len(everything), radius_km=radius_km)
+
+
+def test_nearest_query_on_the_whole_globe(client, cities):
+    response = client.get("/cities/near", params={"lat": 0.0, "lon": -177.0, "k": 4})
+
+    assert response.status_code == 200
+    assert [uuid.UUID(city["city_uuid"]) for city in response.json()] == nearest(
+        cities, -177.0, 4
+    )
+
+
+def test_k_above_the_cap_is_rejected(client, cities):
+    response = client.get(
+        "/cities/near",
+        params={"lat": 0.0, "lon": 0.0, "k": app_config.NEAR_MAX_RESULTS + 1},
+    )
+
+    assert response.status_code == 422